@@ -1,120 +1,259 @@
 import os
+import sys
 import json
-import joblib  # For loading trained ML models
 import datetime
+import feature_store
+import analysis_engine
+import metrics
+import report_engine
+import forest_model
 import numpy as np
 
 # ✅ Corrected log directory path
-PACKET_LOG_DIR = "logs/packets"
 AI_REPORT_DIR = "logs/ai_analysis_reports"
 MODEL_PATH = "models/ai_threat_model.pkl"
+FOREST_PATH = os.path.splitext(MODEL_PATH)[0] + forest_model.FOREST_EXTENSION  # Compiled copy scored without sklearn
+
+# Packets scored per predict_proba call
+BATCH_SIZE = 8192
+
+# Risk score thresholds (exclusive), highest first, and the threat level each maps to
+RISK_THRESHOLDS = [(0.75, "⚠️ Critical"), (0.4, "⚠️ High")]
+SAFE_LEVEL = "✅ Safe"
+LEVELS = [level for _, level in RISK_THRESHOLDS] + [SAFE_LEVEL]
+SAFE_CODE = len(RISK_THRESHOLDS)
+
+# Fields that identify one aggregated finding in the report
+GROUP_FIELDS = ("src_ip", "dst_ip", "protocol", "port", "threat_level")
 
 # Ensure AI report directory exists
 os.makedirs(AI_REPORT_DIR, exist_ok=True)
 
-# Load trained AI model
-if os.path.exists(MODEL_PATH):
+# Trained AI model, loaded on first use
+_model = None
+
+def load_model():
+    """Load the trained AI model once; returns None when it is missing or unreadable.
+
+    The memory-mapped compiled forest is preferred; the pickled model is only
+    unpickled (and compiled for next time) when the forest is missing or stale.
+    """
+    global _model
+    if _model is not None:
+        return _model
+
     try:
-        model = joblib.load(MODEL_PATH)
-        expected_features = model.n_features_in_  # Get the number of features the model expects
+        _model = forest_model.load_forest(FOREST_PATH, MODEL_PATH)
     except Exception as e:
-        print(f"❌ Error loading AI model: {e}")
-        exit()
-else:
-    print("⚠️ AI Model not found. Train and save a model first.")
-    exit()
-
-def get_latest_packet_file():
-    """Find the latest captured packet file."""
-    if not os.path.exists(PACKET_LOG_DIR):
-        print(f"❌ Packet log directory '{PACKET_LOG_DIR}' not found.")
+        print(f"⚠️ Could not load compiled model, falling back to {MODEL_PATH}: {e}")
+    if _model is not None:
+        _check_features(_model)
+        return _model
+
+    if not os.path.exists(MODEL_PATH):
+        print("⚠️ AI Model not found. Train and save a model first.")
         return None
 
-    files = [f for f in os.listdir(PACKET_LOG_DIR) if f.endswith(".json")]
-    if not files:
-        print(f"❌ No packet capture files found in '{PACKET_LOG_DIR}'.")
+    try:
+        import joblib  # For loading trained ML models (only needed until the forest is compiled)
+        _model = joblib.load(MODEL_PATH)
+    except Exception as e:
+        print(f"❌ Error loading AI model: {e}")
         return None
-    
-    files.sort(reverse=True)
-    return os.path.join(PACKET_LOG_DIR, files[0])
 
-def extract_features(packet):
-    """Extract numerical features for AI analysis."""
-    features = [
-        int(packet.get("dst_port", 0)),  # Destination port
-        1 if packet.get("protocol") == "TCP" else 0,  # Protocol (TCP = 1, UDP = 0)
-        1 if packet.get("src_ip") in ["192.168.1.100"] else 0,  # Known malicious IP (example)
-    ]
+    try:
+        forest_model.export_model_file(_model, MODEL_PATH, FOREST_PATH)
+        _model = forest_model.load_forest(FOREST_PATH)
+    except Exception as e:
+        print(f"⚠️ Could not compile AI model, scoring with it directly: {e}")
 
-    # ✅ Add a missing feature (Example: Packet size)
-    features.append(int(packet.get("packet_size", 0)))  # Example: Packet size
+    _check_features(_model)
+    return _model
 
-    return features
+def _check_features(model):
+    """Warn when the model was trained on a different feature definition than the one scored."""
+    if getattr(model, "feature_version_", None) != feature_store.FEATURE_VERSION:
+        print("⚠️ AI model was not trained on the current features; retrain it with train_ai_model.py.")
 
-def ai_threat_analysis():
-    """Perform AI-based threat analysis on captured packets."""
-    file_path = get_latest_packet_file()
-    
-    if not file_path:
-        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
-        return
-    
-    print(f"🔍 Analyzing packets with AI from: {file_path}")
+# Training and scoring share one feature definition (see feature_store.py)
+extract_features = feature_store.extract_features
+extract_feature_matrix = feature_store.extract_feature_matrix
+
+def classify_scores(risk_scores):
+    """Map an array of risk scores to threat levels with vectorized thresholds."""
+    conditions = [risk_scores > threshold for threshold, _ in RISK_THRESHOLDS]
+    levels = [level for _, level in RISK_THRESHOLDS]
+    return np.select(conditions, levels, default=SAFE_LEVEL).tolist()
+
+def classify_score_codes(risk_scores):
+    """Map risk scores to indexes into LEVELS (SAFE_CODE for safe packets)."""
+    conditions = [risk_scores > threshold for threshold, _ in RISK_THRESHOLDS]
+    return np.select(conditions, list(range(len(RISK_THRESHOLDS))), default=SAFE_CODE)
+
+def score_batch(batch, model):
+    """Risk scores for one batch with a single predict_proba call; None (after saying why) when it cannot be scored."""
+    with metrics.timer("features", analyzer="ml"):
+        features = extract_feature_matrix(batch)
+
+    # ✅ Check feature length before prediction
+    expected_features = model.n_features_in_  # Get the number of features the model expects
+    if features.shape[1] != expected_features:
+        print(f"❌ Error: Model expects {expected_features} features, but got {features.shape[1]}")
+        return None
 
     try:
-        with open(file_path, "r") as f:
-            packets = json.load(f)
+        with metrics.timer("inference", analyzer="ml"):
+            return model.predict_proba(features)[:, 1]  # Probability of being a threat
     except Exception as e:
-        print(f"❌ Error reading packet log: {e}")
-        return
+        print(f"❌ Error processing packet batch: {e}")
+        return None
 
+def score_capture(capture, model, batch_size=BATCH_SIZE):
+    """Score every packet of a columnar capture, one finding per packet."""
     threat_results = []
 
-    for pkt in packets:
-        try:
-            features = np.array(extract_features(pkt)).reshape(1, -1)
+    for batch in capture.iter_batches(batch_size):
+        risk_scores = score_batch(batch, model)
+        if risk_scores is None:
+            continue
+
+        threat_levels = classify_scores(risk_scores)
+        metrics.count_levels("ml", threat_levels)
 
-            # ✅ Check feature length before prediction
-            if features.shape[1] != expected_features:
-                print(f"❌ Error: Model expects {expected_features} features, but got {features.shape[1]}")
-                continue
+        for index, threat_level in enumerate(threat_levels):
+            pkt = batch.packet(index, payload=False)
+            threat_results.append(_finding(pkt, risk_scores[index], threat_level))
 
-            risk_score = model.predict_proba(features)[0][1]  # Probability of being a threat
-        except Exception as e:
-            print(f"❌ Error processing packet: {e}")
-            continue
+    return threat_results
+
+def _finding(pkt, risk_score, threat_level):
+    return {
+        "src_ip": pkt["src_ip"],
+        "dst_ip": pkt["dst_ip"],
+        "protocol": pkt["protocol"],
+        "port": pkt["dst_port"],
+        "packet_size": pkt["packet_size"],  # ✅ Include packet size
+        "risk_score": round(float(risk_score), 2),
+        "threat_level": threat_level
+    }
+
+def _evidence(batch, flagged, risk_scores, codes):
+    """Per-packet findings for the risky rows of a batch, with the packet's time."""
+    for index in flagged:
+        pkt = batch.packet(index, payload=False)
+        finding = _finding(pkt, risk_scores[index], LEVELS[codes[index]])
+        finding["timestamp"] = pkt["timestamp"]
+        yield finding
 
-        if risk_score > 0.75:
-            threat_level = "⚠️ Critical"
-        elif risk_score > 0.4:
-            threat_level = "⚠️ High"
-        else:
-            threat_level = "✅ Safe"
-
-        threat_results.append({
-            "src_ip": pkt.get("src_ip", "Unknown"),
-            "dst_ip": pkt.get("dst_ip", "Unknown"),
-            "protocol": pkt.get("protocol", "Unknown"),
-            "port": pkt.get("dst_port", 0),
-            "packet_size": pkt.get("packet_size", "Unknown"),  # ✅ Include packet size
-            "risk_score": round(risk_score, 2),
-            "threat_level": threat_level
-        })
-
-    # Save AI threat analysis report
+def save_report(file_path, groups, level_counts, histogram, evidence_path=None):
+    """Write the aggregated AI threat analysis report for an analyzed capture."""
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     report_path = os.path.join(AI_REPORT_DIR, f"ai_analysis_{timestamp}.json")
 
     report_data = {
         "timestamp": timestamp,
         "file_analyzed": file_path,
-        "ai_threats_found": threat_results if threat_results else ["✅ No threats detected."]
+        "summary": {
+            "scored_records": int(sum(level_counts.values())),
+            "distinct_findings": len(groups),
+            "findings_listed": min(len(groups), report_engine.MAX_REPORTED_FINDINGS),
+            "by_threat_level": level_counts,
+        },
+        "risk_score_histogram": report_engine.format_histogram(histogram),
+        "ai_threats_found": groups.rows(_rank) if len(groups) else ["✅ No threats detected."],
+        "evidence_file": evidence_path,
     }
 
     with open(report_path, "w") as f:
         json.dump(report_data, f, indent=4)
 
     print(f"✅ AI-based analysis complete. Report saved: {report_path}")
+    return report_path
+
+def _rank(row):
+    """Most severe level first, then the riskiest and largest groups."""
+    return LEVELS.index(row["threat_level"]), -row["max_risk_score"], -row["count"]
+
+class MLScoringStage(analysis_engine.AnalysisStage):
+    """Random forest risk scoring of every packet, aggregated per (source, destination, protocol, port, level)."""
+
+    name = "AI Threat Analysis"
+
+    def __init__(self, model, batch_size=BATCH_SIZE, evidence=False):
+        self.model = model
+        self.batch_size = batch_size
+        self.groups = report_engine.FindingGroups(GROUP_FIELDS)
+        self.level_counts = np.zeros(len(LEVELS), dtype=np.int64)
+        self.histogram = np.zeros(report_engine.SCORE_HISTOGRAM_BINS, dtype=np.int64)
+        self.evidence = report_engine.EvidenceWriter(AI_REPORT_DIR, "ai_analysis") if evidence else None
+
+    def process(self, batch):
+        for part in batch.iter_batches(self.batch_size):
+            risk_scores = score_batch(part, self.model)
+            if risk_scores is not None:
+                self._add(part, risk_scores)
+
+    def _add(self, batch, risk_scores):
+        codes = classify_score_codes(risk_scores)
+        counts = np.bincount(codes, minlength=len(LEVELS))
+        self.level_counts += counts
+        self.histogram += report_engine.score_histogram(risk_scores)
+        metrics.count_level_totals("ml", {LEVELS[code]: int(count) for code, count in enumerate(counts) if count})
+
+        # Only risky packets are itemized; safe traffic is summarized by the counts and histogram
+        flagged = np.flatnonzero(codes < SAFE_CODE)
+        if not len(flagged):
+            return
+
+        first_rows, inverse = report_engine.group_rows([
+            batch[name][flagged] for name in ("ip_version", "src_addr", "dst_addr", "protocol", "dst_port")
+        ] + [codes[flagged]])
+        starts, ends = report_engine.capture_times(batch)
+        packets = report_engine.capture_packets(batch)
+        stats = report_engine.group_stats(inverse, len(first_rows), starts[flagged],
+                                          None if packets is None else packets[flagged], ends[flagged])
+
+        scores = risk_scores[flagged]
+        max_scores = np.zeros(len(first_rows))
+        np.maximum.at(max_scores, inverse, scores)
+        score_sums = np.bincount(inverse, weights=scores, minlength=len(first_rows))
+
+        for index, group, max_score, score_sum in zip(flagged[first_rows], stats, max_scores, score_sums):
+            pkt = batch.packet(index, payload=False)
+            group["max_risk_score"] = float(max_score)
+            group["risk_score_sum"] = float(score_sum)
+            key = (pkt["src_ip"], pkt["dst_ip"], pkt["protocol"], pkt["dst_port"], LEVELS[codes[index]])
+            self.groups.add(key, group)
+
+        if self.evidence is not None:
+            self.evidence.write(_evidence(batch, flagged, risk_scores, codes))
+
+    def finish(self, file_path):
+        evidence_path = self.evidence.close() if self.evidence else None
+        level_counts = {level: int(count) for level, count in zip(LEVELS, self.level_counts)}
+        return save_report(file_path, self.groups, level_counts, self.histogram, evidence_path)
+
+    def get_state(self):
+        return {
+            "groups": self.groups.get_state(),
+            "level_counts": self.level_counts.tolist(),
+            "histogram": self.histogram.tolist(),
+        }
+
+    def set_state(self, state):
+        self.groups.set_state(state.get("groups", []))
+        self.level_counts = np.asarray(state.get("level_counts", self.level_counts), dtype=np.int64)
+        self.histogram = np.asarray(state.get("histogram", self.histogram), dtype=np.int64)
+
+def ai_threat_analysis(file_path=None, batch_size=BATCH_SIZE, flows=False, incremental=False, evidence=False):
+    """Perform AI-based threat analysis on captured packets."""
+    model = load_model()
+    if model is None:
+        return
+
+    analysis_engine.run_analysis([MLScoringStage(model, batch_size, evidence)], file_path, flows=flows,
+                                 incremental=incremental)
 
 if __name__ == "__main__":
-    ai_threat_analysis()
+    metrics.configure_from_env()
+    ai_threat_analysis(evidence="--evidence" in sys.argv[1:])
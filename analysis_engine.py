@@ -0,0 +1,164 @@
+import sys
+import packet_io
+import columnar_store
+import flow_table
+import checkpoints
+import metrics
+
+# Packets handed to every stage per step of the pass
+BATCH_SIZE = 65536
+
+
+class AnalysisStage:
+    """A pluggable analysis step fed by run_analysis with columnar packet batches."""
+
+    name = "Analysis"
+
+    def process(self, batch):
+        """Consume one ColumnarCapture batch."""
+        raise NotImplementedError
+
+    def finish(self, file_path):
+        """Write the stage report for file_path and return its path."""
+        raise NotImplementedError
+
+    def get_state(self):
+        """Return the running aggregates as JSON-serializable data (for incremental runs)."""
+        raise NotImplementedError
+
+    def set_state(self, state):
+        """Restore running aggregates saved by get_state."""
+        raise NotImplementedError
+
+
+def _timed_batches(batches):
+    """Pass batches through, timing each read as the "read" stage."""
+    iterator = iter(batches)
+    while True:
+        with metrics.timer("read"):
+            batch = next(iterator, None)
+        if batch is None:
+            return
+        yield batch
+
+
+def _process(stage, batch):
+    """Feed one batch to a stage, recording its latency and size."""
+    with metrics.timer("process", analyzer=stage.name):
+        stage.process(batch)
+    metrics.inc("records_analyzed_total", len(batch), analyzer=stage.name)
+
+
+def _finish(stage, file_path):
+    with metrics.timer("report", analyzer=stage.name):
+        return stage.finish(file_path)
+
+
+def default_stages(evidence=False):
+    """Build the rule-based, port-security and ML stages (ML is skipped without a model).
+
+    evidence=True also streams every flagged packet to compressed evidence files.
+    """
+    import traffic_analysis
+    import connection_analysis
+    import ai_threat_analysis
+
+    # One set of traffic statistics per pass: the traffic stage keeps it for both reports
+    traffic = traffic_analysis.TrafficThreatStage(evidence)
+    stages = [traffic, connection_analysis.PortSecurityStage(stats_in=traffic.name)]
+
+    model = ai_threat_analysis.load_model()
+    if model is not None:
+        stages.append(ai_threat_analysis.MLScoringStage(model, evidence=evidence))
+
+    return stages
+
+
+def run_analysis(stages, file_path=None, batch_size=BATCH_SIZE, flows=False, incremental=False):
+    """Stream one capture through every stage in a single pass and write each stage's report.
+
+    With flows=True the packets are first aggregated into 5-tuple flows and the stages
+    examine one record per flow instead of one per packet. With incremental=True each
+    stage resumes from its checkpoint for this capture (see run_incremental).
+    """
+    if file_path is None:
+        file_path = packet_io.get_latest_packet_file()
+
+    if not file_path:
+        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
+        return None
+
+    if incremental:
+        if flows:
+            print("⚠️ Incremental analysis works on packets; ignoring flow aggregation.")
+        return run_incremental(stages, file_path, batch_size)
+
+    mode = ", per flow" if flows else ""
+    print(f"🔍 Analyzing packet data from: {file_path} ({', '.join(stage.name for stage in stages)}{mode})")
+
+    if flows:
+        batches = flow_table.iter_flows(file_path, batch_size)
+    else:
+        batches = columnar_store.iter_capture_batches(file_path, batch_size)
+
+    try:
+        for batch in _timed_batches(batches):
+            metrics.observe("batch_size", len(batch))
+            for stage in stages:
+                _process(stage, batch)
+    except Exception as e:
+        print(f"❌ Error analyzing packet log: {e}")
+        return None
+
+    return {stage.name: _finish(stage, file_path) for stage in stages}
+
+
+def run_incremental(stages, file_path, batch_size=BATCH_SIZE):
+    """Analyze only the records added to a capture since each stage's last checkpoint.
+
+    Every stage restores its running aggregates, the capture is read once from the
+    earliest checkpoint, and each stage skips records it has already seen. Reports
+    cover the whole capture so far; stages with nothing new write no report.
+    """
+    positions = {}
+    for stage in stages:
+        checkpoint = checkpoints.load_checkpoint(stage.name, file_path)
+        if checkpoint is not None:
+            stage.set_state(checkpoint["state"])
+        positions[stage] = checkpoints.resume_position(checkpoint)
+
+    start_record, start_offset = min(positions.values())
+    print(f"🔍 Analyzing new packets in: {file_path} from record {start_record} "
+          f"({', '.join(stage.name for stage in stages)})")
+
+    end_position = (start_record, start_offset)
+    try:
+        chunks = columnar_store.iter_capture_chunks(file_path, batch_size, start_record, start_offset)
+        for batch, first, stop, offset in _timed_batches(chunks):
+            metrics.observe("batch_size", len(batch))
+            for stage in stages:
+                seen = positions[stage][0]
+                if seen < stop:
+                    _process(stage, batch.slice(max(seen - first, 0), len(batch)))
+            end_position = (stop, offset)
+    except Exception as e:
+        print(f"❌ Error analyzing packet log: {e}")
+        return None
+
+    reports = {}
+    for stage in stages:
+        if positions[stage][0] >= end_position[0]:
+            print(f"✅ {stage.name}: no new packets since the last run.")
+            reports[stage.name] = None
+            continue
+
+        reports[stage.name] = _finish(stage, file_path)
+        checkpoints.save_checkpoint(stage.name, file_path, end_position[0], end_position[1], stage.get_state())
+
+    return reports
+
+
+if __name__ == "__main__":
+    metrics.configure_from_env()
+    options = sys.argv[1:]
+    run_analysis(default_stages(evidence="--evidence" in options), flows="--flows" in options, incremental="--incremental" in options)
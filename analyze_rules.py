@@ -1,6 +1,10 @@
 import os
 import json
+import argparse
 import datetime
+import metrics
+import rule_space
+import report_engine
 
 # Directory where firewall rules are saved
 FIREWALL_DIR = "logs/firewall_rules"
@@ -9,42 +13,67 @@ REPORT_DIR = "logs/analysis_reports"
 # Ensure report directory exists
 os.makedirs(REPORT_DIR, exist_ok=True)
 
-def get_latest_firewall_file():
-    """Find the latest firewall rules JSON file."""
-    files = [f for f in os.listdir(FIREWALL_DIR) if f.endswith(".json")]
-    if not files:
+def load_latest_rules():
+    """(Windows rules, description) of the latest snapshot in the rule store, or None."""
+    import rule_store
+    # Rule files saved by older versions (or the benchmark) are added to the store once
+    rule_store.import_directory(FIREWALL_DIR, store=rule_store.STORE_DIR)
+    snapshot = rule_store.latest_snapshot(rule_store.SNAPSHOT, rule_store.STORE_DIR)
+    if not snapshot:
         return None
-    
-    # Get the most recent file based on timestamp in filename
-    files.sort(reverse=True)
-    return os.path.join(FIREWALL_DIR, files[0])
+    with metrics.timer("load_rules"):
+        rules = rule_store.load_snapshot(snapshot["id"], rule_store.STORE_DIR)
+    return rules, f"snapshot #{snapshot['id']} ({snapshot['source'] or 'unknown source'})"
 
-def analyze_firewall_rules():
-    """Analyze latest firewall rules for potential threats."""
-    file_path = get_latest_firewall_file()
-    
-    if not file_path:
-        print("❌ No firewall rules found. Please run 'get_firewall_rules.py' first.")
-        return
-    
-    print(f"🔍 Analyzing firewall rules from: {file_path}")
-    
+def analyze_firewall_rules(file_path=None, rule_format=None):
+    """Analyze latest firewall rules (or a Windows JSON, iptables-save or nft rules file) for potential threats."""
+    text = None
     try:
-        with open(file_path, "r") as f:
-            firewall_rules = json.load(f)
+        if file_path is None:
+            latest = load_latest_rules()
+            if not latest:
+                print("❌ No firewall rules found. Please run 'get_firewall_rules.py' first.")
+                return
+            firewall_rules, source = latest
+            rule_format = "windows"
+        else:
+            with open(file_path, "r") as f:
+                text = f.read()
+            source, rule_format = file_path, rule_format or rule_space.detect_format(text)
+            firewall_rules = json.loads(text) if rule_format == "windows" else []
+            firewall_rules = firewall_rules if isinstance(firewall_rules, list) else [firewall_rules]
     except Exception as e:
         print(f"❌ Error reading firewall rules: {e}")
         return
     
+    print(f"🔍 Analyzing firewall rules from: {source}")
+    
     threats = []
     
-    for rule in firewall_rules:
-        action = str(rule.get("Action", "")).lower()  # Convert to string safely
-        enabled = bool(rule.get("Enabled", False))  # Ensure boolean value
+    with metrics.timer("analyze_rules"):
+        for rule in firewall_rules:
+            action = str(rule.get("Action", "")).lower()  # Convert to string safely
+            enabled = bool(rule.get("Enabled", False))  # Ensure boolean value
+
+            if action == "allow" and enabled:  
+                if str(rule.get("Direction", "")).lower() == "inbound" and str(rule.get("Profile", "")).lower() == "public":
+                    threats.append(f"⚠️ Rule '{rule.get('DisplayName', 'Unknown')}' allows inbound traffic on a public network.")
+
+    # Shadowed, redundant and conflicting rules
+    with metrics.timer("rule_interactions"):
+        if rule_format == "windows":
+            indexed, skipped = rule_space.from_windows(firewall_rules)
+        else:
+            indexed, skipped = rule_space.parse_rules(text, rule_format)
+        findings = rule_space.find_interactions(indexed)
+    counts = rule_space.summarize(findings)
+    print(f"🔍 Rule interactions: {counts['shadowed']} shadowed, {counts['redundant']} redundant, "
+          f"{counts['conflict']} conflicting ({len(indexed)} rules indexed, {len(skipped)} skipped)")
 
-        if action == "allow" and enabled:  
-            if str(rule.get("Direction", "")).lower() == "inbound" and str(rule.get("Profile", "")).lower() == "public":
-                threats.append(f"⚠️ Rule '{rule.get('DisplayName', 'Unknown')}' allows inbound traffic on a public network.")
+    metrics.inc("rules_analyzed_total", len(firewall_rules) or len(indexed) + len(skipped))
+    metrics.inc("threats_total", len(threats), analyzer="firewall_rules", level="warning")
+    for kind, count in counts.items():
+        metrics.inc("threats_total", count, analyzer="rule_interactions", level=kind)
 
     # Save report
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -52,8 +81,15 @@ def analyze_firewall_rules():
     
     report_data = {
         "timestamp": timestamp,
-        "file_analyzed": file_path,
-        "threats_found": threats if threats else ["✅ No major threats detected."]
+        "file_analyzed": source,
+        "threats_found": threats if threats else ["✅ No major threats detected."],
+        "rule_interactions": {
+            "rules_indexed": len(indexed),
+            "rules_skipped": len(skipped),
+            "summary": counts,
+            "findings": findings[:report_engine.MAX_REPORTED_FINDINGS],
+            "skipped": skipped[:report_engine.MAX_REPORTED_FINDINGS],
+        },
     }
     
     with open(report_path, "w") as f:
@@ -62,4 +98,10 @@ def analyze_firewall_rules():
     print(f"✅ Analysis complete. Report saved: {report_path}")
 
 if __name__ == "__main__":
-    analyze_firewall_rules()
+    metrics.configure_from_env()
+    parser = argparse.ArgumentParser(description="Analyze firewall rules for risky, shadowed, redundant and conflicting rules.")
+    parser.add_argument("--file", help="rules file to analyze instead of the latest snapshot: Windows rule JSON, "
+                                       "iptables-save or nft list ruleset output")
+    parser.add_argument("--format", choices=["windows", "iptables", "nft"], help="format of --file (default: detected)")
+    args = parser.parse_args()
+    analyze_firewall_rules(args.file, args.format)
@@ -1,80 +1,813 @@
 import os
-import shutil
+import sys
 import json
+import shlex
+import ipaddress
+import argparse
+import datetime
 import subprocess
 
 # Define directories
 FIREWALL_DIR = "logs/firewall_rules"
 BACKUP_DIR = "logs/firewall_backups"
+RESTORE_DIR = "logs/firewall_restores"  # Applied scripts and a journal entry per restore
 os.makedirs(BACKUP_DIR, exist_ok=True)
+os.makedirs(RESTORE_DIR, exist_ok=True)
+
+# Rules are matched by Name when present (unique on Windows), otherwise by DisplayName,
+# and compared on these fields
+RULE_FIELDS = ("Direction", "Action", "Enabled", "Profile")
+# Port, address, program and service filters are kept with a rule when present, compared too
+# (a missing filter counts as "Any") and passed on when it is recreated
+MATCH_FIELDS = ("Protocol", "LocalPort", "RemotePort", "LocalAddress", "RemoteAddress", "Program", "Service")
+ANY = "Any"
+
+# ConvertTo-Json writes the NetSecurity enums as numbers
+DIRECTIONS = {1: "Inbound", 2: "Outbound"}
+ACTIONS = {0: "NotConfigured", 2: "Allow", 4: "Block"}
+ENABLED = {1: True, 2: False, "True": True, "False": False}
+PROFILES = {1: "Domain", 2: "Private", 4: "Public"}
+
+# Linux backends manage their own chains / table, tagging each rule with COMMENT_PREFIX + key|profile
+# (the key is the rule's Name when it has one, as in rule_key)
+# They match on protocol, ports and addresses; rules with other filters or Windows keywords
+# (Program, Service, LocalSubnet, RPC, ...) are refused, since dropping a filter widens the rule
+LINUX_MATCH_FIELDS = ("Protocol", "LocalPort", "RemotePort", "LocalAddress", "RemoteAddress")
+LINUX_PROTOCOLS = {"TCP": "tcp", "UDP": "udp", "ICMPv4": "icmp", "ICMPv6": "icmpv6"}
+PROTOCOL_NUMBERS = {"6": "TCP", "17": "UDP", "1": "ICMPv4", "58": "ICMPv6"}
+# Local / remote filters as packet source / destination (nft names)
+LINUX_SIDES = {
+    "Inbound": {"LocalPort": "dport", "RemotePort": "sport", "LocalAddress": "daddr", "RemoteAddress": "saddr"},
+    "Outbound": {"LocalPort": "sport", "RemotePort": "dport", "LocalAddress": "saddr", "RemoteAddress": "daddr"},
+}
+MULTIPORT_LIMIT = 15  # Ports per iptables multiport match (a range counts as two)
+IPTABLES_CHAINS = {"Inbound": ("FWA-INPUT", "INPUT"), "Outbound": ("FWA-OUTPUT", "OUTPUT")}
+NFT_TABLE = "inet fwa"
+NFT_CHAINS = {"Inbound": ("input", "input"), "Outbound": ("output", "output")}  # chain, hook
+LINUX_TARGETS = {"Allow": "ACCEPT", "Block": "DROP"}
+COMMENT_PREFIX = "fwa:"
+
+# Seconds to wait for a backend command
+COMMAND_TIMEOUT = 300
+
+
+class RestoreError(Exception):
+    """A restore step failed (the backend's error output is in the message)."""
+
+
+# Snapshots offered for backup / restore
+MAX_LISTED = 20
+
+
+def list_firewall_logs(kind="snapshot"):
+    """Recent saved rule sets (snapshot or backup), newest first, as rule store index rows."""
+    import rule_store
+    # Rule files saved by older versions are added to the store once
+    rule_store.import_directory(BACKUP_DIR if kind == rule_store.BACKUP else FIREWALL_DIR, kind)
+    return rule_store.list_snapshots(kind, limit=MAX_LISTED)
+
+
+def _choose(rows, prompt):
+    for i, row in enumerate(rows, 1):
+        print(f"{i}. #{row['id']} {_format_time(row['created'])} - {row['rule_count']} rules ({row['source'] or 'unknown'})")
+    choice = int(input(prompt)) - 1
+    return rows[choice]["id"] if 0 <= choice < len(rows) else None
+
+
+def _format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
 
-def list_firewall_logs():
-    """List all saved firewall rule logs."""
-    files = [f for f in os.listdir(FIREWALL_DIR) if f.endswith(".json")]
-    return files
 
 def backup_firewall_rules():
-    """Backup a selected firewall rules file."""
-    files = list_firewall_logs()
-    if not files:
-        print("No firewall rule logs found.")
+    """Backup a selected firewall rules snapshot."""
+    import rule_store
+    rows = list_firewall_logs()
+    if not rows:
+        print("No firewall rule snapshots found.")
         return
-    
-    # Show available firewall logs
-    print("\nAvailable firewall rule logs:")
-    for i, file in enumerate(files, 1):
-        print(f"{i}. {file}")
-
-    # User selects a file to backup
-    choice = int(input("\nEnter the number of the file to backup: ")) - 1
-    if 0 <= choice < len(files):
-        src_path = os.path.join(FIREWALL_DIR, files[choice])
-        dest_path = os.path.join(BACKUP_DIR, files[choice])
-
-        # Copy the file
-        shutil.copy(src_path, dest_path)
-        print(f"✅ Backup successful: {dest_path}")
-    else:
-        print("❌ Invalid selection.")
 
-def restore_firewall_rules():
-    """Restore a firewall rules backup."""
-    files = [f for f in os.listdir(BACKUP_DIR) if f.endswith(".json")]
-    if not files:
-        print("No backup files found.")
+    # Show available snapshots; user selects one to backup
+    print("\nAvailable firewall rule snapshots:")
+    snapshot_id = _choose(rows, "\nEnter the number of the snapshot to backup: ")
+    if snapshot_id is None:
+        print("❌ Invalid selection.")
         return
 
-    # Show available backups
-    print("\nAvailable backups:")
-    for i, file in enumerate(files, 1):
-        print(f"{i}. {file}")
+    # The backup shares the snapshot's stored rules; nothing is copied
+    backup_id = rule_store.mark_backup(snapshot_id)
+    print(f"✅ Backup successful: backup #{backup_id} of snapshot #{snapshot_id}")
+
+
+def backup_latest_snapshot():
+    """Backup the newest firewall rules snapshot without prompting (GUI / background jobs)."""
+    import rule_store
+    rows = list_firewall_logs()
+    if not rows:
+        print("No firewall rule snapshots found.")
+        return None
+
+    snapshot_id = rows[0]["id"]
+    backup_id = rule_store.mark_backup(snapshot_id)
+    print(f"✅ Backup successful: backup #{backup_id} of snapshot #{snapshot_id} ({_format_time(rows[0]['created'])})")
+    return backup_id
+
+
+def _profile(value):
+    if isinstance(value, int):
+        return ", ".join(name for bit, name in PROFILES.items() if value & bit) or "Any"
+    return str(value)
+
+
+def normalize_rule(rule):
+    """A rule with its key and compared fields as plain strings / booleans (numeric enums decoded)."""
+    normalized = {
+        "Name": rule.get("Name"),
+        "DisplayName": str(rule.get("DisplayName", "")),
+        "Direction": DIRECTIONS.get(rule.get("Direction"), str(rule.get("Direction", ""))),
+        "Action": ACTIONS.get(rule.get("Action"), str(rule.get("Action", ""))),
+        "Enabled": ENABLED.get(rule.get("Enabled"), bool(rule.get("Enabled", True))),
+        "Profile": _profile(rule.get("Profile", "Any")),
+    }
+    if normalized["Name"] is None:
+        del normalized["Name"]
+    for field in MATCH_FIELDS:
+        if rule.get(field) is not None:
+            normalized[field] = rule[field]
+    if "handle" in rule:  # Backend reference to the live rule (nftables)
+        normalized["handle"] = rule["handle"]
+    return normalized
+
+
+def rule_key(rule):
+    return rule.get("Name") or rule["DisplayName"]
+
+
+def _match_value(value):
+    """A filter value in one comparable form: "Any" when missing, one value or a sorted list of strings."""
+    values = value if isinstance(value, (list, tuple)) else [value]
+    values = sorted(str(item) for item in values if item is not None and str(item).strip() != "")
+    if not values or any(item.lower() == "any" for item in values):
+        return ANY
+    return values[0] if len(values) == 1 else values
+
+
+def changed_fields(old, new):
+    """Compared fields (settings and filters) whose values differ between two normalized rules."""
+    changed = [field for field in RULE_FIELDS if old[field] != new[field]]
+    return changed + [field for field in MATCH_FIELDS if _match_value(old.get(field)) != _match_value(new.get(field))]
+
+
+class RuleDiff:
+    """Changes turning one rule set into another: rules to add, remove and modify (old, new)."""
+
+    def __init__(self, add=(), remove=(), modify=()):
+        self.add = list(add)
+        self.remove = list(remove)
+        self.modify = list(modify)
+
+    def __len__(self):
+        return len(self.add) + len(self.remove) + len(self.modify)
+
+    def keys(self):
+        return {rule_key(rule) for rule in self.add + self.remove} | {rule_key(new) for _, new in self.modify}
+
+    def inverse(self):
+        return RuleDiff(self.remove, self.add, [(new, old) for old, new in self.modify])
+
+    def only(self, keys):
+        """The part of the diff touching the given rule keys."""
+        return RuleDiff([rule for rule in self.add if rule_key(rule) in keys],
+                        [rule for rule in self.remove if rule_key(rule) in keys],
+                        [(old, new) for old, new in self.modify if rule_key(new) in keys])
+
+    def summary(self):
+        return {"add": len(self.add), "remove": len(self.remove), "modify": len(self.modify)}
+
+
+def compute_diff(current, desired, prune=False):
+    """Minimal changes from the current rules to the desired ones.
+
+    Rules only present in the current set are removed when prune=True (otherwise left alone).
+    Duplicate keys keep their last rule.
+    """
+    current = {rule_key(rule): rule for rule in map(normalize_rule, current)}
+    desired = {rule_key(rule): rule for rule in map(normalize_rule, desired)}
+
+    diff = RuleDiff()
+    for key, rule in desired.items():
+        old = current.get(key)
+        if old is None:
+            diff.add.append(rule)
+        elif changed_fields(old, rule):
+            diff.modify.append((old, rule))
+    if prune:
+        diff.remove = [rule for key, rule in current.items() if key not in desired]
+    return diff
+
+
+def _run(command, **kwargs):
+    """Run a backend command without a shell; raises RestoreError with its error output."""
+    try:
+        return subprocess.run(command, capture_output=True, text=True, check=True, timeout=COMMAND_TIMEOUT, **kwargs)
+    except subprocess.CalledProcessError as e:
+        raise RestoreError((e.stderr or e.stdout or "").strip() or f"{command[0]} exited with code {e.returncode}")
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RestoreError(str(e))
+
+
+class FirewallBackend:
+    """Reads the live rule set and applies a RuleDiff as one batch script."""
+
+    name = None
+    extension = ".txt"
+    supports_disabled = True  # False: disabled rules are simply absent from the firewall
+    match_fields = MATCH_FIELDS  # Filters the backend keeps with a rule; others are left out of the comparison
+
+    def read_rules(self):
+        raise NotImplementedError
+
+    def render(self, diff):
+        """The batch script applying a diff."""
+        raise NotImplementedError
+
+    def execute(self, script_path, diff):
+        """Apply a rendered script in one call."""
+        raise NotImplementedError
+
+    def translate(self, rule):
+        """The rule's filters as this backend stores them; raises ValueError for filters it cannot express."""
+        return {field: rule[field] for field in self.match_fields if field in rule}
+
+    def prepare(self, rules):
+        """Rules as this backend can hold them; raises RestoreError for rules it cannot express."""
+        prepared, refused = [], []
+        for rule in map(normalize_rule, rules):
+            if not (rule["Enabled"] or self.supports_disabled):
+                continue
+            try:
+                unsupported = [field for field in MATCH_FIELDS
+                               if field not in self.match_fields and _match_value(rule.get(field)) != ANY]
+                if unsupported:
+                    raise ValueError(f"{unsupported[0]} filter")
+                filters = self.translate(rule)
+            except ValueError as e:
+                refused.append(f"{rule_key(rule)!r} ({e})")
+                continue
+            for field in MATCH_FIELDS:
+                rule.pop(field, None)
+            rule.update(filters)
+            prepared.append(rule)
+        if refused:
+            raise RestoreError(f"{self.name} cannot express {len(refused)} rule(s) without widening them, "
+                               f"e.g. {refused[0]}")
+        return prepared
+
+
+def _ps_quote(value):
+    if isinstance(value, list):
+        return ",".join(map(_ps_quote, value))
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class PowerShellBackend(FirewallBackend):
+    """Windows Firewall through one PowerShell script that stops at the first failing cmdlet."""
+
+    name = "powershell"
+    extension = ".ps1"
+
+    def read_rules(self):
+        import get_firewall_rules
+        try:
+            return get_firewall_rules.read_firewall_rules()
+        except Exception as e:
+            raise RestoreError(f"Could not read the firewall rules: {e}")
+
+    @staticmethod
+    def _target(rule):
+        return f"-Name {_ps_quote(rule['Name'])}" if rule.get("Name") else f"-DisplayName {_ps_quote(rule['DisplayName'])}"
+
+    @staticmethod
+    def _settings(rule, old=None):
+        """Cmdlet parameters of a rule; filters the old rule had and the rule lacks are set back to Any."""
+        return (f"-Direction {_ps_quote(rule['Direction'])} -Action {_ps_quote(rule['Action'])} "
+                f"-Profile {_ps_quote(rule['Profile'])} -Enabled {_ps_quote(rule['Enabled'])}"
+                + "".join(f" -{field} {_ps_quote(rule.get(field, ANY))}" for field in MATCH_FIELDS
+                          if field in rule or (old is not None and _match_value(old.get(field)) != ANY)))
+
+    def render(self, diff):
+        lines = ["$ErrorActionPreference = 'Stop'"]
+        lines += [f"Remove-NetFirewallRule {self._target(rule)}" for rule in diff.remove]
+        lines += [f"Set-NetFirewallRule {self._target(new)} {self._settings(new, old)}" for old, new in diff.modify]
+        for rule in diff.add:
+            name = f" -Name {_ps_quote(rule['Name'])}" if rule.get("Name") else ""
+            lines.append(f"New-NetFirewallRule{name} -DisplayName {_ps_quote(rule['DisplayName'])} {self._settings(rule)}")
+        return "\n".join(lines) + "\n"
+
+    def execute(self, script_path, diff):
+        _run(["powershell", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-File", script_path])
+
+
+def _listed(values):
+    values = sorted(set(values))
+    return values[0] if len(values) == 1 else values
+
+
+def _linux_port(value):
+    low, separator, high = value.partition("-")
+    if not (low.isdigit() and (high.isdigit() or not separator)) or int(low) > int(high or low) or int(high or low) > 65535:
+        raise ValueError(f"port {value!r}")
+    return str(int(low)) if int(low) == int(high or low) else f"{int(low)}-{int(high)}"
+
+
+def _linux_address(value):
+    """(address text, IP version) of a host, network (CIDR or netmask) or first-last range."""
+    try:
+        if "-" in value:
+            first, last = (ipaddress.ip_address(part.strip()) for part in value.split("-", 1))
+            if first.version != last.version or first > last:
+                raise ValueError
+            return f"{first}-{last}", first.version
+        network = ipaddress.ip_network(value, strict=False)
+        return str(network), network.version
+    except ValueError:
+        raise ValueError(f"address {value!r}")
+
+
+def linux_filters(rule, ipv6=True):
+    """A rule's protocol, port and address filters in the form the Linux backends read back (Any left out);
+    raises ValueError for filters they cannot express."""
+    filters = {}
+    protocol = _match_value(rule.get("Protocol"))
+    if protocol != ANY:
+        names = {name.lower(): name for name in LINUX_PROTOCOLS}
+        name = None if isinstance(protocol, list) else names.get(PROTOCOL_NUMBERS.get(protocol, protocol).lower())
+        if name is None or (name == "ICMPv6" and not ipv6):
+            raise ValueError(f"protocol {protocol!r}")
+        filters["Protocol"] = name
+
+    for field in ("LocalPort", "RemotePort"):
+        ports = _match_value(rule.get(field))
+        if ports == ANY:
+            continue
+        if filters.get("Protocol") not in ("TCP", "UDP"):
+            raise ValueError(f"{field} without TCP or UDP")
+        filters[field] = _listed(map(_linux_port, ports if isinstance(ports, list) else [ports]))
 
-    # User selects a file to restore
-    choice = int(input("\nEnter the number of the backup to restore: ")) - 1
-    if 0 <= choice < len(files):
-        backup_file = os.path.join(BACKUP_DIR, files[choice])
+    versions = set()
+    for field in ("LocalAddress", "RemoteAddress"):
+        addresses = _match_value(rule.get(field))
+        if addresses == ANY:
+            continue
+        parsed = [_linux_address(address) for address in (addresses if isinstance(addresses, list) else [addresses])]
+        versions.update(version for _, version in parsed)
+        filters[field] = _listed(address for address, _ in parsed)
+    if 6 in versions and not ipv6:
+        raise ValueError("IPv6 address")
+    if len(versions) > 1:
+        raise ValueError("both IPv4 and IPv6 addresses")
+    return filters
 
-        # Load the backup rules
-        with open(backup_file, "r") as f:
-            firewall_rules = json.load(f)
 
-        # Apply firewall rules using PowerShell
-        for rule in firewall_rules:
-            cmd = f'powershell -Command "New-NetFirewallRule -DisplayName \'{rule["DisplayName"]}\' -Direction {rule["Direction"]} -Action {rule["Action"]} -Profile {rule["Profile"]}"'
-            subprocess.run(cmd, shell=True)
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
 
-        print(f"✅ Firewall rules restored from {backup_file}")
+
+def _comment(rule):
+    return f"{COMMENT_PREFIX}{rule_key(rule)}|{rule['Profile']}"
+
+
+def _parse_comment(comment):
+    """(rule key, Profile) from a managed rule comment, or None for rules the tool did not write."""
+    if not comment.startswith(COMMENT_PREFIX):
+        return None
+    name, _, profile = comment[len(COMMENT_PREFIX):].rpartition("|")
+    return name, profile
+
+
+class IptablesBackend(FirewallBackend):
+    """iptables chains FWA-INPUT / FWA-OUTPUT, changed with one `iptables-restore --noflush` transaction."""
+
+    name = "iptables"
+    extension = ".rules"
+    supports_disabled = False
+    match_fields = LINUX_MATCH_FIELDS
+    save_command = "iptables-save"
+    restore_command = "iptables-restore"
+    ipv6 = False
+    # iptables-save options of the filters written by _spec, as packet sides
+    options = {"-s": "saddr", "--src-range": "saddr", "-d": "daddr", "--dst-range": "daddr",
+               "--sport": "sport", "--sports": "sport", "--dport": "dport", "--dports": "dport"}
+
+    def __init__(self):
+        self.chains_exist = False
+
+    def translate(self, rule):
+        filters = linux_filters(rule, self.ipv6)
+        for field in ("LocalAddress", "RemoteAddress"):
+            addresses = _as_list(filters.get(field, []))
+            if len(addresses) > 1 and any("-" in address for address in addresses):
+                raise ValueError(f"{field} mixing ranges with other addresses")
+        for field in ("LocalPort", "RemotePort"):
+            ports = _as_list(filters.get(field, []))
+            if len(ports) + sum("-" in port for port in ports) > MULTIPORT_LIMIT:
+                raise ValueError(f"more than {MULTIPORT_LIMIT} {field} values")
+        return filters
+
+    def read_rules(self):
+        output = _run([self.save_command, "-t", "filter"]).stdout
+        chains = {chain: direction for direction, (chain, _) in IPTABLES_CHAINS.items()}
+        targets = {target: action for action, target in LINUX_TARGETS.items()}
+        self.chains_exist = all(f":{chain} " in output for chain in chains)
+
+        protocols = {name: protocol for protocol, name in LINUX_PROTOCOLS.items()}
+        rules = {}  # iptables lists a rule with several addresses once per address; they are merged back
+        for line in output.splitlines():
+            if not line.startswith("-A "):
+                continue
+            words = shlex.split(line)
+            if words[1] not in chains or "--comment" not in words or "-j" not in words:
+                continue
+            parsed = _parse_comment(words[words.index("--comment") + 1])
+            target = words[words.index("-j") + 1]
+            if not (parsed and target in targets):
+                continue
+            direction = chains[words[1]]
+            rule = rules.setdefault((words[1], parsed), {
+                "Name": parsed[0], "DisplayName": parsed[0], "Direction": direction,
+                "Action": targets[target], "Enabled": True, "Profile": parsed[1]})
+            if "-p" in words:
+                rule["Protocol"] = protocols.get(words[words.index("-p") + 1], words[words.index("-p") + 1])
+            fields = {side: field for field, side in LINUX_SIDES[direction].items()}
+            for option, value in zip(words, words[1:]):
+                if option in self.options:
+                    field = fields[self.options[option]]
+                    values = value.replace(":", "-").split(",")
+                    rule[field] = _listed(_as_list(rule.get(field, [])) + values)
+        return list(rules.values())
+
+    @staticmethod
+    def _spec(rule):
+        sides = {side: rule[field] for field, side in LINUX_SIDES[rule["Direction"]].items() if field in rule}
+        words = [IPTABLES_CHAINS[rule["Direction"]][0]]
+        if "Protocol" in rule:
+            protocol = LINUX_PROTOCOLS[rule["Protocol"]]
+            words += ["-p", protocol]
+            single = [f"--{side} {sides[side].replace('-', ':')}" for side in ("sport", "dport")
+                      if isinstance(sides.get(side), str)]
+            if single:
+                words += ["-m", protocol] + single
+            for side in ("sport", "dport"):
+                if isinstance(sides.get(side), list):
+                    words += ["-m", "multiport", f"--{side}s", ",".join(port.replace("-", ":") for port in sides[side])]
+        for side, option, range_option in (("saddr", "-s", "--src-range"), ("daddr", "-d", "--dst-range")):
+            addresses = _as_list(sides.get(side, []))
+            if len(addresses) == 1 and "-" in addresses[0]:
+                words += ["-m", "iprange", range_option, addresses[0]]
+            elif addresses:
+                words += [option, ",".join(addresses)]
+        # iptables-restore only understands double quotes (with backslash escapes)
+        comment = _comment(rule).replace("\\", "\\\\").replace('"', '\\"')
+        return " ".join(words) + f' -m comment --comment "{comment}" -j {LINUX_TARGETS[rule["Action"]]}'
+
+    def render(self, diff):
+        lines = ["*filter"]
+        if not self.chains_exist:
+            for chain, builtin in IPTABLES_CHAINS.values():
+                lines += [f":{chain} - [0:0]", f"-A {builtin} -j {chain}"]
+        lines += [f"-D {self._spec(rule)}" for rule in diff.remove]
+        lines += [f"-D {self._spec(old)}" for old, _ in diff.modify]
+        lines += [f"-A {self._spec(new)}" for _, new in diff.modify]
+        lines += [f"-A {self._spec(rule)}" for rule in diff.add]
+        return "\n".join(lines + ["COMMIT"]) + "\n"
+
+    def execute(self, script_path, diff):
+        # iptables-restore commits the whole table at once: all lines apply or none do
+        with open(script_path, "r") as f:
+            _run([self.restore_command, "--noflush"], stdin=f)
+        self.chains_exist = True
+
+
+def _nft_values(value):
+    """Values of an nft JSON match operand (a value, prefix, range or set of them) as text."""
+    if isinstance(value, dict):
+        if "set" in value:
+            return [text for item in value["set"] for text in _nft_values(item)]
+        if "prefix" in value:
+            return [f"{value['prefix']['addr']}/{value['prefix']['len']}"]
+        if "range" in value:
+            return ["-".join(map(str, value["range"]))]
+    return [str(value)]
+
+
+def _nft_set(values):
+    return values if isinstance(values, str) else "{ " + ", ".join(values) + " }"
+
+
+class NftBackend(FirewallBackend):
+    """nftables table `inet fwa`, changed with one atomic `nft -f` file."""
+
+    name = "nft"
+    extension = ".nft"
+    supports_disabled = False
+    match_fields = LINUX_MATCH_FIELDS
+
+    def translate(self, rule):
+        return linux_filters(rule)
+
+    def read_rules(self):
+        try:
+            listing = json.loads(_run(["nft", "-j", "list", "table", *NFT_TABLE.split()]).stdout)
+        except RestoreError as e:
+            if "No such file or directory" in str(e):  # The table does not exist yet
+                return []
+            raise
+
+        chains = {chain: direction for direction, (chain, _) in NFT_CHAINS.items()}
+        rules = []
+        for item in listing.get("nftables", []):
+            rule = item.get("rule")
+            if not rule or rule.get("chain") not in chains:
+                continue
+            parsed = _parse_comment(rule.get("comment", ""))
+            verdicts = {key for expression in rule.get("expr", []) for key in expression}
+            action = "Allow" if "accept" in verdicts else "Block" if "drop" in verdicts else None
+            if parsed and action:
+                direction = chains[rule["chain"]]
+                entry = {"Name": parsed[0], "DisplayName": parsed[0], "Direction": direction,
+                         "Action": action, "Enabled": True, "Profile": parsed[1], "handle": rule["handle"]}
+                entry.update(self._filters(rule.get("expr", []), direction))
+                rules.append(entry)
+        return rules
+
+    @staticmethod
+    def _filters(expressions, direction):
+        """Protocol, port and address filters of a listed rule's match expressions."""
+        fields = {side: field for field, side in LINUX_SIDES[direction].items()}
+        protocols = {name: protocol for protocol, name in LINUX_PROTOCOLS.items()}
+        protocols["ipv6-icmp"] = "ICMPv6"
+        filters = {}
+        for expression in expressions:
+            match = expression.get("match", {})
+            left = match.get("left", {})
+            if left.get("meta", {}).get("key") == "l4proto":
+                filters["Protocol"] = protocols.get(str(match["right"]), str(match["right"]))
+            elif "payload" in left and left["payload"].get("field") in fields:
+                payload = left["payload"]
+                if payload.get("protocol") in ("tcp", "udp"):  # The port match implies the protocol
+                    filters.setdefault("Protocol", protocols[payload["protocol"]])
+                filters[fields[payload["field"]]] = _listed(_nft_values(match["right"]))
+        return filters
+
+    @staticmethod
+    def _match(rule):
+        """The rule's filters as nft match expressions."""
+        sides = {side: rule[field] for field, side in LINUX_SIDES[rule["Direction"]].items() if field in rule}
+        words = []
+        if "Protocol" in rule:
+            protocol = LINUX_PROTOCOLS[rule["Protocol"]]
+            words.append(f"meta l4proto {protocol}")
+            words += [f"{protocol} {side} {_nft_set(sides[side])}" for side in ("sport", "dport") if side in sides]
+        for side in ("saddr", "daddr"):
+            if side in sides:
+                family = "ip6" if ":" in _as_list(sides[side])[0] else "ip"
+                words.append(f"{family} {side} {_nft_set(sides[side])}")
+        return "".join(word + " " for word in words)
+
+    def render(self, diff):
+        lines = [f"add table {NFT_TABLE}"]
+        for chain, hook in NFT_CHAINS.values():
+            lines.append(f"add chain {NFT_TABLE} {chain} {{ type filter hook {hook} priority 0; policy accept; }}")
+
+        # Rules are deleted by the handle read with the current rule set
+        for rule in diff.remove + [old for old, _ in diff.modify]:
+            lines.append(f"delete rule {NFT_TABLE} {NFT_CHAINS[rule['Direction']][0]} handle {rule['handle']}")
+        for rule in [new for _, new in diff.modify] + diff.add:
+            lines.append(f"add rule {NFT_TABLE} {NFT_CHAINS[rule['Direction']][0]} {self._match(rule)}"
+                         f"{LINUX_TARGETS[rule['Action']].lower()} comment {json.dumps(_comment(rule), ensure_ascii=False)}")
+        return "\n".join(lines) + "\n"
+
+    def execute(self, script_path, diff):
+        _run(["nft", "-f", script_path])
+
+
+class DryRunBackend(FirewallBackend):
+    """Simulated firewall for previews and local testing: renders scripts in another backend's format,
+    records them and applies the diff to an in-memory rule set.
+
+    fail_after=N makes an apply fail after its first N changes, to exercise rollback.
+    """
+
+    name = "dry-run"
+
+    def __init__(self, rules=(), syntax="powershell", fail_after=None):
+        self.syntax = BACKENDS[syntax]()
+        self.rules = {rule_key(rule): rule for rule in self.syntax.prepare(rules)}
+        self.extension = self.syntax.extension
+        self.supports_disabled = self.syntax.supports_disabled
+        self.match_fields = self.syntax.match_fields
+        self.fail_after = fail_after
+        self.scripts = []  # Every script "executed", in order
+
+    def read_rules(self):
+        return [dict(rule) for rule in self.rules.values()]
+
+    def render(self, diff):
+        if isinstance(self.syntax, NftBackend):
+            # Simulated rules have no kernel handles; name them instead
+            diff = RuleDiff(diff.add, [dict(rule, handle=rule_key(rule)) for rule in diff.remove],
+                            [(dict(old, handle=rule_key(old)), new) for old, new in diff.modify])
+        return self.syntax.render(diff)
+
+    def execute(self, script_path, diff):
+        with open(script_path, "r") as f:
+            self.scripts.append(f.read())
+
+        changes = [(rule_key(rule), None) for rule in diff.remove] + \
+                  [(rule_key(new), new) for _, new in diff.modify] + [(rule_key(rule), rule) for rule in diff.add]
+        for applied, (key, rule) in enumerate(changes):
+            if self.fail_after is not None and applied >= self.fail_after:
+                self.fail_after = None
+                raise RestoreError(f"Simulated failure after {applied} change(s)")
+            if rule is None:
+                self.rules.pop(key, None)
+            else:
+                self.rules[key] = {name: value for name, value in rule.items() if name != "handle"}
+
+    def prepare(self, rules):
+        return self.syntax.prepare(rules)
+
+
+BACKENDS = {
+    "powershell": PowerShellBackend,
+    "iptables": IptablesBackend,
+    "nft": NftBackend,
+    "dry-run": DryRunBackend,
+}
+
+
+def default_backend():
+    return PowerShellBackend() if os.name == "nt" else IptablesBackend()
+
+
+def _write_script(backend, diff, timestamp, label):
+    path = os.path.join(RESTORE_DIR, f"{label}_{timestamp}_{backend.name}{backend.extension}")
+    with open(path, "w") as f:
+        f.write(backend.render(diff))
+    return path
+
+
+def _changed(backend, diff, desired):
+    """Keys of the diff whose live rule still differs from the desired one."""
+    keys = diff.keys()
+    live = [rule for rule in backend.prepare(backend.read_rules()) if rule_key(rule) in keys]
+    wanted = [rule for rule in desired if rule_key(rule) in keys]
+    return compute_diff(live, wanted, prune=True).keys()
+
+
+def restore_rules(desired, backend=None, prune=False, dry_run=False, source=None):
+    """Bring the firewall to a saved rule set with one batched, verified transaction.
+
+    Only the minimal add / modify (and with prune=True, remove) changes are applied. If applying
+    or verifying fails, the touched rules are put back as they were. dry_run=True only writes
+    the script. Returns the journal entry of the restore.
+    """
+    backend = backend or default_backend()
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    original = backend.prepare(backend.read_rules())
+    desired = backend.prepare(desired)
+    diff = compute_diff(original, desired, prune)
+
+    journal = {"timestamp": timestamp, "source": source, "backend": backend.name, "changes": diff.summary(),
+               "script": None, "status": "unchanged"}
+    if diff:
+        journal["script"] = _write_script(backend, diff, timestamp, "restore")
+        journal["status"] = "planned"
+
+    if diff and not dry_run:
+        # Keep the rules being replaced so they can be restored by hand if even the rollback fails
+        import rule_store
+        backup_id = rule_store.save_snapshot(original, source=f"pre_restore {backend.name}", kind=rule_store.BACKUP)
+        journal["pre_restore_backup"] = f"backup #{backup_id}"
+
+        try:
+            backend.execute(journal["script"], diff)
+            failed = _changed(backend, diff, desired)
+            if failed:
+                raise RestoreError(f"{len(failed)} rule(s) did not take effect, e.g. {sorted(failed)[0]!r}")
+            journal["status"] = "applied"
+        except RestoreError as e:
+            journal["error"] = str(e)
+            journal["status"] = _rollback(backend, diff, original, timestamp, journal)
+
+    with open(os.path.join(RESTORE_DIR, f"restore_{timestamp}.json"), "w") as f:
+        json.dump(journal, f, indent=4)
+    return journal
+
+
+def _rollback(backend, diff, original, timestamp, journal):
+    """Undo whatever part of a failed restore took effect; returns the final status."""
+    try:
+        live = backend.prepare(backend.read_rules())
+    except RestoreError:
+        live = None
+    keys = diff.keys()
+    # Re-read the rules to undo exactly what changed; if that fails, assume the whole diff applied
+    undo = diff.inverse() if live is None else compute_diff(live, original, prune=True).only(keys)
+    if not undo:
+        return "failed (nothing applied)"
+
+    try:
+        journal["rollback_script"] = _write_script(backend, undo, timestamp, "rollback")
+        backend.execute(journal["rollback_script"], undo)
+        return "rolled back"
+    except RestoreError as e:
+        journal["rollback_error"] = str(e)
+        return "rollback failed"
+
+
+def _print_result(journal):
+    changes = journal["changes"]
+    counts = f"{changes['add']} to add, {changes['modify']} to modify, {changes['remove']} to remove"
+    status = journal["status"]
+    if status == "unchanged":
+        print("✅ Firewall already matches the backup; nothing to do.")
+    elif status == "planned":
+        print(f"🔍 Dry run ({counts}). Script: {journal['script']}")
+    elif status == "applied":
+        print(f"✅ Firewall rules restored ({counts}) with one {journal['backend']} transaction.")
+    elif status == "rolled back":
+        print(f"❌ Restore failed and was rolled back: {journal['error']}")
     else:
-        print("❌ Invalid selection.")
+        print(f"❌ Restore {status}: {journal.get('rollback_error') or journal['error']}")
+        print(f"⚠️ The previous rules are saved as {journal['pre_restore_backup']} (rule_store.py export)")
+
+
+def load_backup(backup):
+    """Rules of a rule store snapshot / backup id, or of a JSON rules file."""
+    import rule_store
+    if isinstance(backup, int) or str(backup).isdigit():
+        return rule_store.load_snapshot(int(backup)), f"snapshot #{int(backup)}"
+    with open(backup, "r") as f:
+        return json.load(f), backup
+
+
+def restore_firewall_rules(backup=None, backend=None, prune=False, dry_run=False):
+    """Restore a firewall rules backup (snapshot id or JSON file; asks which backup when none is given)."""
+    if backup is None:
+        import rule_store
+        rows = list_firewall_logs(rule_store.BACKUP)
+        if not rows:
+            print("No backups found.")
+            return
+
+        # Show available backups; user selects one to restore
+        print("\nAvailable backups:")
+        backup = _choose(rows, "\nEnter the number of the backup to restore: ")
+        if backup is None:
+            print("❌ Invalid selection.")
+            return
+
+    # Load the backup rules
+    try:
+        firewall_rules, source = load_backup(backup)
+    except (KeyError, OSError, ValueError) as e:
+        print(f"❌ Could not load {backup}: {e}")
+        return None
+
+    try:
+        journal = restore_rules(firewall_rules, backend, prune, dry_run, source=source)
+    except RestoreError as e:
+        print(f"❌ Could not restore {source}: {e}")
+        return None
+    _print_result(journal)
+    return journal
 
 if __name__ == "__main__":
-    print("1. Backup Firewall Rules")
-    print("2. Restore Firewall Rules")
-    choice = input("Choose an option (1 or 2): ")
-
-    if choice == "1":
-        backup_firewall_rules()
-    elif choice == "2":
-        restore_firewall_rules()
-    else:
-        print("❌ Invalid choice.")
+    if len(sys.argv) == 1:
+        print("1. Backup Firewall Rules")
+        print("2. Restore Firewall Rules")
+        choice = input("Choose an option (1 or 2): ")
+
+        if choice == "1":
+            backup_firewall_rules()
+        elif choice == "2":
+            restore_firewall_rules()
+        else:
+            print("❌ Invalid choice.")
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Restore firewall rules from a backup in one transaction.")
+    parser.add_argument("--restore", metavar="BACKUP", help="backup to restore: rule store snapshot id or JSON file")
+    parser.add_argument("--backend", choices=BACKENDS, help="firewall backend (default: PowerShell on Windows, iptables elsewhere)")
+    parser.add_argument("--syntax", choices=[name for name in BACKENDS if name != "dry-run"], default="powershell",
+                        help="script format of the dry-run backend")
+    parser.add_argument("--prune", action="store_true", help="also remove rules that are not in the backup")
+    parser.add_argument("--dry-run", action="store_true", help="only write the script that would be applied")
+    args = parser.parse_args()
+
+    selected = None
+    if args.backend == "dry-run":
+        selected = DryRunBackend(syntax=args.syntax)
+    elif args.backend:
+        selected = BACKENDS[args.backend]()
+    restore_firewall_rules(args.restore, selected, args.prune, args.dry_run)
@@ -0,0 +1,222 @@
+import os
+import json
+import argparse
+import datetime
+import collections
+import concurrent.futures
+import numpy as np
+import packet_io
+import columnar_store
+import flow_table
+import port_policy
+import capture_catalog
+import report_engine
+import stream_stats
+
+# Directory where merged multi-capture reports are stored
+BATCH_REPORT_DIR = "logs/batch_reports"
+
+# Columnar captures longer than this are split into record ranges analyzed in parallel
+CHUNK_ROWS = 1_000_000
+BATCH_SIZE = 65536
+
+# Entries kept in the "top" lists of the merged report
+TOP_COUNT = 20
+
+# ML risk scores are summarized as a histogram over [0, 1]
+RISK_HISTOGRAM_BINS = report_engine.SCORE_HISTOGRAM_BINS
+
+# Ensure report directory exists
+os.makedirs(BATCH_REPORT_DIR, exist_ok=True)
+
+
+def select_captures(pattern=None, since=None, until=None, directory=packet_io.PACKET_LOG_DIR):
+    """List the captures matching a glob and overlapping [since, until], oldest first.
+
+    The capture catalog answers from each capture's recorded time range, so only the
+    selected captures are ever opened. When a capture exists both as a JSON log and as
+    its columnar copy, only the columnar copy is analyzed.
+    """
+    return capture_catalog.find_captures(pattern, since, until, directory)
+
+
+def plan_tasks(files, chunk_rows=CHUNK_ROWS, flows=False):
+    """Split the selected captures into (file, start, stop) work items.
+
+    Large columnar captures are cut into record ranges; JSON logs and flow runs
+    (whose flows may span any range) are analyzed whole (start = stop = None).
+    """
+    tasks = []
+    for file_path in files:
+        if flows or not file_path.endswith(packet_io.COLUMNAR_EXTENSION):
+            tasks.append((file_path, None, None))
+            continue
+        count = len(columnar_store.open_capture(file_path))
+        for start in range(0, max(count, 1), chunk_rows):
+            tasks.append((file_path, start, min(start + chunk_rows, count)))
+    return tasks
+
+
+def _iter_task_batches(file_path, start, stop, flows, batch_size):
+    if flows:
+        return flow_table.iter_flows(file_path, batch_size)
+    if start is None:
+        return columnar_store.iter_capture_batches(file_path, batch_size)
+    return columnar_store.open_capture(file_path).slice(start, stop).iter_batches(batch_size)
+
+
+def analyze_task(task, flows=False, use_model=True, batch_size=BATCH_SIZE):
+    """Map step: analyze one capture (or record range) into mergeable partial results."""
+    import traffic_analysis
+    import connection_analysis
+    import ai_threat_analysis
+
+    file_path, start, stop = task
+    model = ai_threat_analysis.load_model() if use_model else None
+
+    partial = {
+        "records": 0,
+        "packets": 0,
+        "threats_by_level": collections.Counter(),
+        "threat_sources": collections.Counter(),
+        "threat_ports": collections.Counter(),
+        "traffic_stats": stream_stats.StreamStats(),  # Bounded-memory top talkers; merges with +
+        "severity_counts": np.zeros(len(port_policy.SEVERITY_NAMES), dtype=np.int64),
+        "ml_levels": collections.Counter(),
+        "ml_histogram": np.zeros(RISK_HISTOGRAM_BINS, dtype=np.int64),
+    }
+
+    for batch in _iter_task_batches(file_path, start, stop, flows, batch_size):
+        # Flow records carry their own packet totals
+        packets = batch["packets"] if "packets" in batch.columns else np.ones(len(batch), dtype=np.int64)
+        partial["records"] += len(batch)
+        partial["packets"] += int(np.sum(packets))
+
+        for finding in traffic_analysis.find_threats(batch):
+            partial["threats_by_level"][finding["threat_level"]] += 1
+            partial["threat_sources"][finding["src_ip"]] += 1
+            partial["threat_ports"][str(finding["port"])] += 1
+
+        partial["traffic_stats"].update(batch)
+        partial["severity_counts"] += connection_analysis.classify_connections(batch)
+
+        if model is not None and len(batch):
+            risk_scores = model.predict_proba(ai_threat_analysis.extract_feature_matrix(batch))[:, 1]
+            partial["ml_levels"].update(ai_threat_analysis.classify_scores(risk_scores))
+            partial["ml_histogram"] += report_engine.score_histogram(risk_scores, RISK_HISTOGRAM_BINS)
+
+    return partial
+
+
+def merge_partials(partials):
+    """Reduce step: sum the partial results of every task."""
+    merged = None
+    for partial in partials:
+        if merged is None:
+            merged = partial
+            continue
+        for key, value in partial.items():
+            merged[key] = merged[key] + value  # ints, Counters, arrays and StreamStats all add up
+    return merged
+
+
+def _top(counter, key_name, count_name, count=TOP_COUNT):
+    return [{key_name: key, count_name: int(total)} for key, total in counter.most_common(count)]
+
+
+def save_report(files, merged, since=None, until=None, flows=False, top=TOP_COUNT):
+    """Write the merged report for a batch of captures."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = os.path.join(BATCH_REPORT_DIR, f"batch_analysis_{timestamp}.json")
+
+    statistics = merged["traffic_stats"].summary(top)
+    talkers = [{name: talker[name] for name in ("src_ip", "packets", "bytes")} for talker in statistics["top_sources"]]
+
+    report_data = {
+        "timestamp": timestamp,
+        "files_analyzed": files,
+        "time_range": {
+            "since": since.isoformat(sep=" ") if since else None,
+            "until": until.isoformat(sep=" ") if until else None,
+        },
+        "mode": "flows" if flows else "packets",
+        "records_analyzed": merged["records"],
+        "packets_analyzed": merged["packets"],
+        "threats_by_level": dict(merged["threats_by_level"]),
+        "top_threat_sources": _top(merged["threat_sources"], "src_ip", "findings", top),
+        "top_threat_ports": _top(merged["threat_ports"], "port", "findings", top),
+        "top_talkers": talkers,
+        "traffic_statistics": statistics,
+        "connections_by_severity": {
+            name: int(count) for name, count in zip(port_policy.SEVERITY_NAMES, merged["severity_counts"])
+        },
+        "ml_threat_levels": dict(merged["ml_levels"]),
+        "ml_risk_histogram": report_engine.format_histogram(merged["ml_histogram"]),
+    }
+
+    with open(report_path, "w") as f:
+        json.dump(report_data, f, indent=4)
+
+    print(f"✅ Batch analysis complete. Report saved: {report_path}")
+    return report_path
+
+
+def _report_error(task, error):
+    """Report a failed task; the other tasks still make up the merged report."""
+    file_path, start, stop = task
+    part = f" records {start}-{stop}" if start is not None else ""
+    print(f"❌ Error analyzing packet log {file_path}{part}: {error}")
+
+
+def run_batch(pattern=None, since=None, until=None, workers=None, flows=False,
+              chunk_rows=CHUNK_ROWS, directory=packet_io.PACKET_LOG_DIR):
+    """Analyze every selected capture across a process pool and write one merged report."""
+    import ai_threat_analysis
+
+    files = select_captures(pattern, since, until, directory)
+    if not files:
+        print(f"❌ No packet capture files in '{directory}' match the selection.")
+        return None
+
+    tasks = plan_tasks(files, chunk_rows, flows)
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    use_model = ai_threat_analysis.load_model() is not None
+    print(f"🔍 Analyzing {len(files)} capture(s) as {len(tasks)} task(s) on {workers} worker(s)...")
+
+    partials = []
+    if workers == 1:
+        for task in tasks:
+            try:
+                partials.append(analyze_task(task, flows, use_model))
+            except Exception as e:
+                _report_error(task, e)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(analyze_task, task, flows, use_model): task for task in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    partials.append(future.result())
+                except Exception as e:
+                    _report_error(futures[future], e)
+
+    merged = merge_partials(partials)
+    if merged is None:
+        return None
+    return save_report(files, merged, since, until, flows)
+
+
+def _parse_time(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze many captures in parallel into one merged report.")
+    parser.add_argument("--glob", help="capture file pattern inside the packet log directory (e.g. 'packets_20250301_*')")
+    parser.add_argument("--since", type=_parse_time, help="only captures with packets after this time (YYYY-MM-DD[ HH:MM[:SS]])")
+    parser.add_argument("--until", type=_parse_time, help="only captures with packets before this time")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--flows", action="store_true", help="analyze 5-tuple flows instead of packets")
+    parser.add_argument("--directory", default=packet_io.PACKET_LOG_DIR)
+    args = parser.parse_args()
+
+    run_batch(args.glob, args.since, args.until, args.workers, args.flows, directory=args.directory)
@@ -0,0 +1,483 @@
+import os
+import io
+import json
+import time
+import struct
+import socket
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import threading
+import contextlib
+import numpy as np
+import psutil
+import packet_io
+import columnar_store
+import packet_decoder
+import ip_reputation
+
+# Directory where benchmark results are stored
+BENCHMARK_DIR = "logs/benchmarks"
+
+# Real-world fixture shipped with the project
+FIXTURE_NAME = "packets_20250330_112320.json"
+FIXTURE_PATHS = [os.path.join(packet_io.PACKET_LOG_DIR, FIXTURE_NAME),
+                 os.path.join(os.path.dirname(os.path.abspath(__file__)), FIXTURE_NAME)]
+
+# Synthetic traffic defaults
+DEFAULT_PACKETS = 100_000
+DEFAULT_SEED = 42
+DEFAULT_IPV6_RATIO = 0.2
+DEFAULT_MALICIOUS_RATIO = 0.01
+DEFAULT_RULES = 5000
+DEFAULT_REPEAT = 3
+
+# Destination port -> share of generated TCP/UDP packets (the rest go to random high ports)
+DEFAULT_PORT_WEIGHTS = {443: 0.45, 80: 0.15, 53: 0.15, 22: 0.03, 25: 0.02, 3389: 0.01, 445: 0.01, 23: 0.005}
+ICMP_RATIO = 0.01
+UDP_PORTS = (53,)
+
+# Payload signature scan: packet sizes of the fixture, scaled up to this much payload with
+# HTTP-like text and a share of payloads carrying a built-in signature
+DEFAULT_PAYLOAD_MB = 64
+SIGNATURE_HIT_RATIO = 0.001
+PAYLOAD_HEADER_BYTES = 54  # Ethernet, IP and TCP headers left out of a packet's payload
+PAYLOAD_WORDS = [b"GET", b"POST", b"/index.html", b"HTTP/1.1", b"Host:", b"example.com", b"Accept:", b"text/html",
+                 b"Content-Type:", b"application/json", b"Content-Length:", b"Cookie:", b"session=", b"gzip",
+                 b"keep-alive", b"User-Agent:", b"Mozilla/5.0", b"\r\n", b'{"id":', b'"value":', b"200", b"OK"]
+
+# Frames per decode call and resident-memory sampling interval
+DECODE_BATCH = 1024
+RSS_SAMPLE_SECONDS = 0.005
+
+# Ensure benchmark directory exists
+os.makedirs(BENCHMARK_DIR, exist_ok=True)
+
+
+def generate_packets(count=DEFAULT_PACKETS, ipv6_ratio=DEFAULT_IPV6_RATIO, malicious_ratio=DEFAULT_MALICIOUS_RATIO,
+                     port_weights=None, seed=DEFAULT_SEED, start_time=1743333800.0):
+    """Generate deterministic capture records (same fields capture_packets writes)."""
+    rng = np.random.default_rng(seed)
+    port_weights = DEFAULT_PORT_WEIGHTS if port_weights is None else port_weights
+
+    ports = np.array(list(port_weights), dtype=np.int64)
+    weights = np.array(list(port_weights.values()), dtype=np.float64)
+    weights = np.append(weights, max(0.0, 1.0 - weights.sum()))  # Remaining share: random high ports
+    choice = rng.choice(len(weights), size=count, p=weights / weights.sum())
+    dst_ports = np.where(choice < len(ports), ports[np.minimum(choice, len(ports) - 1)],
+                         rng.integers(1024, 65536, size=count))
+    src_ports = rng.integers(32768, 61000, size=count)
+
+    icmp = rng.random(count) < ICMP_RATIO
+    udp = ~icmp & np.isin(dst_ports, UDP_PORTS)
+    protocols = np.where(icmp, 1, np.where(udp, 17, 6))
+    ipv6 = rng.random(count) < ipv6_ratio
+    malicious = rng.random(count) < malicious_ratio
+    hosts = rng.integers(1, 255, size=(count, 2))
+    sizes = rng.integers(60, 1500, size=count)
+    flags = np.where(protocols == 6, rng.choice([0x02, 0x10, 0x18, 0x11], size=count), 0)
+    timestamps = start_time + np.cumsum(rng.exponential(0.001, size=count))
+    bad_ips = ip_reputation.DEFAULT_MALICIOUS_IPS
+
+    records = []
+    for i in range(count):
+        if ipv6[i]:
+            src_ip = f"2001:db8:{hosts[i, 0]:x}::{hosts[i, 1]:x}"
+            dst_ip = f"2406:7400:30:9::{hosts[i, 1]:x}"
+        else:
+            src_ip = f"10.0.{hosts[i, 0]}.{hosts[i, 1]}"
+            dst_ip = f"172.16.{hosts[i, 1]}.{hosts[i, 0]}"
+        if malicious[i] and not ipv6[i]:
+            src_ip = bad_ips[i % len(bad_ips)]
+
+        has_ports = protocols[i] != 1
+        records.append({
+            "timestamp": datetime.datetime.fromtimestamp(timestamps[i]).strftime("%Y-%m-%d %H:%M:%S"),
+            "protocol": int(protocols[i]),
+            "source_ip": src_ip,
+            "destination_ip": dst_ip,
+            "source_port": int(src_ports[i]) if has_ports else "Unknown",
+            "destination_port": int(dst_ports[i]) if has_ports else "Unknown",
+            "tcp_flags": int(flags[i]),
+            "packet_size": int(sizes[i]),
+            "payload": "No Payload",
+        })
+    return records
+
+
+def generate_payloads(lengths, seed=DEFAULT_SEED, hit_ratio=SIGNATURE_HIT_RATIO):
+    """Deterministic HTTP-like payloads of the given lengths, with a built-in signature planted in a share of them.
+
+    Returns (payload offsets, payload blob) as stored in a ColumnarCapture.
+    """
+    import signature_engine
+    rng = np.random.default_rng(seed)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    pool = np.frombuffer(b" ".join(rng.choice(PAYLOAD_WORDS, 2 ** 18)), dtype=np.uint8)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=columnar_store.PAYLOAD_OFFSETS[1])
+    np.cumsum(lengths, out=offsets[1:])
+    starts = rng.integers(0, len(pool) - int(lengths.max(initial=0)), size=len(lengths))
+    blob = pool[np.repeat(starts - offsets[:-1].astype(np.int64), lengths) + np.arange(int(offsets[-1]))]
+
+    patterns = [signature_engine.parse_pattern(signature["pattern"]) for signature in signature_engine.DEFAULT_SIGNATURES]
+    for row in np.flatnonzero(rng.random(len(lengths)) < hit_ratio).tolist():
+        pattern = patterns[row % len(patterns)]
+        if len(pattern) <= lengths[row]:
+            start = int(offsets[row]) + int(rng.integers(0, lengths[row] - len(pattern) + 1))
+            blob[start:start + len(pattern)] = np.frombuffer(pattern, dtype=np.uint8)
+    return offsets, blob
+
+
+def payload_capture(capture, sizes, payload_mb=DEFAULT_PAYLOAD_MB, seed=DEFAULT_SEED):
+    """Tile a capture's packets until their payloads (packet size minus headers) reach payload_mb, with generated payloads.
+
+    Packets of unknown size take theirs from `sizes` (cycled).
+    """
+    lengths = np.asarray(capture["length"], dtype=np.int64)
+    lengths = np.where(lengths > 0, lengths, np.resize(np.asarray(sizes, dtype=np.int64), len(lengths)))
+    payload_lengths = np.maximum(lengths - PAYLOAD_HEADER_BYTES, 0)
+    per_copy = max(int(payload_lengths.sum()), 1)
+    copies = -(-payload_mb * 2 ** 20 // per_copy)
+    columns = {name: np.tile(column, copies) for name, column in capture.columns.items()}
+    offsets, blob = generate_payloads(np.tile(payload_lengths, copies), seed)
+    return columnar_store.ColumnarCapture(columns, offsets, blob)
+
+
+def generate_firewall_rules(count=DEFAULT_RULES, seed=DEFAULT_SEED):
+    """Generate deterministic firewall rules in the get_firewall_rules.py format."""
+    rng = np.random.default_rng(seed)
+    directions = rng.choice(["Inbound", "Outbound"], size=count)
+    actions = rng.choice(["Allow", "Block"], size=count, p=[0.8, 0.2])
+    profiles = rng.choice(["Public", "Private", "Domain", "Any"], size=count)
+    enabled = rng.random(count) < 0.7
+    return [{"DisplayName": f"Benchmark Rule {i}", "Direction": str(directions[i]), "Action": str(actions[i]),
+             "Enabled": bool(enabled[i]), "Profile": str(profiles[i])} for i in range(count)]
+
+
+def build_frame(record):
+    """Encode a capture record as an Ethernet frame (for the decoder and pcap benchmarks)."""
+    version, src = columnar_store.encode_ip(record["source_ip"])
+    _, dst = columnar_store.encode_ip(record["destination_ip"])
+    protocol = record["protocol"]
+    size = record["packet_size"]
+
+    if protocol == 6:
+        transport = struct.pack("!HHIIBBHHH", record["source_port"], record["destination_port"], 0, 0,
+                                5 << 4, record["tcp_flags"], 65535, 0, 0)
+    elif protocol == 17:
+        transport = struct.pack("!HHHH", record["source_port"], record["destination_port"], 8, 0)
+    else:
+        transport = struct.pack("!BBHI", 8, 0, 0, 0)
+
+    if version == 6:
+        header_size = 14 + 40 + len(transport)
+        body = transport + bytes(max(size - header_size, 0))
+        network = struct.pack("!IHBB", 6 << 28, len(body), protocol, 64) + src + dst
+        ethertype = packet_decoder.ETHERTYPE_IPV6
+    else:
+        header_size = 14 + 20 + len(transport)
+        body = transport + bytes(max(size - header_size, 0))
+        network = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(body), 0, 0, 64, protocol, 0,
+                              socket.inet_aton(record["source_ip"]), socket.inet_aton(record["destination_ip"]))
+        ethertype = packet_decoder.ETHERTYPE_IPV4
+
+    return bytes(12) + struct.pack("!H", ethertype) + network + body
+
+
+def write_pcap(path, frames, timestamps):
+    """Write Ethernet frames to a classic microsecond pcap file."""
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, packet_decoder.LINKTYPE_ETHERNET))
+        for frame, timestamp in zip(frames, timestamps):
+            seconds = int(timestamp)
+            f.write(struct.pack("<IIII", seconds, int((timestamp - seconds) * 1e6), len(frame), len(frame)))
+            f.write(frame)
+
+
+class PeakRSS:
+    """Sample the process resident set size in the background and keep the peak."""
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def _percentile(values, fraction):
+    return float(np.percentile(values, fraction * 100)) if len(values) else None
+
+
+def measure(name, units, items_per_unit, unit="run", repeat=DEFAULT_REPEAT, bytes_per_item=None):
+    """Time a benchmark: `units` is a callable returning an iterable of zero-argument work units.
+
+    Every unit is timed separately (for latency percentiles); the whole set runs `repeat` times.
+    With bytes_per_item, the byte throughput is reported as well.
+    """
+    latencies = []
+    items = 0
+    with PeakRSS() as rss, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for work in units():
+                unit_start = time.perf_counter()
+                result = work()
+                latencies.append(time.perf_counter() - unit_start)
+                items += result if isinstance(result, int) and not isinstance(result, bool) else items_per_unit
+        elapsed = time.perf_counter() - started
+
+    busy = sum(latencies)
+    result = {
+        "name": name,
+        "unit": unit,
+        "units": len(latencies),
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "packets_per_sec": round(items / busy, 1) if busy else None,
+        "latency_ms_p50": round(_percentile(latencies, 0.50) * 1000, 4) if latencies else None,
+        "latency_ms_p99": round(_percentile(latencies, 0.99) * 1000, 4) if latencies else None,
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+    }
+    if bytes_per_item is not None:
+        result["mb_per_sec"] = round(items * bytes_per_item / busy / 2 ** 20, 1) if busy else None
+    return result
+
+
+@contextlib.contextmanager
+def report_dirs(directory):
+    """Send analyzer reports to a scratch directory while benchmarking."""
+    import traffic_analysis
+    import connection_analysis
+    import ai_threat_analysis
+    import analyze_rules
+    import rule_store
+
+    targets = [(traffic_analysis, "REPORT_DIR"), (connection_analysis, "CONN_REPORT_DIR"),
+               (ai_threat_analysis, "AI_REPORT_DIR"), (analyze_rules, "REPORT_DIR"), (analyze_rules, "FIREWALL_DIR"),
+               (rule_store, "STORE_DIR")]
+    saved = [getattr(module, name) for module, name in targets]
+    for module, name in targets:
+        setattr(module, name, os.path.join(directory, name.lower()))
+        os.makedirs(getattr(module, name), exist_ok=True)
+    try:
+        yield
+    finally:
+        for (module, name), value in zip(targets, saved):
+            setattr(module, name, value)
+
+
+def _scan_batches(batches):
+    """Read every column of every batch (memory-mapped columns are otherwise never touched)."""
+    count = 0
+    for batch in batches:
+        for column in batch.columns.values():
+            np.array(column)
+        count += len(batch)
+    return count
+
+
+def _scan_signatures(automaton, batch):
+    automaton.scan_capture(batch)
+    return len(batch)
+
+
+def _packet_count(file_path):
+    return sum(1 for _ in packet_io.iter_packets(file_path))
+
+
+def run_benchmarks(packets=DEFAULT_PACKETS, ipv6_ratio=DEFAULT_IPV6_RATIO, malicious_ratio=DEFAULT_MALICIOUS_RATIO,
+                   seed=DEFAULT_SEED, rules=DEFAULT_RULES, repeat=DEFAULT_REPEAT, only=None,
+                   payload_mb=DEFAULT_PAYLOAD_MB):
+    """Run every benchmark on synthetic traffic (and the bundled fixture) and return the results."""
+    import traffic_analysis
+    import connection_analysis
+    import ai_threat_analysis
+    import analyze_rules
+    import analysis_engine
+    import signature_engine
+
+    results = []
+    scratch = tempfile.mkdtemp(prefix="benchmark_")
+
+    def bench(name, *args, **kwargs):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            return
+        print(f"⏱️ {name}...")
+        result = measure(name, *args, **kwargs)
+        throughput = f", {result['mb_per_sec']} MB/s" if "mb_per_sec" in result else ""
+        print(f"   {result['packets_per_sec']} packets/s{throughput}, p50 {result['latency_ms_p50']} ms, "
+              f"p99 {result['latency_ms_p99']} ms, peak RSS {result['peak_rss_mb']} MB")
+        results.append(result)
+
+    try:
+        with report_dirs(scratch):
+            records = generate_packets(packets, ipv6_ratio, malicious_ratio, seed=seed)
+            timestamps = columnar_store.records_to_columns(records)["timestamp"].tolist()
+            frames = [build_frame(record) for record in records]
+
+            # Capture record construction: raw header decoding vs. columnar encoding of ready records
+            def decode_units():
+                for start in range(0, len(frames), DECODE_BATCH):
+                    batch = list(zip(timestamps[start:start + DECODE_BATCH], frames[start:start + DECODE_BATCH]))
+                    yield lambda batch=batch: len(packet_decoder.decode_raw_frames(batch))
+            bench("capture.decode_frames", decode_units, DECODE_BATCH, unit=f"batch of {DECODE_BATCH}", repeat=repeat)
+
+            def encode_units():
+                for start in range(0, len(records), DECODE_BATCH):
+                    batch = records[start:start + DECODE_BATCH]
+                    yield lambda batch=batch: len(columnar_store.records_to_columns(batch))
+            bench("capture.encode_records", encode_units, DECODE_BATCH, unit=f"batch of {DECODE_BATCH}", repeat=repeat)
+
+            # File write / read
+            segment_dir = os.path.join(scratch, "segments")
+
+            def write_segments():
+                shutil.rmtree(segment_dir, ignore_errors=True)
+                with packet_io.PacketWriter(segment_dir, prefix="bench") as writer:
+                    for record in records:
+                        writer.write(record)
+                return writer.packets_written
+            bench("io.write_segment", lambda: [write_segments], packets, repeat=repeat)
+            write_segments()
+            segment = os.path.join(segment_dir, sorted(os.listdir(segment_dir))[0])
+
+            columnar = os.path.join(scratch, "bench.cols")
+            bench("io.write_columnar", lambda: [lambda: len(columnar_store.load_capture(
+                columnar_store.convert_packet_log(segment, columnar)))], packets, repeat=repeat)
+            if not os.path.exists(columnar):
+                columnar_store.convert_packet_log(segment, columnar)  # Skipped above when filtered out by --only
+
+            pcap = os.path.join(scratch, "bench.pcap")
+            write_pcap(pcap, frames, timestamps)
+
+            bench("io.read_segment", lambda: [lambda: _packet_count(segment)], packets, repeat=repeat)
+            bench("io.read_columnar", lambda: [lambda: _scan_batches(columnar_store.iter_capture_batches(columnar))],
+                  packets, repeat=repeat)
+            bench("io.read_pcap", lambda: [lambda: _scan_batches(packet_decoder.iter_pcap_batches(pcap))],
+                  packets, repeat=repeat)
+
+            # Analyzers, on the synthetic capture and the bundled fixture
+            datasets = [("synthetic", segment, packets), ("synthetic_columnar", columnar, packets)]
+            fixture = next((path for path in FIXTURE_PATHS if os.path.exists(path)), None)
+            if fixture:
+                datasets.append(("fixture", fixture, _packet_count(fixture)))
+            else:
+                print(f"⚠️ Fixture {FIXTURE_NAME} not found; skipping real-world benchmarks.")
+
+            model = ai_threat_analysis.load_model()
+            for label, path, count in datasets:
+                bench(f"traffic_analysis.{label}", lambda path=path: [lambda: traffic_analysis.analyze_packets(path)],
+                      count, repeat=repeat)
+                bench(f"connection_analysis.{label}", lambda path=path: [lambda: connection_analysis.analyze_connections(path)],
+                      count, repeat=repeat)
+                if model is not None:
+                    capture = columnar_store.load_capture(path)
+                    bench(f"ai_scoring.{label}",
+                          lambda capture=capture: [lambda batch=batch: len(ai_threat_analysis.score_capture(batch, model))
+                                                   for batch in capture.iter_batches(ai_threat_analysis.BATCH_SIZE)],
+                          ai_threat_analysis.BATCH_SIZE, unit=f"batch of {ai_threat_analysis.BATCH_SIZE}", repeat=repeat)
+
+            # Payload signature matching on the fixture's (or synthetic) packet sizes, scaled up
+            if not only or any("signatures.scan".startswith(prefix) for prefix in only):
+                automaton = signature_engine.get_automaton()
+                scaled = payload_capture(columnar_store.load_capture(fixture or columnar),
+                                         columnar_store.open_capture(columnar)["length"], payload_mb, seed)
+                bench("signatures.scan",
+                      lambda: [lambda batch=batch: _scan_signatures(automaton, batch)
+                               for batch in scaled.iter_batches(analysis_engine.BATCH_SIZE)],
+                      analysis_engine.BATCH_SIZE, unit=f"batch of {analysis_engine.BATCH_SIZE}", repeat=repeat,
+                      bytes_per_item=int(scaled.payload_offsets[-1]) / len(scaled))
+
+            # Firewall rule analysis
+            rule_path = os.path.join(analyze_rules.FIREWALL_DIR, "firewall_rules_benchmark.json")
+            with open(rule_path, "w") as f:
+                json.dump(generate_firewall_rules(rules, seed), f)
+            bench("analyze_rules", lambda: [analyze_rules.analyze_firewall_rules], rules, unit="run", repeat=repeat)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return results
+
+
+def environment():
+    """Describe the machine and library versions a result was measured on."""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "memory_mb": round(psutil.virtual_memory().total / 2 ** 20),
+    }
+
+
+def save_results(results, parameters, output_path=None):
+    """Write benchmark results as JSON."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    if output_path is None:
+        output_path = os.path.join(BENCHMARK_DIR, f"benchmark_{timestamp}.json")
+
+    with open(output_path, "w") as f:
+        json.dump({"timestamp": timestamp, "environment": environment(), "parameters": parameters,
+                   "results": results}, f, indent=4)
+
+    print(f"✅ Benchmark complete. Results saved: {output_path}")
+    return output_path
+
+
+def compare_results(baseline_path, results):
+    """Print the throughput change of every benchmark against a saved baseline run."""
+    with open(baseline_path, "r") as f:
+        baseline = {result["name"]: result for result in json.load(f)["results"]}
+
+    print(f"📊 Compared with {baseline_path}:")
+    for result in results:
+        before = baseline.get(result["name"])
+        if not before or not before.get("packets_per_sec") or not result["packets_per_sec"]:
+            continue
+        change = result["packets_per_sec"] / before["packets_per_sec"] - 1
+        marker = "⚠️" if change < -0.1 else "✅"
+        print(f"{marker} {result['name']}: {change:+.1%} packets/s, "
+              f"peak RSS {before['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic and real traffic.")
+    parser.add_argument("--packets", type=int, default=DEFAULT_PACKETS)
+    parser.add_argument("--ipv6-ratio", type=float, default=DEFAULT_IPV6_RATIO)
+    parser.add_argument("--malicious-ratio", type=float, default=DEFAULT_MALICIOUS_RATIO)
+    parser.add_argument("--rules", type=int, default=DEFAULT_RULES, help="synthetic firewall rules")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--payload-mb", type=int, default=DEFAULT_PAYLOAD_MB, help="payload scanned for signatures")
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose name starts with these prefixes")
+    parser.add_argument("--output", help="results file (default: logs/benchmarks/benchmark_<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    args = parser.parse_args()
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    results = run_benchmarks(args.packets, args.ipv6_ratio, args.malicious_ratio, args.seed, args.rules,
+                             args.repeat, args.only, args.payload_mb)
+    save_results(results, parameters, args.output)
+    if args.compare:
+        compare_results(args.compare, results)
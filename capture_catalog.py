@@ -0,0 +1,302 @@
+import os
+import re
+import sys
+import time
+import json
+import sqlite3
+import argparse
+import datetime
+import contextlib
+import collections
+import numpy as np
+import packet_io
+import columnar_store
+
+# Each capture directory keeps its own catalog next to the captures
+CATALOG_FILE = "capture_catalog.sqlite"
+SQLITE_TIMEOUT = 30  # Seconds to wait while another process writes the catalog
+# Seconds without writes after which a segment still cataloged with no packets (left open by a
+# killed capture) is rescanned; live captures re-register their segments when they rotate or close
+OPEN_SEGMENT_IDLE = 60
+
+# Capture start time embedded in capture file names (captured_packets_<ts>.json, packets_<ts>_0000.jsonl),
+# used when a capture holds no readable timestamps
+NAME_TIMESTAMP = re.compile(r"(\d{8}_\d{6})")
+NAME_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    name TEXT PRIMARY KEY,   -- File name inside the catalog's directory
+    stem TEXT NOT NULL,      -- Name without extension (a log and its columnar copy share it)
+    format TEXT NOT NULL,    -- json, jsonl, cols, pcap or pcapng
+    start_time REAL,         -- First and last packet time, seconds since the epoch
+    end_time REAL,
+    packets INTEGER,
+    bytes INTEGER,           -- Sum of packet sizes
+    file_size INTEGER,       -- Bytes on disk
+    mtime REAL,
+    stats TEXT               -- JSON summary (packets per protocol)
+);
+CREATE INDEX IF NOT EXISTS captures_start ON captures (start_time);
+CREATE INDEX IF NOT EXISTS captures_end ON captures (end_time);
+CREATE INDEX IF NOT EXISTS captures_order ON captures (stem, format);
+CREATE INDEX IF NOT EXISTS captures_open ON captures (name) WHERE packets = 0;
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class CaptureSummary:
+    """Running time range, packet and byte totals and protocol mix of a capture being written or scanned."""
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.packets = 0
+        self.bytes = 0
+        self.protocols = collections.Counter()
+
+    def _add_times(self, first, last):
+        self.start = first if self.start is None else min(self.start, first)
+        self.end = last if self.end is None else max(self.end, last)
+
+    def add_record(self, record):
+        """Count one capture record (as passed to PacketWriter.write)."""
+        timestamp = columnar_store.encode_timestamp(record.get("timestamp"))
+        if timestamp:
+            self._add_times(timestamp, timestamp)
+        self.packets += 1
+
+        size = record.get("packet_size", record.get("length"))
+        if isinstance(size, int):
+            self.bytes += size
+        protocol = record.get("protocol", "Unknown")
+        self.protocols[str(packet_io.PROTOCOL_NAMES.get(protocol, protocol))] += 1
+
+    def add_batch(self, capture):
+        """Count a ColumnarCapture batch with vectorized column reductions."""
+        timestamps = np.asarray(capture["timestamp"])
+        known = timestamps[timestamps > 0]
+        if len(known):
+            self._add_times(float(known.min()), float(known.max()))
+        self.packets += len(capture)
+        self.bytes += int(np.sum(capture["length"], dtype=np.int64))
+
+        protocols, counts = np.unique(capture["protocol"], return_counts=True)
+        for protocol, count in zip(protocols.tolist(), counts.tolist()):
+            name = packet_io.PROTOCOL_NAMES.get(protocol, protocol) if protocol >= 0 else "Unknown"
+            self.protocols[str(name)] += count
+
+    def stats(self):
+        return {"protocols": dict(self.protocols)}
+
+
+def catalog_path(directory=packet_io.PACKET_LOG_DIR):
+    return os.path.join(directory, CATALOG_FILE)
+
+
+@contextlib.contextmanager
+def connect(directory=packet_io.PACKET_LOG_DIR):
+    """Open (creating if needed) a directory's catalog; commits when the block succeeds."""
+    connection = sqlite3.connect(catalog_path(directory), timeout=SQLITE_TIMEOUT)
+    try:
+        # Catalog writes must not create or delete files, or sync_catalog would see the directory change
+        connection.execute("PRAGMA journal_mode = PERSIST")
+        connection.executescript(SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def summarize_file(file_path):
+    """Scan a capture log once to build its summary."""
+    summary = CaptureSummary()
+    for batch in columnar_store.iter_capture_batches(file_path):
+        summary.add_batch(batch)
+    return summary
+
+
+def _name_time(file_name):
+    match = NAME_TIMESTAMP.search(file_name)
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1), NAME_TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+def _disk_usage(path):
+    """(bytes on disk, modification time) of a capture file or columnar directory."""
+    info = os.stat(path)
+    if not os.path.isdir(path):
+        return info.st_size, info.st_mtime
+    size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return size, info.st_mtime
+
+
+def _store(connection, file_path, summary):
+    name = os.path.basename(file_path)
+    stem, extension = os.path.splitext(name)
+    file_size, mtime = _disk_usage(file_path)
+
+    # Capture options and statistics recorded when the capture was taken survive rescans
+    stats = summary.stats()
+    if "capture" not in stats:
+        row = connection.execute("SELECT stats FROM captures WHERE name = ?", (name,)).fetchone()
+        if row and "capture" in json.loads(row[0]):
+            stats["capture"] = json.loads(row[0])["capture"]
+
+    # Without packet timestamps, fall back to the name's start time and the last modification
+    start, end = summary.start, summary.end
+    if start is None:
+        start = _name_time(name) or mtime
+        end = mtime
+
+    connection.execute(
+        "INSERT OR REPLACE INTO captures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (name, stem, extension.lstrip("."), start, end, summary.packets, summary.bytes,
+         file_size, mtime, json.dumps(stats)),
+    )
+
+
+def register_capture(file_path, summary=None):
+    """Add or update a capture in its directory's catalog (scanning it when no summary is given)."""
+    if summary is None:
+        summary = summarize_file(file_path)
+    with connect(os.path.dirname(file_path) or ".") as connection:
+        _store(connection, file_path, summary)
+
+
+def set_capture_info(paths, info):
+    """Store a capture's options and rate/drop statistics with each of its cataloged files."""
+    for file_path in paths:
+        with connect(os.path.dirname(file_path) or ".") as connection:
+            name = os.path.basename(file_path)
+            row = connection.execute("SELECT stats FROM captures WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                _store(connection, file_path, summarize_file(file_path))
+                row = connection.execute("SELECT stats FROM captures WHERE name = ?", (name,)).fetchone()
+            stats = dict(json.loads(row[0]), capture=info)
+            connection.execute("UPDATE captures SET stats = ? WHERE name = ?", (json.dumps(stats), name))
+
+
+def sync_catalog(directory=packet_io.PACKET_LOG_DIR, rescan=False):
+    """Bring a catalog up to date with its directory; returns (scanned, removed).
+
+    The directory is only listed when it changed since the last sync (files added or removed),
+    and only new captures are scanned. Segments cataloged with no packets are stat'ed on every
+    sync and rescanned once they grew and stopped changing (left open by a killed capture).
+    rescan=True re-reads every capture.
+    """
+    with connect(directory) as connection:
+        abandoned = set()
+        for name, file_size, mtime in connection.execute("SELECT name, file_size, mtime FROM captures WHERE packets = 0"):
+            try:
+                usage = _disk_usage(os.path.join(directory, name))
+            except OSError:
+                continue  # Removed; dropped when the directory is listed
+            if usage != (file_size, mtime) and time.time() - usage[1] >= OPEN_SEGMENT_IDLE:
+                abandoned.add(name)
+
+        directory_mtime = str(os.stat(directory).st_mtime_ns)
+        synced = connection.execute("SELECT value FROM catalog_meta WHERE key = 'directory_mtime'").fetchone()
+        if not rescan and synced and synced[0] == directory_mtime:
+            names = known = set()
+        else:
+            names = {name for name in os.listdir(directory) if packet_io.is_packet_file(name)}
+            known = {row[0] for row in connection.execute("SELECT name FROM captures")}
+        added = sorted(names if rescan else (names - known) | abandoned, key=packet_io.capture_sort_key)
+        removed = known - names
+
+        # Scan before writing anything so the catalog is not locked while files are read
+        if len(added) > 1:
+            print(f"🔍 Cataloging {len(added)} capture(s) in '{directory}'...")
+        summaries = []
+        for name in added:
+            try:
+                summaries.append((os.path.join(directory, name), summarize_file(os.path.join(directory, name))))
+            except Exception as e:
+                print(f"⚠️ Could not catalog {name}: {e}")
+
+        for file_path, summary in summaries:
+            _store(connection, file_path, summary)
+        connection.executemany("DELETE FROM captures WHERE name = ?", [(name,) for name in removed])
+        connection.execute("INSERT OR REPLACE INTO catalog_meta VALUES ('directory_mtime', ?)", (directory_mtime,))
+
+    return len(added), len(removed)
+
+
+def latest_capture(directory=packet_io.PACKET_LOG_DIR):
+    """Path of the latest capture by name (preferring its columnar copy), or None."""
+    sync_catalog(directory)
+    with connect(directory) as connection:
+        row = connection.execute(
+            "SELECT name FROM captures ORDER BY stem DESC, format = 'cols' DESC LIMIT 1"
+        ).fetchone()
+    return os.path.join(directory, row[0]) if row else None
+
+
+def _timestamp(value):
+    return value.timestamp() if isinstance(value, datetime.datetime) else value
+
+
+def query_captures(pattern=None, since=None, until=None, directory=packet_io.PACKET_LOG_DIR):
+    """Catalog rows (as dicts) of captures matching a name glob and overlapping [since, until], oldest first."""
+    sync_catalog(directory)
+    since, until = _timestamp(since), _timestamp(until)
+
+    with connect(directory) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(
+            "SELECT * FROM captures"
+            " WHERE (:since IS NULL OR end_time >= :since) AND (:until IS NULL OR start_time <= :until)"
+            " AND (:pattern IS NULL OR name GLOB :pattern)"
+            " ORDER BY stem, format = 'cols'",
+            {"since": since, "until": until, "pattern": pattern},
+        ).fetchall()
+    return [dict(row, path=os.path.join(directory, row["name"]), stats=json.loads(row["stats"])) for row in rows]
+
+
+def find_captures(pattern=None, since=None, until=None, directory=packet_io.PACKET_LOG_DIR):
+    """Paths of the captures matching a name glob and overlapping [since, until], oldest first.
+
+    When a capture exists both as a log and as its columnar copy, only the columnar copy is returned.
+    """
+    by_stem = {}
+    for row in query_captures(pattern, since, until, directory):
+        by_stem[row["stem"]] = row["path"]  # Columnar copy sorts last and wins
+    return list(by_stem.values())
+
+
+def _parse_time(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+def _format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime(columnar_store.TIMESTAMP_FORMAT)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update and query the capture catalog.")
+    parser.add_argument("--since", type=_parse_time, help="only captures with packets after this time")
+    parser.add_argument("--until", type=_parse_time, help="only captures with packets before this time")
+    parser.add_argument("--glob", help="capture file name pattern (e.g. 'packets_20250301_*')")
+    parser.add_argument("--rescan", action="store_true", help="re-read every capture instead of only new ones")
+    parser.add_argument("--directory", default=packet_io.PACKET_LOG_DIR)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"❌ Packet log directory '{args.directory}' not found.")
+        sys.exit(1)
+
+    added, removed = sync_catalog(args.directory, rescan=args.rescan)
+    print(f"✅ Catalog up to date: {added} capture(s) added or rescanned, {removed} removed.")
+
+    for row in query_captures(args.glob, args.since, args.until, args.directory):
+        print(f"  {row['name']}: {_format_time(row['start_time'])} - {_format_time(row['end_time'])}, "
+              f"{row['packets']} packets, {row['bytes']} bytes, {row['file_size']} bytes on disk")
+        capture = row["stats"].get("capture")
+        if capture:
+            print(f"    filter {capture['filter'] or 'none'}, 1-in-{capture['sample_rate']} {capture['sample_mode']} sampling, "
+                  f"{capture.get('capture_rate_pps', 0)} packets/s, {capture.get('kernel_drops', 0)} kernel drops")
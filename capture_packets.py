@@ -1,13 +1,34 @@
 import os
-import json
+import sys
 import time
+import struct
+import argparse
 import datetime
+import numpy as np
 import scapy.all as scapy
 import socket
+import packet_io
+import packet_decoder
+import metrics
 
 # Directory to store captured packets
 PACKETS_DIR = "logs/packets"
 
+# Raw capture path: frames decoded together per batch
+RAW_SNAPLEN = 65535
+RAW_BATCH_SIZE = 1024
+RAW_FLUSH_SECONDS = 0.5
+
+# Capture options (the defaults keep every packet in full)
+CAPTURE_FILTER = None  # BPF expression compiled into the kernel socket, e.g. "tcp or udp port 53"
+SAMPLE_RATE = 1  # Keep 1 in N packets (or flows)
+SAMPLE_MODES = ("packet", "flow")  # Every Nth packet, or whole flows chosen by a hash of their endpoints
+PAYLOAD_BYTES = None  # Payload bytes stored per packet (None = all captured bytes)
+
+# Linux packet-socket statistics (struct tpacket_stats: packets, drops since the last read)
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
 # Ensure directory exists
 os.makedirs(PACKETS_DIR, exist_ok=True)
 
@@ -19,39 +40,229 @@ def is_wifi_connected():
     except:
         return False
 
-def packet_callback(packet):
-    """Process each captured packet and extract details."""
+def packet_callback(packet, payload_bytes=PAYLOAD_BYTES):
+    """Process each captured packet and extract details (scapy dissection, used for exotic link types).
+
+    The application payload is kept as raw bytes (at most payload_bytes of them) for signature matching.
+    """
+    ip_layer = packet.getlayer(scapy.IP) or packet.getlayer(scapy.IPv6)
+    if ip_layer is None:
+        protocol = "Unknown"
+    elif isinstance(ip_layer, scapy.IP):
+        protocol = ip_layer.proto
+    else:
+        # IPv6 has no "proto" field; use the transport layer behind any extension headers
+        protocol = 6 if packet.haslayer(scapy.TCP) else (17 if packet.haslayer(scapy.UDP) else ip_layer.nh)
+
     packet_info = {
         "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "protocol": packet.proto if hasattr(packet, "proto") else "Unknown",
-        "source_ip": packet[scapy.IP].src if packet.haslayer(scapy.IP) else "Unknown",
-        "destination_ip": packet[scapy.IP].dst if packet.haslayer(scapy.IP) else "Unknown",
+        "protocol": protocol,
+        "source_ip": ip_layer.src if ip_layer is not None else "Unknown",
+        "destination_ip": ip_layer.dst if ip_layer is not None else "Unknown",
         "source_port": packet[scapy.TCP].sport if packet.haslayer(scapy.TCP) else (packet[scapy.UDP].sport if packet.haslayer(scapy.UDP) else "Unknown"),
         "destination_port": packet[scapy.TCP].dport if packet.haslayer(scapy.TCP) else (packet[scapy.UDP].dport if packet.haslayer(scapy.UDP) else "Unknown"),
-        "payload": str(packet.payload) if packet.payload else "No Payload"
+        "tcp_flags": int(packet[scapy.TCP].flags) if packet.haslayer(scapy.TCP) else 0,
+        "packet_size": len(packet),
     }
-    return packet_info
+    payload = bytes(packet[scapy.Raw].load) if packet.haslayer(scapy.Raw) else b""
+    return packet_io.set_payload(packet_info, payload[:payload_bytes])
+
+def _kernel_stats(sock):
+    """Packets seen and dropped by the kernel since the last call ((0, 0) where unsupported)."""
+    try:
+        return struct.unpack("II", sock.ins.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+    except (AttributeError, OSError):
+        return 0, 0
+
+def _truncating_reader(sock, snaplen):
+    """Read at most snaplen bytes per frame from the raw socket, keeping the original frame length."""
+    buffer = bytearray(snaplen)
+
+    def read():
+        size = sock.ins.recv_into(buffer, snaplen, socket.MSG_TRUNC)
+        return time.time(), bytes(buffer[:min(size, snaplen)]), size
+
+    return read
+
+def flow_sample_mask(batch, rate):
+    """Keep 1 in `rate` flows: a packet is kept when the hash of its endpoints (same both ways) is chosen."""
+    def endpoint(addresses, ports):
+        halves = np.ascontiguousarray(addresses).view(np.uint64).reshape(-1, 2)
+        return halves[:, 0] * np.uint64(0x9E3779B97F4A7C15) + halves[:, 1] + \
+            np.maximum(ports, 0).astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+
+    mixed = (endpoint(batch["src_addr"], batch["src_port"]) ^ endpoint(batch["dst_addr"], batch["dst_port"])) + \
+        batch["protocol"].astype(np.uint64)
+    mixed = mixed * np.uint64(0xFF51AFD7ED558CCD)
+    return (mixed >> np.uint64(32)) % np.uint64(rate) == 0
+
+def sniff_raw(duration, handle_batch, flush_seconds=RAW_FLUSH_SECONDS, bpf_filter=CAPTURE_FILTER,
+              snaplen=RAW_SNAPLEN, sample_rate=SAMPLE_RATE, sample_mode="packet", payload_bytes=PAYLOAD_BYTES):
+    """Read raw frames from a capture socket and decode them in batches without scapy dissection.
+
+    Runs for `duration` seconds (forever when None); handle_batch receives each decoded ColumnarCapture.
+    bpf_filter is attached to the socket so the kernel discards unwanted packets; frames are read
+    up to snaplen bytes; sample_rate keeps 1 in N packets (before decoding) or flows (sample_mode="flow");
+    payload_bytes limits the payload stored per packet. Returns the capture statistics.
+    """
+    if sample_mode not in SAMPLE_MODES:
+        raise ValueError(f"Unknown sample mode: {sample_mode}")
+    sock = scapy.conf.L2listen(filter=bpf_filter) if bpf_filter else scapy.conf.L2listen()
+    linktype = scapy.conf.l2types.layer2num.get(sock.LL, packet_decoder.LINKTYPE_ETHERNET)
+    truncate = snaplen < RAW_SNAPLEN and hasattr(socket, "MSG_TRUNC") and isinstance(getattr(sock, "ins", None), socket.socket)
+    read = _truncating_reader(sock, snaplen) if truncate else None
+    deadline = time.time() + duration if duration else None
+    frames = []
+    wire_lengths = []
+    last_flush = time.time()
+    started = time.time()
+    stats = {"received": 0, "sampled_out": 0, "kept": 0, "kernel_packets": 0, "kernel_drops": 0}
+    _kernel_stats(sock)  # Reset the counters so only this capture is counted
+
+    def flush():
+        with metrics.timer("decode"):
+            batch = packet_decoder.decode_raw_frames(frames, linktype, wire_lengths=np.array(wire_lengths),
+                                                     max_payload=payload_bytes)
+        if sample_rate > 1 and sample_mode == "flow":
+            keep = flow_sample_mask(batch, sample_rate)
+            stats["sampled_out"] += len(batch) - int(keep.sum())
+            batch = batch.take(keep)
+        metrics.inc("packets_captured_total", len(batch))
+        metrics.observe("batch_size", len(batch), stage="decode")
+        stats["kept"] += len(batch)
+        if len(batch):
+            handle_batch(batch)
 
-def capture_packets(duration=20):
-    """Capture WiFi packets for a given duration."""
+    try:
+        while True:
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                break
+            timeout = flush_seconds if deadline is None else min(flush_seconds, deadline - now)
+            # The socket's own select: on Windows its fileno() is a pcap event handle, not a selectable socket
+            ready = sock.select([sock], timeout)
+            if ready:
+                with metrics.timer("sniff"):
+                    if read is not None:
+                        timestamp, frame, size = read()
+                    else:
+                        _, frame, timestamp = sock.recv_raw(snaplen)
+                        size = len(frame) if frame else 0
+                if frame:
+                    stats["received"] += 1
+                    # Packet sampling drops frames before any decoding work
+                    if sample_rate > 1 and sample_mode == "packet" and stats["received"] % sample_rate:
+                        stats["sampled_out"] += 1
+                    else:
+                        frames.append((timestamp or time.time(), frame))
+                        wire_lengths.append(size)
+            if len(frames) >= RAW_BATCH_SIZE or (frames and time.time() - last_flush >= flush_seconds):
+                flush()
+                frames = []
+                wire_lengths = []
+                last_flush = time.time()
+    finally:
+        if frames:
+            flush()
+        packets, drops = _kernel_stats(sock)
+        sock.close()
+
+    elapsed = max(time.time() - started, 1e-9)
+    stats["kernel_packets"] = packets
+    stats["kernel_drops"] = drops
+    stats["duration_s"] = round(elapsed, 3)
+    stats["capture_rate_pps"] = round(stats["received"] / elapsed, 1)
+    metrics.inc("kernel_drops_total", drops)
+    return stats
+
+def capture_packets(duration=20, max_segment_bytes=packet_io.DEFAULT_MAX_SEGMENT_BYTES,
+                    max_segment_seconds=packet_io.DEFAULT_MAX_SEGMENT_SECONDS, fast=True, bpf_filter=CAPTURE_FILTER,
+                    snaplen=RAW_SNAPLEN, sample_rate=SAMPLE_RATE, sample_mode="packet", payload_bytes=PAYLOAD_BYTES):
+    """Capture WiFi packets for a given duration, streaming them to rotating log segments.
+
+    fast=True decodes raw frame headers directly (packet_decoder.py); fast=False dissects
+    every packet with scapy (BPF filter, packet sampling and payload limit only).
+    The capture options and rate/drop statistics are stored with each segment in the capture catalog.
+    """
+    if payload_bytes is not None and payload_bytes < 0:
+        raise ValueError(f"payload_bytes must not be negative: {payload_bytes}")
     if not is_wifi_connected():
         print("Please connect to your WiFi network first.")
         return
     
     print(f"Capturing packets for {duration} seconds...")
-    packets = scapy.sniff(timeout=duration, prn=packet_callback)
+    options = {"filter": bpf_filter, "snaplen": snaplen, "sample_rate": sample_rate,
+               "sample_mode": sample_mode, "payload_bytes": payload_bytes}
 
-    # Process packets into a list
-    packet_data = [packet_callback(pkt) for pkt in packets]
+    # Each packet is dissected once and appended straight to disk (store=False keeps memory flat)
+    with packet_io.PacketWriter(PACKETS_DIR, max_bytes=max_segment_bytes,
+                                max_seconds=max_segment_seconds) as writer:
+        if fast:
+            def write_batch(batch):
+                with metrics.timer("write"):
+                    for index in range(len(batch)):
+                        writer.write(packet_io.set_payload(batch.packet(index, payload=False), batch.payload(index)))
 
-    # Save to JSON file
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(PACKETS_DIR, f"packets_{timestamp}.json")
-    
-    with open(file_path, "w") as f:
-        json.dump(packet_data, f, indent=4)
-    
-    print(f"Packet capture complete. Data saved in {file_path}")
+            stats = sniff_raw(duration, write_batch, bpf_filter=bpf_filter, snaplen=snaplen, sample_rate=sample_rate,
+                              sample_mode=sample_mode, payload_bytes=payload_bytes)
+        else:
+            if sample_mode != "packet":
+                print("⚠️ Flow sampling needs the raw capture path; sampling packets instead.")
+                options["sample_mode"] = "packet"  # Record the mode actually used
+            stats = {"received": 0, "sampled_out": 0}
+            started = time.time()
+
+            def write_packet(pkt):
+                stats["received"] += 1
+                if sample_rate > 1 and stats["received"] % sample_rate:
+                    stats["sampled_out"] += 1
+                    return
+                metrics.inc("packets_captured_total")
+                with metrics.timer("dissect"):
+                    record = packet_callback(pkt, payload_bytes)
+                with metrics.timer("write"):
+                    writer.write(record)
+
+            scapy.sniff(timeout=duration, prn=write_packet, store=False, filter=bpf_filter)
+            elapsed = max(time.time() - started, 1e-9)
+            stats["duration_s"] = round(elapsed, 3)
+            stats["capture_rate_pps"] = round(stats["received"] / elapsed, 1)
+
+    if not writer.segments:
+        print("Packet capture complete. No packets were captured.")
+        return
+
+    import capture_catalog
+    stats["packets_written"] = writer.packets_written
+    try:
+        capture_catalog.set_capture_info(writer.segments, dict(options, **stats))
+    except Exception as e:
+        print(f"⚠️ Could not record the capture statistics in the catalog: {e}")
+
+    print(f"Packet capture complete. {writer.packets_written} packets saved in {len(writer.segments)} segment(s):")
+    for path in writer.segments:
+        print(f"  {path}")
+    if stats.get("kernel_drops"):
+        print(f"⚠️ The kernel dropped {stats['kernel_drops']} packet(s) the capture could not keep up with.")
+    return stats
 
 if __name__ == "__main__":
-    capture_packets()
+    metrics.configure_from_env()
+    parser = argparse.ArgumentParser(description="Capture network packets to rotating log segments.")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to capture")
+    parser.add_argument("--filter", default=CAPTURE_FILTER, help='BPF filter expression, e.g. "tcp port 443"')
+    parser.add_argument("--snaplen", type=int, default=RAW_SNAPLEN, help="bytes read per frame")
+    parser.add_argument("--sample", type=int, default=SAMPLE_RATE, help="keep 1 in N packets (or flows)")
+    parser.add_argument("--sample-mode", choices=SAMPLE_MODES, default="packet")
+    parser.add_argument("--payload-bytes", type=int, default=PAYLOAD_BYTES, help="payload bytes stored per packet")
+    parser.add_argument("--scapy", action="store_true", help="dissect packets with scapy instead of the raw decoder")
+    args = parser.parse_args()
+
+    if args.sample < 1 or args.snaplen < 1:
+        print("❌ --sample and --snaplen must be positive.")
+        sys.exit(1)
+    if args.payload_bytes is not None and args.payload_bytes < 0:
+        print("❌ --payload-bytes must not be negative.")
+        sys.exit(1)
+    capture_packets(args.duration, fast=not args.scapy, bpf_filter=args.filter, snaplen=args.snaplen,
+                    sample_rate=args.sample, sample_mode=args.sample_mode, payload_bytes=args.payload_bytes)
@@ -0,0 +1,93 @@
+import os
+import re
+import json
+import hashlib
+
+# Directory holding one checkpoint file per analysis stage
+CHECKPOINT_DIR = "logs/checkpoints"
+
+# Leading bytes of a capture hashed to recognise it across runs
+FINGERPRINT_BYTES = 4096
+
+
+def _fingerprint_source(file_path):
+    """The file whose leading bytes identify a capture (columnar captures use their metadata)."""
+    if os.path.isdir(file_path):
+        return os.path.join(file_path, "meta.json")
+    return file_path
+
+
+def fingerprint(file_path, length=FINGERPRINT_BYTES):
+    """Hash the first `length` bytes of a capture; returns (hex digest, bytes hashed)."""
+    with open(_fingerprint_source(file_path), "rb") as f:
+        head = f.read(length)
+    return hashlib.sha256(head).hexdigest(), len(head)
+
+
+def _checkpoint_path(stage_name):
+    slug = re.sub(r"[^a-z0-9]+", "_", stage_name.lower()).strip("_")
+    return os.path.join(CHECKPOINT_DIR, f"{slug}.json")
+
+
+def _read_checkpoints(stage_name):
+    path = _checkpoint_path(stage_name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable checkpoint {path}: {e}")
+        return {}
+
+
+def load_checkpoint(stage_name, file_path):
+    """Return the stage's checkpoint for a capture, or None if missing or the capture changed."""
+    checkpoint = _read_checkpoints(stage_name).get(os.path.normpath(file_path))
+    if checkpoint is None:
+        return None
+
+    # A capture that was replaced or truncated starts over from the beginning
+    try:
+        digest, _ = fingerprint(file_path, checkpoint["fingerprint_bytes"])
+    except OSError:
+        return None
+    if digest != checkpoint["fingerprint"]:
+        print(f"⚠️ {file_path} changed since the last '{stage_name}' run; analyzing it from the start.")
+        return None
+    if checkpoint.get("offset") and not os.path.isdir(file_path) and os.path.getsize(file_path) < checkpoint["offset"]:
+        return None
+
+    return checkpoint
+
+
+def save_checkpoint(stage_name, file_path, records, offset, state):
+    """Durably record how far a stage got through a capture and its running aggregates."""
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    checkpoints = _read_checkpoints(stage_name)
+
+    digest, length = fingerprint(file_path)
+    checkpoints[os.path.normpath(file_path)] = {
+        "fingerprint": digest,
+        "fingerprint_bytes": length,
+        "records": records,
+        "offset": offset,
+        "state": state,
+    }
+
+    # Write-then-rename so an interrupted run never leaves a half-written checkpoint
+    path = _checkpoint_path(stage_name)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoints, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def resume_position(checkpoint):
+    """(records, byte offset) to resume from; (0, 0) without a checkpoint."""
+    if checkpoint is None:
+        return 0, 0
+    return checkpoint["records"], checkpoint.get("offset") or 0
+
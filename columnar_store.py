@@ -0,0 +1,466 @@
+import os
+import sys
+import json
+import socket
+import datetime
+import functools
+import numpy as np
+import packet_io
+
+# Fixed-width capture columns, each stored as a raw little-endian NumPy array
+CAPTURE_COLUMNS = {
+    "timestamp": "<f8",   # Seconds since the epoch
+    "ip_version": "u1",   # 4 or 6, 0 when the packet had no IP layer
+    "src_addr": "S16",    # IPv4 addresses are stored IPv4-mapped (::ffff:a.b.c.d)
+    "dst_addr": "S16",
+    "src_port": "<i4",    # -1 when the packet had no TCP/UDP layer
+    "dst_port": "<i4",
+    "protocol": "<i2",    # IP protocol number, -1 when unknown
+    "length": "<u4",      # Packet size in bytes, 0 when unknown
+    "tcp_flags": "u1",    # TCP flag bits (FIN=0x01 ... CWR=0x80), 0 for non-TCP packets
+}
+
+# Payloads live in one variable-length blob indexed by (count + 1) offsets
+PAYLOAD_FILE = "payload.bin"
+PAYLOAD_OFFSETS = ("payload_offset", "<u8")
+META_FILE = "meta.json"
+COLUMN_FILE_EXTENSION = ".col"
+FORMAT_VERSION = 1
+
+# Rows buffered in memory before a column flush
+FLUSH_ROWS = 65536
+
+IPV4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@functools.lru_cache(maxsize=65536)
+def encode_ip(address):
+    """Pack an address string into (ip_version, 16 raw bytes); unknown addresses give (0, b"")."""
+    if not isinstance(address, str):
+        return 0, b""
+    try:
+        if ":" in address:
+            return 6, socket.inet_pton(socket.AF_INET6, address)
+        return 4, IPV4_MAPPED_PREFIX + socket.inet_aton(address)
+    except (OSError, ValueError):
+        return 0, b""
+
+
+def format_ip(raw):
+    """Render a packed 16-byte address back to its text form."""
+    raw = bytes(raw).ljust(16, b"\x00")
+    if raw.startswith(IPV4_MAPPED_PREFIX):
+        return socket.inet_ntoa(raw[12:])
+    return socket.inet_ntop(socket.AF_INET6, raw)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_timestamp(value):
+    try:
+        return datetime.datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def encode_timestamp(value):
+    """Seconds since the epoch for a record timestamp (0.0 when unknown)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return _parse_timestamp(value)
+    return 0.0
+
+
+def _encode_int(value, default):
+    return value if isinstance(value, int) and not isinstance(value, bool) else default
+
+
+def _encode_protocol(value):
+    if isinstance(value, str):
+        return packet_io.PROTOCOL_NUMBERS.get(value, -1)
+    return _encode_int(value, -1)
+
+
+def _encode_payload(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str) and value != "No Payload":
+        return value.encode("utf-8")
+    return b""
+
+
+def encode_packet(record):
+    """Convert a capture record into a tuple of column values plus its payload bytes."""
+    packet = packet_io.normalize_packet(record)
+    src_version, src_addr = encode_ip(packet["src_ip"])
+    dst_version, dst_addr = encode_ip(packet["dst_ip"])
+
+    row = (
+        encode_timestamp(packet["timestamp"]),
+        src_version or dst_version,
+        src_addr,
+        dst_addr,
+        _encode_int(packet["src_port"], -1),
+        _encode_int(packet["dst_port"], -1),
+        _encode_protocol(packet["protocol"]),
+        _encode_int(packet["packet_size"], 0),
+        _encode_int(packet["tcp_flags"], 0),
+    )
+    return row, _encode_payload(packet["payload"])
+
+
+class ColumnarCapture:
+    """A capture held as parallel fixed-width columns (in memory or memory-mapped)."""
+
+    def __init__(self, columns, payload_offsets, payload_blob, path=None):
+        self.columns = columns
+        self.payload_offsets = payload_offsets
+        self.payload_blob = payload_blob
+        self.path = path
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def slice(self, start, stop):
+        """Return a zero-copy view over rows [start, stop)."""
+        columns = {name: column[start:stop] for name, column in self.columns.items()}
+        return ColumnarCapture(columns, self.payload_offsets[start:stop + 1], self.payload_blob, self.path)
+
+    def take(self, rows):
+        """Return a copy holding only the given rows (indices or a boolean mask), in order."""
+        rows = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else np.asarray(rows, dtype=np.int64)
+        columns = {name: column[rows] for name, column in self.columns.items()}
+        starts = np.asarray(self.payload_offsets[rows], dtype=np.int64)
+        lengths = np.asarray(self.payload_offsets[rows + 1], dtype=np.int64) - starts
+
+        offsets = np.zeros(len(rows) + 1, dtype=PAYLOAD_OFFSETS[1])
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1].astype(np.int64), lengths) + np.arange(int(offsets[-1]))
+        return ColumnarCapture(columns, offsets, np.asarray(self.payload_blob)[positions], self.path)
+
+    def iter_batches(self, batch_size=FLUSH_ROWS):
+        """Yield zero-copy row batches of at most batch_size rows."""
+        for start in range(0, len(self), batch_size):
+            yield self.slice(start, min(start + batch_size, len(self)))
+
+    def payload(self, index):
+        """Return the raw payload bytes of one row."""
+        return bytes(self.payload_blob[int(self.payload_offsets[index]):int(self.payload_offsets[index + 1])])
+
+    def packet(self, index, payload=True):
+        """Decode one row back into a normalized packet record (payload=False skips the payload)."""
+        version = int(self.columns["ip_version"][index])
+        protocol = int(self.columns["protocol"][index])
+        src_port = int(self.columns["src_port"][index])
+        dst_port = int(self.columns["dst_port"][index])
+        length = int(self.columns["length"][index])
+        timestamp = float(self.columns["timestamp"][index])
+        payload = self.payload(index) if payload else b""
+
+        return {
+            "timestamp": datetime.datetime.fromtimestamp(timestamp).strftime(TIMESTAMP_FORMAT) if timestamp else "Unknown",
+            "protocol": packet_io.PROTOCOL_NAMES.get(protocol, protocol) if protocol >= 0 else "Unknown",
+            "src_ip": format_ip(self.columns["src_addr"][index]) if version else "Unknown",
+            "dst_ip": format_ip(self.columns["dst_addr"][index]) if version else "Unknown",
+            "src_port": src_port if src_port >= 0 else "Unknown",
+            "dst_port": dst_port if dst_port >= 0 else "Unknown",
+            "packet_size": length if length else "Unknown",
+            "tcp_flags": int(self.columns["tcp_flags"][index]),
+            "payload": payload.decode("utf-8", errors="replace") if payload else "No Payload",
+        }
+
+    def iter_packets(self):
+        """Yield every row as a normalized packet record."""
+        for index in range(len(self)):
+            yield self.packet(index)
+
+
+class ColumnarWriter:
+    """Stream capture records into a columnar capture directory."""
+
+    def __init__(self, path, source=None):
+        self.path = path
+        self.source = source
+        self.count = 0
+        self._rows = []
+        self._payload_bytes = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(os.path.join(path, name + COLUMN_FILE_EXTENSION), "wb") for name in CAPTURE_COLUMNS}
+        offsets_name, offsets_dtype = PAYLOAD_OFFSETS
+        self._offsets_file = open(os.path.join(path, offsets_name + COLUMN_FILE_EXTENSION), "wb")
+        self._payload_file = open(os.path.join(path, PAYLOAD_FILE), "wb")
+        self._offsets_dtype = offsets_dtype
+        np.zeros(1, dtype=offsets_dtype).tofile(self._offsets_file)
+
+    def write(self, record):
+        """Append one capture record."""
+        self._rows.append(encode_packet(record))
+        if len(self._rows) >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows to the column files."""
+        if not self._rows:
+            return
+
+        rows, payloads = zip(*self._rows)
+        for name, values in zip(CAPTURE_COLUMNS, zip(*rows)):
+            np.asarray(values, dtype=CAPTURE_COLUMNS[name]).tofile(self._files[name])
+
+        sizes = np.fromiter((len(p) for p in payloads), dtype=self._offsets_dtype, count=len(payloads))
+        (np.cumsum(sizes, dtype=self._offsets_dtype) + self._payload_bytes).tofile(self._offsets_file)
+        self._payload_file.write(b"".join(payloads))
+
+        self._payload_bytes += int(sizes.sum())
+        self.count += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        """Flush remaining rows and write the capture metadata."""
+        self.flush()
+        for f in list(self._files.values()) + [self._offsets_file, self._payload_file]:
+            f.close()
+
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "count": self.count,
+            "columns": CAPTURE_COLUMNS,
+            "payload_bytes": self._payload_bytes,
+            "source": self.source,
+            "created": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+        }
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump(meta, f, indent=4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _map_column(path, dtype, count):
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+def save_columns(path, columns, **meta):
+    """Write equal-length NumPy columns and their metadata to a column directory."""
+    os.makedirs(path, exist_ok=True)
+
+    for name, column in columns.items():
+        np.ascontiguousarray(column).tofile(os.path.join(path, name + COLUMN_FILE_EXTENSION))
+
+    lengths = {len(column) for column in columns.values()}
+    info = {
+        "format_version": FORMAT_VERSION,
+        "count": lengths.pop() if lengths else 0,
+        "columns": {name: column.dtype.str for name, column in columns.items()},
+        "created": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+    }
+    info.update(meta)
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(info, f, indent=4)
+    return path
+
+
+def load_columns(path):
+    """Memory-map every column of a column directory; returns (columns, meta)."""
+    with open(os.path.join(path, META_FILE), "r") as f:
+        meta = json.load(f)
+
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version: {meta.get('format_version')}")
+
+    columns = {
+        name: _map_column(os.path.join(path, name + COLUMN_FILE_EXTENSION), dtype, meta["count"])
+        for name, dtype in meta["columns"].items()
+    }
+    return columns, meta
+
+
+def save_arrays(path, arrays, **meta):
+    """Write NumPy arrays of differing lengths and their metadata to a column directory."""
+    os.makedirs(path, exist_ok=True)
+
+    for name, array in arrays.items():
+        np.ascontiguousarray(array).tofile(os.path.join(path, name + COLUMN_FILE_EXTENSION))
+
+    info = {
+        "format_version": FORMAT_VERSION,
+        "arrays": {name: [array.dtype.str, len(array)] for name, array in arrays.items()},
+        "created": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+    }
+    info.update(meta)
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(info, f, indent=4)
+    return path
+
+
+def load_arrays(path):
+    """Memory-map every array written by save_arrays; returns (arrays, meta)."""
+    with open(os.path.join(path, META_FILE), "r") as f:
+        meta = json.load(f)
+
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version: {meta.get('format_version')}")
+
+    arrays = {
+        name: _map_column(os.path.join(path, name + COLUMN_FILE_EXTENSION), dtype, count)
+        for name, (dtype, count) in meta["arrays"].items()
+    }
+    return arrays, meta
+
+
+def open_capture(path):
+    """Memory-map a columnar capture directory without copying any column."""
+    columns, meta = load_columns(path)
+    count = meta["count"]
+
+    # Captures written before a column existed read it as zeros
+    for name, dtype in CAPTURE_COLUMNS.items():
+        if name not in columns:
+            columns[name] = np.zeros(count, dtype=dtype)
+
+    offsets_name, offsets_dtype = PAYLOAD_OFFSETS
+    offsets = _map_column(os.path.join(path, offsets_name + COLUMN_FILE_EXTENSION), offsets_dtype, count + 1)
+    blob = _map_column(os.path.join(path, PAYLOAD_FILE), np.uint8, meta["payload_bytes"])
+    return ColumnarCapture(columns, offsets, blob, path)
+
+
+def save_capture(path, capture, source=None, **extra_meta):
+    """Write a ColumnarCapture (including any extra columns it carries) to a capture directory."""
+    os.makedirs(path, exist_ok=True)
+
+    # Rebase the payload offsets so a sliced capture gets a self-contained blob
+    offsets_name, offsets_dtype = PAYLOAD_OFFSETS
+    offsets = np.asarray(capture.payload_offsets, dtype=offsets_dtype)
+    start, stop = (int(offsets[0]), int(offsets[-1])) if len(offsets) else (0, 0)
+    (offsets - start).tofile(os.path.join(path, offsets_name + COLUMN_FILE_EXTENSION))
+    np.asarray(capture.payload_blob[start:stop], dtype=np.uint8).tofile(os.path.join(path, PAYLOAD_FILE))
+
+    return save_columns(path, capture.columns, payload_bytes=stop - start, source=source, **extra_meta)
+
+
+def records_to_columns(records):
+    """Build an in-memory columnar capture from an iterable of capture records."""
+    encoded = [encode_packet(record) for record in records]
+    rows = [row for row, _ in encoded]
+    payloads = [payload for _, payload in encoded]
+
+    columns = {}
+    for index, (name, dtype) in enumerate(CAPTURE_COLUMNS.items()):
+        columns[name] = np.array([row[index] for row in rows], dtype=dtype)
+
+    offsets = np.zeros(len(payloads) + 1, dtype=PAYLOAD_OFFSETS[1])
+    np.cumsum([len(p) for p in payloads], out=offsets[1:])
+    blob = np.frombuffer(b"".join(payloads), dtype=np.uint8)
+    return ColumnarCapture(columns, offsets, blob)
+
+
+def load_capture(file_path):
+    """Open any capture log as columns: memory-mapped if columnar, parsed otherwise."""
+    if file_path.endswith(packet_io.COLUMNAR_EXTENSION):
+        return open_capture(file_path)
+    if file_path.endswith(packet_io.PCAP_EXTENSIONS):
+        import packet_decoder
+        return packet_decoder.read_pcap(file_path)
+    return records_to_columns(packet_io.iter_packets(file_path))
+
+
+def iter_capture_batches(file_path, batch_size=FLUSH_ROWS):
+    """Stream a capture log as columnar batches in a single pass over the file."""
+    if file_path.endswith(packet_io.COLUMNAR_EXTENSION):
+        yield from open_capture(file_path).iter_batches(batch_size)
+        return
+    if file_path.endswith(packet_io.PCAP_EXTENSIONS):
+        import packet_decoder
+        yield from packet_decoder.iter_pcap_batches(file_path, batch_size)
+        return
+
+    records = []
+    for record in packet_io.iter_packets(file_path):
+        records.append(record)
+        if len(records) >= batch_size:
+            yield records_to_columns(records)
+            records = []
+    if records:
+        yield records_to_columns(records)
+
+
+def iter_capture_chunks(file_path, batch_size=FLUSH_ROWS, start_record=0, start_offset=0):
+    """Stream a capture from a saved position as (batch, first_record, next_record, next_offset).
+
+    Newline-delimited segments resume from a byte offset, so only new lines are read;
+    other formats resume by record index and report a next_offset of None.
+    """
+    if file_path.endswith(packet_io.SEGMENT_EXTENSION):
+        records = []
+        first_record = start_record
+        offset = start_offset
+        for record, offset in packet_io.iter_segment_from(file_path, start_offset):
+            records.append(record)
+            if len(records) >= batch_size:
+                yield records_to_columns(records), first_record, first_record + len(records), offset
+                first_record += len(records)
+                records = []
+        if records:
+            yield records_to_columns(records), first_record, first_record + len(records), offset
+        return
+
+    capture = load_capture(file_path)
+    for start in range(start_record, len(capture), batch_size):
+        stop = min(start + batch_size, len(capture))
+        yield capture.slice(start, stop), start, stop, None
+
+
+def convert_packet_log(file_path, output_path=None):
+    """Convert a JSON/NDJSON packet log or a pcap file into a columnar capture directory."""
+    if output_path is None:
+        output_path = os.path.splitext(file_path)[0] + packet_io.COLUMNAR_EXTENSION
+
+    if file_path.endswith(packet_io.PCAP_EXTENSIONS):
+        import packet_decoder
+        capture = packet_decoder.read_pcap(file_path)
+        save_capture(output_path, capture, source=file_path)
+        print(f"✅ Converted {len(capture)} packets: {file_path} -> {output_path}")
+    else:
+        with ColumnarWriter(output_path, source=file_path) as writer:
+            for record in packet_io.iter_packets(file_path):
+                writer.write(record)
+        print(f"✅ Converted {writer.count} packets: {file_path} -> {output_path}")
+
+    _catalog(output_path)
+    return output_path
+
+
+def _catalog(path):
+    """Record a new columnar capture in its directory's capture catalog."""
+    import capture_catalog
+    try:
+        capture_catalog.register_capture(path)
+    except Exception as e:
+        print(f"⚠️ Could not update the capture catalog for {path}: {e}")
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:]
+    if not paths and os.path.exists(packet_io.PACKET_LOG_DIR):
+        paths = [os.path.join(packet_io.PACKET_LOG_DIR, f) for f in sorted(os.listdir(packet_io.PACKET_LOG_DIR))
+                 if packet_io.is_packet_file(f) and not f.endswith(packet_io.COLUMNAR_EXTENSION)
+                 and not os.path.exists(os.path.join(packet_io.PACKET_LOG_DIR, os.path.splitext(f)[0] + packet_io.COLUMNAR_EXTENSION))]
+
+    if not paths:
+        print(f"❌ No packet logs to convert in '{packet_io.PACKET_LOG_DIR}'.")
+
+    for path in paths:
+        try:
+            convert_packet_log(path)
+        except Exception as e:
+            print(f"❌ Error converting {path}: {e}")
@@ -1,68 +1,38 @@
 import os
 import json
 import datetime
+import numpy as np
+import port_policy
+import analysis_engine
+import metrics
+import stream_stats
 
 # Directories
-PACKET_LOG_DIR = "logs/packets"
 CONN_REPORT_DIR = "logs/connection_reports"
 
 # Ensure report directory exists
 os.makedirs(CONN_REPORT_DIR, exist_ok=True)
 
-# Common port security classification
-PORT_SECURITY_LEVELS = {
-    80: "❌ Not Secure (Unencrypted HTTP)",
-    443: "✅ Secure (HTTPS)",
-    22: "❌ Not Secure (SSH Exposed)",
-    445: "❌ Not Secure (SMB - High Risk)",
-    3389: "❌ Not Secure (RDP - High Risk)",
-    53: "⚠️ Caution (DNS - Potential Data Leakage)",
-    25: "⚠️ Caution (SMTP - Spam/Phishing Risk)"
-}
-
-def get_latest_packet_file():
-    """Find the latest captured packet file."""
-    if not os.path.exists(PACKET_LOG_DIR):
-        print(f"❌ Packet log directory '{PACKET_LOG_DIR}' not found.")
-        return None
-
-    files = [f for f in os.listdir(PACKET_LOG_DIR) if f.endswith(".json")]
-    if not files:
-        print(f"❌ No packet capture files found in '{PACKET_LOG_DIR}'.")
-        return None
-    
-    files.sort(reverse=True)
-    return os.path.join(PACKET_LOG_DIR, files[0])
-
-def analyze_connections():
-    """Analyze network connections and determine security status."""
-    file_path = get_latest_packet_file()
-    
-    if not file_path:
-        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
-        return
-    
-    print(f"🔍 Analyzing network connections from: {file_path}")
-
-    try:
-        with open(file_path, "r") as f:
-            packets = json.load(f)
-    except Exception as e:
-        print(f"❌ Error reading packet log: {e}")
-        return
-
-    secure_connections = 0
-    insecure_connections = 0
-
-    for pkt in packets:
-        port = pkt.get("dst_port", 0)
-        security_status = PORT_SECURITY_LEVELS.get(port, "✅ Secure (Unknown Risk Level)")
-
-        if "Not Secure" in security_status or "Caution" in security_status:
-            insecure_connections += 1
-        else:
-            secure_connections += 1
+# Port security classification comes from the shared port policy (port_policy.py)
+
+def classify_connections(capture):
+    """Count records per port-policy severity level in a columnar capture."""
+    severities = port_policy.get_policy().classify(capture["dst_port"], capture["protocol"])
+    counts = np.bincount(severities, minlength=len(port_policy.SEVERITY_NAMES))
+    if metrics.enabled():
+        for name, count in zip(port_policy.SEVERITY_NAMES, counts.tolist()):
+            metrics.inc("connections_total", count, severity=name)
+    return counts
+
+def count_insecure_connections(capture):
+    """Count packets headed to an insecure or cautionary port in a columnar capture."""
+    return int(classify_connections(capture)[port_policy.CAUTION:].sum())
+
+def save_report(file_path, insecure_connections, severity_counts=None, stats=None, stats_in=None):
+    """Write the connection security report for an analyzed capture.
 
+    stats_in names the stage whose report carries the traffic statistics when this one has none.
+    """
     # Determine overall connection security
     overall_security = "✅ Secure" if insecure_connections == 0 else "❌ Not Secure"
 
@@ -75,12 +45,68 @@ def analyze_connections():
         "file_analyzed": file_path,
         "overall_security": overall_security
     }
+    if severity_counts is not None:
+        report_data["connections_by_severity"] = {
+            name: int(count) for name, count in zip(port_policy.SEVERITY_NAMES, severity_counts)
+        }
+    if stats is not None:
+        report_data["traffic_statistics"] = stats.summary()
+    elif stats_in:
+        report_data["traffic_statistics"] = f"See the {stats_in} report."
 
     with open(report_path, "w") as f:
         json.dump(report_data, f, indent=4)
 
     print(f"✅ Connection analysis complete. Overall Security: {overall_security}")
     print(f"📄 Report saved: {report_path}")
+    return report_path
+
+class PortSecurityStage(analysis_engine.AnalysisStage):
+    """Port-security classification of every connection in the capture, with the top talkers,
+    destinations and ports (see stream_stats).
+
+    stats_in names another stage of the same pass that already keeps those statistics;
+    this stage then keeps none and its report points there.
+    """
+
+    name = "Connection Analysis"
+
+    def __init__(self, stats_in=None):
+        self.severity_counts = np.zeros(len(port_policy.SEVERITY_NAMES), dtype=np.int64)
+        self.stats_in = stats_in
+        self.stats = None if stats_in else stream_stats.StreamStats()
+
+    @property
+    def insecure_connections(self):
+        return int(self.severity_counts[port_policy.CAUTION:].sum())
+
+    @property
+    def secure_connections(self):
+        return int(self.severity_counts[:port_policy.CAUTION].sum())
+
+    def process(self, batch):
+        self.severity_counts += classify_connections(batch)
+        if self.stats is not None:
+            self.stats.update(batch)
+
+    def finish(self, file_path):
+        return save_report(file_path, self.insecure_connections, self.severity_counts, self.stats, self.stats_in)
+
+    def get_state(self):
+        state = {"severity_counts": self.severity_counts.tolist()}
+        if self.stats is not None:
+            state["stats"] = self.stats.get_state()
+        return state
+
+    def set_state(self, state):
+        self.severity_counts = np.array(state["severity_counts"], dtype=np.int64)
+        if self.stats is not None and "stats" in state:
+            self.stats.set_state(state["stats"])
+
+def analyze_connections(file_path=None, flows=False, incremental=False):
+    """Analyze network connections and determine security status."""
+    analysis_engine.run_analysis([PortSecurityStage()], file_path, flows=flows, incremental=incremental)
 
 if __name__ == "__main__":
+    metrics.configure_from_env()
     analyze_connections()
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import datetime
+import numpy as np
+import packet_io
+import ip_reputation
+import port_policy
+import columnar_store
+
+# Cached per-capture feature tables: one memory-mapped column directory per capture fingerprint
+FEATURE_STORE_DIR = "logs/feature_store"
+
+# Bump when a feature or the label definition changes; older cache entries are then rebuilt
+FEATURE_VERSION = 1
+
+# Model inputs in order, with the compact dtype each is cached as (shared by training and scoring)
+FEATURE_COLUMNS = {
+    "dst_port": "<i4",      # Destination port (0 when unknown)
+    "is_tcp": "u1",         # Protocol is TCP
+    "malicious_src": "u1",  # Source address is on a blocklist
+    "packet_size": "<i4",   # Packet size (0 when unknown)
+}
+FEATURE_NAMES = list(FEATURE_COLUMNS)
+
+# Training target cached next to the features: 1 when the rule-based traffic analysis flags the packet
+LABEL_COLUMN = "label"
+STORE_COLUMNS = dict(FEATURE_COLUMNS, **{LABEL_COLUMN: "u1"})
+
+# Rows extracted per batch while building a cache entry
+BATCH_SIZE = columnar_store.FLUSH_ROWS
+
+# Bytes hashed from each end of every capture file for its fingerprint
+FINGERPRINT_SAMPLE = 65536
+
+TEMP_SUFFIX = ".tmp"
+
+# Ensure the feature store exists
+os.makedirs(FEATURE_STORE_DIR, exist_ok=True)
+
+
+def extract_feature_columns(capture):
+    """Feature columns (FEATURE_COLUMNS order) for a batch of capture rows."""
+    reputation = ip_reputation.get_index()
+    return {
+        "dst_port": np.maximum(capture["dst_port"], 0),
+        "is_tcp": capture["protocol"] == packet_io.PROTOCOL_NUMBERS["TCP"],
+        "malicious_src": (capture["ip_version"] > 0) & reputation.contains(capture["src_addr"]),
+        "packet_size": capture["length"],
+    }
+
+
+def feature_matrix(columns, rows=slice(None)):
+    """Stack feature columns (extracted or cached) into the (rows, features) matrix the model scores."""
+    first = np.asarray(columns[FEATURE_NAMES[0]])[rows]
+    matrix = np.empty((len(first), len(FEATURE_NAMES)), dtype=np.int64)
+    matrix[:, 0] = first
+    for index, name in enumerate(FEATURE_NAMES[1:], 1):
+        matrix[:, index] = np.asarray(columns[name])[rows]
+    return matrix
+
+
+def extract_feature_matrix(capture):
+    """Build the feature matrix for a batch of capture rows."""
+    return feature_matrix(extract_feature_columns(capture))
+
+
+def extract_features(packet):
+    """Feature vector of a single capture record (same definition as extract_feature_matrix)."""
+    return extract_feature_matrix(columnar_store.records_to_columns([packet]))[0].tolist()
+
+
+def label_column(capture):
+    """Weak training labels: 1 for packets the rule-based traffic analysis flags as threats."""
+    import traffic_analysis  # Only needed when building the store, not for scoring
+    codes, _ = traffic_analysis.classify_threats(capture)
+    return codes != traffic_analysis.NO_THREAT
+
+
+def _capture_files(file_path):
+    if not os.path.isdir(file_path):
+        return [file_path]
+    return [os.path.join(file_path, name) for name in sorted(os.listdir(file_path))
+            if os.path.isfile(os.path.join(file_path, name))]
+
+
+def fingerprint(file_path):
+    """Cache key of a capture's features: its contents plus everything the features and labels depend on."""
+    digest = hashlib.sha256()
+    dependencies = {
+        "feature_version": FEATURE_VERSION,
+        "blocklists": ip_reputation.blocklist_stamp(),
+        "port_policy": port_policy.load_policy(),
+    }
+    digest.update(json.dumps(dependencies, sort_keys=True).encode())
+
+    # Size, modification time and both ends of each file (a columnar capture is a directory of files)
+    for path in _capture_files(file_path):
+        info = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{info.st_size}:{info.st_mtime_ns}".encode())
+        with open(path, "rb") as f:
+            digest.update(f.read(FINGERPRINT_SAMPLE))
+            if info.st_size > FINGERPRINT_SAMPLE:
+                f.seek(max(FINGERPRINT_SAMPLE, info.st_size - FINGERPRINT_SAMPLE))
+                digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+
+def entry_path(file_path, directory=FEATURE_STORE_DIR):
+    return os.path.join(directory, fingerprint(file_path))
+
+
+def is_cached(path):
+    return os.path.exists(os.path.join(path, columnar_store.META_FILE))
+
+
+def build_features(file_path, path, batch_size=BATCH_SIZE):
+    """Stream a capture batch by batch into a feature store entry (never holding more than one batch)."""
+    temp_path = path + TEMP_SUFFIX
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+
+    count = positives = 0
+    files = {name: open(os.path.join(temp_path, name + columnar_store.COLUMN_FILE_EXTENSION), "wb")
+             for name in STORE_COLUMNS}
+    try:
+        for batch in columnar_store.iter_capture_batches(file_path, batch_size):
+            values = extract_feature_columns(batch)
+            values[LABEL_COLUMN] = label_column(batch)
+            for name, dtype in STORE_COLUMNS.items():
+                np.asarray(values[name], dtype=dtype).tofile(files[name])
+            count += len(batch)
+            positives += int(np.count_nonzero(values[LABEL_COLUMN]))
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        "format_version": columnar_store.FORMAT_VERSION,
+        "count": count,
+        "columns": STORE_COLUMNS,
+        "feature_version": FEATURE_VERSION,
+        "source": file_path,
+        "positives": positives,
+        "created": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+    }
+    with open(os.path.join(temp_path, columnar_store.META_FILE), "w") as f:
+        json.dump(meta, f, indent=4)
+
+    # Publish the finished entry in one step; a concurrent build of the same capture may have won
+    try:
+        os.replace(temp_path, path)
+    except OSError:
+        if not is_cached(path):
+            raise
+        shutil.rmtree(temp_path, ignore_errors=True)
+    return path
+
+
+def load_features(file_path, directory=FEATURE_STORE_DIR, batch_size=BATCH_SIZE):
+    """Memory-map a capture's cached features and labels, extracting them first when not cached.
+
+    Returns (columns, meta); the same capture is only ever extracted once.
+    """
+    path = entry_path(file_path, directory)
+    if is_cached(path):
+        print(f"📦 Cached features: {file_path}")
+    else:
+        print(f"🔍 Extracting features: {file_path}")
+        build_features(file_path, path, batch_size)
+    return columnar_store.load_columns(path)
+
+
+def prune(directory=FEATURE_STORE_DIR):
+    """Delete entries whose capture is gone or has changed; returns how many were removed."""
+    removed = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(TEMP_SUFFIX):
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        try:
+            with open(os.path.join(path, columnar_store.META_FILE), "r") as f:
+                source = json.load(f)["source"]
+            current = os.path.exists(source) and fingerprint(source) == name
+        except (OSError, ValueError, KeyError):
+            current = False
+        if not current:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--prune"]:
+        print(f"✅ Removed {prune()} stale feature store entries from {FEATURE_STORE_DIR}.")
+        sys.exit(0)
+
+    for capture_path in sys.argv[1:]:
+        columns, meta = load_features(capture_path)
+        print(f"  {meta['count']} rows, {meta['positives']} labeled as threats")
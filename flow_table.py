@@ -0,0 +1,244 @@
+import os
+import sys
+import numpy as np
+import packet_io
+import columnar_store
+
+# Directory where exported flow logs are stored
+FLOW_LOG_DIR = "logs/flows"
+
+# Default flow expiry (seconds of capture time) and table limits
+IDLE_TIMEOUT = 60  # Export a flow after this long without packets
+ACTIVE_TIMEOUT = 1800  # Export (and restart) a flow that has been open this long
+INITIAL_CAPACITY = 4096
+MAX_FLOWS = 1_000_000  # Oldest flows are evicted beyond this many
+
+# TCP flags that end a flow once seen
+TCP_FIN = 0x01
+TCP_RST = 0x04
+
+# Per-flow counters kept in the table (the 5-tuple key columns come from CAPTURE_COLUMNS)
+FLOW_KEY_COLUMNS = ("src_addr", "dst_addr", "src_port", "dst_port", "protocol")
+FLOW_COLUMNS = {
+    "packets": "<u8",
+    "bytes": "<u8",
+    "first_seen": "<f8",
+    "last_seen": "<f8",
+}
+
+# Table layout: key columns, IP version, OR-ed TCP flags, then the counters
+TABLE_COLUMNS = dict(
+    {name: columnar_store.CAPTURE_COLUMNS[name] for name in FLOW_KEY_COLUMNS + ("ip_version", "tcp_flags")},
+    **FLOW_COLUMNS
+)
+
+
+def _key_dtype():
+    return np.dtype([(name, columnar_store.CAPTURE_COLUMNS[name]) for name in FLOW_KEY_COLUMNS])
+
+
+class FlowTable:
+    """Aggregate packets into unidirectional (src, dst, sport, dport, proto) flows with array-backed counters."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, active_timeout=ACTIVE_TIMEOUT,
+                 capacity=INITIAL_CAPACITY, max_flows=MAX_FLOWS):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in TABLE_COLUMNS.items()}
+        self.in_use = np.zeros(capacity, dtype=bool)
+        self.packets_seen = 0
+        self.flows_exported = 0
+        self.flows_evicted = 0
+        self._slots = {}  # Flow key -> slot index
+        self._keys = [None] * capacity  # Slot index -> flow key
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _grow(self):
+        capacity = len(self.in_use)
+        new_capacity = capacity * 2
+        for name, column in self.columns.items():
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[:capacity] = column
+            self.columns[name] = grown
+        in_use = np.zeros(new_capacity, dtype=bool)
+        in_use[:capacity] = self.in_use
+        self.in_use = in_use
+        self._keys.extend([None] * capacity)
+        self._free.extend(range(new_capacity - 1, capacity - 1, -1))
+
+    def _allocate(self, key):
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._slots[key] = slot
+        self._keys[slot] = key
+        self.in_use[slot] = True
+        return slot
+
+    def _export(self, slots):
+        """Remove the given slots from the table and return them as a flow capture."""
+        slots = np.sort(np.asarray(slots, dtype=np.int64))
+        if not len(slots):
+            return None
+
+        flows = {name: column[slots].copy() for name, column in self.columns.items()}
+        for slot in slots.tolist():
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = None
+            self._free.append(slot)
+        self.in_use[slots] = False
+        self.flows_exported += len(slots)
+        return flows_to_capture(flows)
+
+    def _expired_slots(self, now):
+        idle = now - self.columns["last_seen"] > self.idle_timeout
+        active = now - self.columns["first_seen"] > self.active_timeout
+        finished = (self.columns["tcp_flags"] & (TCP_FIN | TCP_RST)) != 0
+        return np.flatnonzero(self.in_use & (idle | active | finished))
+
+    def _evict_oldest(self, count):
+        used = np.flatnonzero(self.in_use)
+        oldest = used[np.argpartition(self.columns["last_seen"][used], count - 1)[:count]]
+        self.flows_evicted += len(oldest)
+        return self._export(oldest)
+
+    def update(self, batch):
+        """Fold a columnar packet batch into the table; returns flows completed by it (or None)."""
+        if not len(batch):
+            return None
+
+        self.packets_seen += len(batch)
+        timestamps = np.asarray(batch["timestamp"], dtype=np.float64)
+        completed = []
+
+        # Flows that went idle before this batch started must not absorb its packets
+        stale = self._expired_slots(timestamps.min())
+        completed.append(self._export(stale))
+
+        # Aggregate the batch per flow key with vectorized group-bys
+        keys = np.empty(len(batch), dtype=_key_dtype())
+        for name in FLOW_KEY_COLUMNS:
+            keys[name] = batch[name]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+
+        groups = len(unique_keys)
+        packets = np.bincount(inverse, minlength=groups).astype(np.uint64)
+        sizes = np.bincount(inverse, weights=batch["length"], minlength=groups).astype(np.uint64)
+        first_seen = np.full(groups, np.inf)
+        np.minimum.at(first_seen, inverse, timestamps)
+        last_seen = np.full(groups, -np.inf)
+        np.maximum.at(last_seen, inverse, timestamps)
+        flags = np.zeros(groups, dtype=np.uint8)
+        np.bitwise_or.at(flags, inverse, np.asarray(batch["tcp_flags"], dtype=np.uint8))
+        versions = np.zeros(groups, dtype=np.uint8)
+        np.maximum.at(versions, inverse, np.asarray(batch["ip_version"], dtype=np.uint8))
+
+        # Map each group to its table slot, allocating slots for new flows
+        slots = np.empty(groups, dtype=np.int64)
+        new = np.zeros(groups, dtype=bool)
+        for index, key in enumerate(unique_keys.tolist()):
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._allocate(key)
+                new[index] = True
+            slots[index] = slot
+
+        columns = self.columns
+        new_slots = slots[new]
+        for name in FLOW_KEY_COLUMNS:
+            columns[name][new_slots] = unique_keys[name][new]
+        columns["first_seen"][new_slots] = first_seen[new]
+        columns["last_seen"][new_slots] = last_seen[new]
+        columns["packets"][new_slots] = 0
+        columns["bytes"][new_slots] = 0
+        columns["tcp_flags"][new_slots] = 0
+
+        columns["packets"][slots] += packets
+        columns["bytes"][slots] += sizes
+        columns["last_seen"][slots] = np.maximum(columns["last_seen"][slots], last_seen)
+        columns["tcp_flags"][slots] |= flags
+        columns["ip_version"][slots] = versions
+
+        # Expire flows that went idle, stayed open too long or were closed by FIN/RST
+        completed.append(self._export(self._expired_slots(timestamps.max())))
+
+        if len(self) > self.max_flows:
+            completed.append(self._evict_oldest(len(self) - self.max_flows))
+
+        return concat_flows(completed)
+
+    def flush(self):
+        """Export every flow still in the table (e.g. at the end of a capture)."""
+        return self._export(np.flatnonzero(self.in_use))
+
+
+def flows_to_capture(flows):
+    """Present flow rows as a ColumnarCapture that packet analyzers can scan directly."""
+    count = len(flows["packets"])
+    packets = np.maximum(flows["packets"], 1)
+
+    columns = dict(flows)
+    columns["timestamp"] = flows["first_seen"]
+    # Per-packet checks (e.g. the ML size feature) see the flow's mean packet size
+    columns["length"] = (flows["bytes"] // packets).astype(columnar_store.CAPTURE_COLUMNS["length"])
+
+    offsets = np.zeros(count + 1, dtype=columnar_store.PAYLOAD_OFFSETS[1])
+    return columnar_store.ColumnarCapture(columns, offsets, np.zeros(0, dtype=np.uint8))
+
+
+def concat_flows(captures):
+    """Concatenate flow captures, skipping empty ones; returns None when nothing completed."""
+    captures = [capture for capture in captures if capture is not None and len(capture)]
+    if not captures:
+        return None
+    if len(captures) == 1:
+        return captures[0]
+
+    names = captures[0].columns.keys()
+    columns = {name: np.concatenate([capture[name] for capture in captures]) for name in names}
+    offsets = np.zeros(len(columns["packets"]) + 1, dtype=columnar_store.PAYLOAD_OFFSETS[1])
+    return columnar_store.ColumnarCapture(columns, offsets, np.zeros(0, dtype=np.uint8))
+
+
+def iter_flows(file_path, batch_size=columnar_store.FLUSH_ROWS, **table_options):
+    """Stream a capture through a FlowTable and yield completed flow batches."""
+    table = FlowTable(**table_options)
+    for batch in columnar_store.iter_capture_batches(file_path, batch_size):
+        flows = table.update(batch)
+        if flows is not None:
+            yield flows
+
+    flows = table.flush()
+    if flows is not None:
+        yield flows
+
+
+def export_flows(file_path, output_path=None, **table_options):
+    """Aggregate a capture into flows and save them as a columnar flow log."""
+    flows = concat_flows(list(iter_flows(file_path, **table_options)))
+    if flows is None:
+        print(f"❌ No packets found in {file_path}.")
+        return None
+
+    if output_path is None:
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        output_path = os.path.join(FLOW_LOG_DIR, f"flows_{stem}{packet_io.COLUMNAR_EXTENSION}")
+
+    columnar_store.save_capture(output_path, flows, source=file_path, record_type="flow",
+                                packets=int(flows["packets"].sum()))
+    print(f"✅ Exported {len(flows)} flows ({int(flows['packets'].sum())} packets) to {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else packet_io.get_latest_packet_file()
+    if path:
+        os.makedirs(FLOW_LOG_DIR, exist_ok=True)
+        export_flows(path)
+    else:
+        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
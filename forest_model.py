@@ -0,0 +1,143 @@
+import os
+import sys
+import numpy as np
+import columnar_store
+
+# Node columns of a compiled forest. Trees are stored back to back, each renumbered breadth-first
+# so a node's children are adjacent: a row goes to children + 1 when its feature exceeds the threshold.
+# Leaves point at themselves with an infinite threshold, so extra traversal steps leave rows in place.
+NODE_COLUMNS = {
+    "feature": "<i4",    # Feature tested at the node
+    "threshold": "<f8",  # Go to the left child when feature <= threshold
+    "children": "<i4",   # Absolute node index of the left child (the node itself for leaves)
+}
+CLASS_COLUMN = "class_{}"  # Per-class leaf probability columns ("class_0", "class_1", ...)
+
+# Compiled forests live next to the pickled model they were exported from
+FOREST_EXTENSION = ".forest"
+
+# Rows traversed per step (bounds the rows x trees node-index matrix)
+BATCH_SIZE = 4096
+
+
+class ForestModel:
+    """A random forest flattened into contiguous node arrays, scored with batched NumPy traversal.
+
+    Exposes the parts of the sklearn interface the analyzers use (predict_proba, n_features_in_, classes_).
+    """
+
+    def __init__(self, columns, meta):
+        self.feature = np.asarray(columns["feature"], dtype=np.intp)
+        self.threshold = np.asarray(columns["threshold"])
+        self.children = np.asarray(columns["children"], dtype=np.intp)
+        self.class_values = [np.asarray(columns[CLASS_COLUMN.format(i)]) for i in range(len(meta["classes"]))]
+        self.roots = np.asarray(meta["roots"], dtype=np.intp)
+        self.max_depth = meta["max_depth"]
+        self.n_features_in_ = meta["n_features"]
+        self.classes_ = np.asarray(meta["classes"])
+        self.feature_version_ = meta.get("feature_version")  # Feature definition the model was trained on
+        self.meta = meta
+
+    def _leaves(self, features):
+        """Node index of the leaf each row reaches in every tree: shape (rows, trees)."""
+        # Offsets of each row in the flattened feature matrix
+        row_offsets = (np.arange(len(features)) * self.n_features_in_)[:, None]
+        flat_features = features.ravel()
+        nodes = np.broadcast_to(self.roots, (len(features), len(self.roots))).copy()
+
+        # One step down every tree per iteration
+        for _ in range(self.max_depth):
+            go_right = flat_features.take(row_offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take(nodes) + go_right
+        return nodes
+
+    def predict_proba(self, features, batch_size=BATCH_SIZE):
+        """Class probabilities averaged over the trees, matching RandomForestClassifier.predict_proba."""
+        # sklearn compares float32 features against float64 thresholds
+        features = np.asarray(features, dtype=np.float32).astype(np.float64)
+        if features.ndim != 2 or features.shape[1] != self.n_features_in_:
+            raise ValueError(f"Model expects {self.n_features_in_} features, got shape {features.shape}")
+
+        probabilities = np.empty((len(features), len(self.class_values)), dtype=np.float64)
+        for start in range(0, len(features), batch_size):
+            leaves = self._leaves(features[start:start + batch_size])
+            for index, values in enumerate(self.class_values):
+                probabilities[start:start + batch_size, index] = values.take(leaves).mean(axis=1)
+        return probabilities
+
+    def predict(self, features):
+        return self.classes_[np.argmax(self.predict_proba(features), axis=1)]
+
+
+def _breadth_first(tree):
+    """Node order placing every node's two children next to each other."""
+    order = [0]
+    for node in order:
+        if tree.children_left[node] >= 0:
+            order.extend((tree.children_left[node], tree.children_right[node]))
+    return np.asarray(order)
+
+
+def export_forest(model, path, **extra_meta):
+    """Flatten a fitted RandomForestClassifier into a memory-mappable column directory."""
+    features, thresholds, children, values, roots = [], [], [], [], []
+    max_depth = 0
+    offset = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        order = _breadth_first(tree)
+        position = np.empty(tree.node_count, dtype=np.int64)
+        position[order] = np.arange(tree.node_count) + offset
+
+        is_leaf = tree.children_left[order] < 0
+        features.append(np.where(is_leaf, 0, tree.feature[order]))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+        children.append(np.where(is_leaf, position[order], position[np.maximum(tree.children_left[order], 0)]))
+        # Leaf class counts (or fractions) normalized to probabilities, as DecisionTreeClassifier does
+        value = tree.value[order, 0, :].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        values.append(np.divide(value, totals, out=np.zeros_like(value), where=totals > 0))
+        roots.append(offset)
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += tree.node_count
+
+    columns = {
+        "feature": np.concatenate(features).astype(NODE_COLUMNS["feature"]),
+        "threshold": np.concatenate(thresholds).astype(NODE_COLUMNS["threshold"]),
+        "children": np.concatenate(children).astype(NODE_COLUMNS["children"]),
+    }
+    values = np.concatenate(values)
+    for index in range(values.shape[1]):
+        columns[CLASS_COLUMN.format(index)] = np.ascontiguousarray(values[:, index])
+
+    columnar_store.save_columns(path, columns, roots=roots, max_depth=max_depth,
+                                n_features=int(model.n_features_in_),
+                                classes=[c.item() if hasattr(c, "item") else c for c in model.classes_],
+                                feature_version=getattr(model, "feature_version_", None),
+                                **extra_meta)
+    return path
+
+
+def export_model_file(model, source, path):
+    """Export a model loaded from `source`, stamping the export with the source file's modification time."""
+    return export_forest(model, path, source=source, source_mtime=os.path.getmtime(source))
+
+
+def load_forest(path, source=None):
+    """Memory-map a compiled forest; returns None when it is missing or older than its source model file."""
+    if not os.path.exists(os.path.join(path, columnar_store.META_FILE)):
+        return None
+    columns, meta = columnar_store.load_columns(path)
+    if source and os.path.exists(source) and meta.get("source_mtime") != os.path.getmtime(source):
+        return None
+    return ForestModel(columns, meta)
+
+
+if __name__ == "__main__":
+    import joblib
+
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join("models", "ai_threat_model.pkl")
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + FOREST_EXTENSION
+    export_model_file(joblib.load(source), source, target)
+    print(f"✅ Forest compiled: {source} -> {target}")
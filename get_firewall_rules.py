@@ -1,36 +1,58 @@
 import os
 import json
-import datetime
 import subprocess
 
 # Directory to store firewall rules
 FIREWALL_DIR = "logs/firewall_rules"
 os.makedirs(FIREWALL_DIR, exist_ok=True)
 
+# PowerShell script listing every rule as JSON, with its port, address, program and service filters
+# (each filter type is fetched once for all rules and joined on the rule name; per-rule lookups are very slow)
+RULES_SCRIPT = """
+$ports = @{}; Get-NetFirewallPortFilter -All | ForEach-Object { $ports[$_.InstanceID] = $_ }
+$addresses = @{}; Get-NetFirewallAddressFilter -All | ForEach-Object { $addresses[$_.InstanceID] = $_ }
+$programs = @{}; Get-NetFirewallApplicationFilter -All | ForEach-Object { $programs[$_.InstanceID] = $_ }
+$services = @{}; Get-NetFirewallServiceFilter -All | ForEach-Object { $services[$_.InstanceID] = $_ }
+Get-NetFirewallRule | ForEach-Object {
+    [pscustomobject]@{
+        Name = $_.Name; DisplayName = $_.DisplayName; Direction = $_.Direction; Action = $_.Action
+        Enabled = $_.Enabled; Profile = $_.Profile
+        Protocol = $ports[$_.Name].Protocol; LocalPort = $ports[$_.Name].LocalPort; RemotePort = $ports[$_.Name].RemotePort
+        LocalAddress = $addresses[$_.Name].LocalAddress; RemoteAddress = $addresses[$_.Name].RemoteAddress
+        Program = $programs[$_.Name].Program; Service = $services[$_.Name].Service
+    }
+} | ConvertTo-Json
+"""
+RULES_COMMAND = ["powershell", "-NoProfile", "-NonInteractive", "-Command", RULES_SCRIPT]
+
+def read_firewall_rules():
+    """Return the current Windows Firewall rules as a list of dicts (raises if PowerShell fails)."""
+    result = subprocess.run(RULES_COMMAND, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"PowerShell exited with code {result.returncode}")
+
+    # Parse JSON output (a single rule comes back as an object, not a list)
+    firewall_rules = json.loads(result.stdout) if result.stdout.strip() else []
+    return firewall_rules if isinstance(firewall_rules, list) else [firewall_rules]
+
 def get_firewall_rules():
-    """Extract Windows Firewall rules and save them as JSON."""
+    """Extract Windows Firewall rules and save them as a snapshot in the rule store."""
     try:
         print("Fetching Windows Firewall rules...")
         
         # Run PowerShell command to get firewall rules in JSON format
-        command = 'powershell -Command "Get-NetFirewallRule | Select-Object DisplayName, Direction, Action, Enabled, Profile | ConvertTo-Json"'
-        result = subprocess.run(command, capture_output=True, text=True, shell=True)
-        
-        # Parse JSON output
-        firewall_rules = json.loads(result.stdout) if result.stdout else []
+        firewall_rules = read_firewall_rules()
         
         if not firewall_rules:
             print("No firewall rules found.")
             return
         
-        # Save the rules to a JSON file
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = os.path.join(FIREWALL_DIR, f"firewall_rules_{timestamp}.json")
-        
-        with open(file_path, "w") as f:
-            json.dump(firewall_rules, f, indent=4)
+        # Save the rules in the snapshot store (only rules not stored before take space)
+        import rule_store
+        snapshot_id = rule_store.save_snapshot(firewall_rules, source="get_firewall_rules")
         
-        print(f"Firewall rules saved successfully: {file_path}")
+        print(f"Firewall rules saved successfully: snapshot #{snapshot_id} in {rule_store.STORE_DIR}")
+        return snapshot_id
     
     except Exception as e:
         print(f"Error fetching firewall rules: {e}")
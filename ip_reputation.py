@@ -0,0 +1,215 @@
+import os
+import sys
+import ipaddress
+import numpy as np
+import columnar_store
+
+# Threat-intel blocklists: text files with one address or CIDR block per line ("#" starts a comment)
+BLOCKLIST_DIR = "blocklists"
+BLOCKLIST_EXTENSIONS = (".txt", ".list", ".netset")
+
+# Compiled index (memory-mapped column directory)
+INDEX_PATH = "models/ip_reputation_index"
+
+# Built-in example entries, always part of the index
+DEFAULT_MALICIOUS_IPS = ["192.168.1.100"]  # Replace with known bad IPs
+BUILTIN_FEED = "builtin"
+
+# IPv4 entries are indexed IPv4-mapped so one 128-bit keyspace covers both families
+IPV4_MAPPED_BASE = 0xFFFF << 32
+
+# Index segment columns: disjoint sorted [start, end] ranges, each tagged with its most specific block
+INDEX_COLUMNS = {
+    "start": "S16",
+    "end": "S16",
+    "network": "S16",
+    "prefix_len": "u1",
+    "feed": "<u2",
+}
+
+
+def _to_bytes(value):
+    return value.to_bytes(16, "big")
+
+
+def parse_entry(text):
+    """Parse an address or CIDR block into (first, last, prefix_len) over the 128-bit keyspace."""
+    network = ipaddress.ip_network(text, strict=False)
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    prefix_len = network.prefixlen
+
+    if network.version == 4:
+        first += IPV4_MAPPED_BASE
+        last += IPV4_MAPPED_BASE
+        prefix_len += 96
+
+    return first, last, prefix_len
+
+
+def read_blocklist(file_path):
+    """Yield the address/CIDR entries of a blocklist file."""
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            entry = line.split("#", 1)[0].strip()
+            if entry:
+                yield entry.split()[0]
+
+
+def blocklist_files(directory=BLOCKLIST_DIR):
+    """List blocklist files in a directory, sorted by name."""
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith(BLOCKLIST_EXTENSIONS)]
+
+
+def _source_stamps(files):
+    """Size and mtime of each blocklist, used to detect a stale index."""
+    return {path: [os.path.getsize(path), os.path.getmtime(path)] for path in files}
+
+
+def blocklist_stamp(directory=BLOCKLIST_DIR):
+    """Identifies the entries the index is built from; changes whenever a feed or the built-in list changes."""
+    return {"sources": _source_stamps(blocklist_files(directory)), "builtin": list(DEFAULT_MALICIOUS_IPS)}
+
+
+class ReputationIndex:
+    """Longest-prefix-match index over disjoint, sorted address ranges."""
+
+    def __init__(self, columns, feeds):
+        self.columns = columns
+        self.feeds = feeds
+
+    def __len__(self):
+        return len(self.columns["start"])
+
+    def lookup(self, addrs):
+        """Return, per packed 16-byte address, the matching segment index or -1."""
+        addrs = np.asarray(addrs, dtype="S16")
+        if not len(self):
+            return np.full(addrs.shape, -1, dtype=np.int64)
+
+        index = np.searchsorted(self.columns["start"], addrs, side="right") - 1
+        candidate = np.maximum(index, 0)
+        hit = (index >= 0) & (addrs <= self.columns["end"][candidate])
+        return np.where(hit, index, -1)
+
+    def contains(self, addrs):
+        """Vectorized membership test for an array of packed 16-byte addresses."""
+        return self.lookup(addrs) >= 0
+
+    def contains_ip(self, address):
+        """Membership test for a single address string."""
+        version, packed = columnar_store.encode_ip(address)
+        return bool(version) and bool(self.contains(np.array([packed], dtype="S16"))[0])
+
+    def describe(self, segment):
+        """Render the block and feed behind a segment returned by lookup()."""
+        network = columnar_store.format_ip(self.columns["network"][segment])
+        prefix_len = int(self.columns["prefix_len"][segment])
+        if network.count(":") == 0:  # IPv4-mapped entry
+            prefix_len -= 96
+        return f"{network}/{prefix_len}", self.feeds[int(self.columns["feed"][segment])]
+
+
+def compile_index(entries, feeds):
+    """Compile (text, feed_id) entries into a ReputationIndex of disjoint segments.
+
+    CIDR blocks are either nested or disjoint, so one sort plus a stack sweep
+    labels every address range with its most specific (longest) prefix.
+    """
+    blocks = []
+    for text, feed in entries:
+        try:
+            first, last, prefix_len = parse_entry(text)
+        except ValueError:
+            print(f"⚠️ Skipping invalid blocklist entry: {text}")
+            continue
+        blocks.append((first, -last, prefix_len, feed))
+    blocks.sort()
+
+    segments = []
+
+    def emit(first, last, block):
+        if first <= last:
+            segments.append((first, last, block))
+
+    stack = []
+    position = 0
+    for first, negative_last, prefix_len, feed in blocks:
+        block = (first, -negative_last, prefix_len, feed)
+        # Close blocks that end before this one starts, handing the remainder to their parents
+        while stack and stack[-1][1] < first:
+            top = stack.pop()
+            emit(position, top[1], top)
+            position = top[1] + 1
+        if stack:
+            emit(position, first - 1, stack[-1])
+        position = first
+        stack.append(block)
+
+    while stack:
+        top = stack.pop()
+        emit(position, top[1], top)
+        position = top[1] + 1
+
+    columns = {
+        "start": np.array([_to_bytes(first) for first, _, _ in segments], dtype="S16"),
+        "end": np.array([_to_bytes(last) for _, last, _ in segments], dtype="S16"),
+        "network": np.array([_to_bytes(block[0]) for _, _, block in segments], dtype="S16"),
+        "prefix_len": np.array([block[2] for _, _, block in segments], dtype=INDEX_COLUMNS["prefix_len"]),
+        "feed": np.array([block[3] for _, _, block in segments], dtype=INDEX_COLUMNS["feed"]),
+    }
+    return ReputationIndex(columns, feeds)
+
+
+def build_index(directory=BLOCKLIST_DIR, path=INDEX_PATH, builtin_ips=DEFAULT_MALICIOUS_IPS):
+    """Compile every blocklist in a directory (plus the built-in entries) and save the index."""
+    files = blocklist_files(directory)
+    feeds = [BUILTIN_FEED] + [os.path.splitext(os.path.basename(f))[0] for f in files]
+
+    def entries():
+        for ip in builtin_ips:
+            yield ip, 0
+        for feed, file_path in enumerate(files, 1):
+            for entry in read_blocklist(file_path):
+                yield entry, feed
+
+    index = compile_index(entries(), feeds)
+    columnar_store.save_columns(path, index.columns, feeds=feeds, builtin=list(builtin_ips),
+                                sources=_source_stamps(files))
+    return index
+
+
+def load_index(path=INDEX_PATH):
+    """Memory-map a compiled index; returns (index, meta)."""
+    columns, meta = columnar_store.load_columns(path)
+    return ReputationIndex(columns, meta["feeds"]), meta
+
+
+_index = None
+
+
+def get_index(directory=BLOCKLIST_DIR, path=INDEX_PATH):
+    """Return the reputation index, recompiling it only when the blocklists changed."""
+    global _index
+    if _index is not None:
+        return _index
+
+    try:
+        index, meta = load_index(path)
+        if meta.get("sources") == _source_stamps(blocklist_files(directory)) and \
+                meta.get("builtin") == DEFAULT_MALICIOUS_IPS:
+            _index = index
+            return _index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    _index = build_index(directory, path)
+    return _index
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else BLOCKLIST_DIR
+    index = build_index(directory)
+    print(f"✅ Reputation index built: {len(index)} ranges from {len(index.feeds)} feed(s) -> {INDEX_PATH}")
@@ -0,0 +1,252 @@
+import time
+import queue
+import collections
+import argparse
+import threading
+import datetime
+import packet_io
+import columnar_store
+import traffic_analysis
+import ai_threat_analysis
+import rate_analytics
+import metrics
+
+# Directory where live alerts are appended
+ALERT_DIR = "logs/alerts"
+
+# Live pipeline defaults
+QUEUE_SIZE = 100_000  # Packets buffered between the sniffer and the workers
+WORKER_COUNT = 2
+MICRO_BATCH_SIZE = 256  # Packets analyzed together by a worker
+MAX_BATCH_DELAY = 0.005  # Seconds a worker waits to fill a micro-batch
+REPLAY_RATE = 0  # Replayed packets per second (0 = as fast as possible)
+LATENCY_SAMPLES = 10_000  # Latest micro-batch latencies kept for the percentiles
+
+# Traffic findings at these levels raise an alert (unknown-protocol findings are only reported)
+ALERT_LEVELS = {"⚠️ Critical", "⚠️ High"}
+
+
+def print_alert(alert):
+    """Default alert sink: one console line per alert."""
+    print(f"🚨 {alert['threat_level']} {alert['source']}: {alert['src_ip']} -> {alert['dst_ip']} "
+          f"port {alert['port']} ({alert['reason']}) [{alert['latency_ms']:.1f} ms]")
+
+
+class LiveAnalyzer:
+    """Analyze packets as they arrive: a bounded queue feeding a pool of micro-batch workers.
+
+    submit() never blocks; when the queue is full the packet is dropped and counted,
+    so the capture keeps running even if analysis falls behind.
+    """
+
+    def __init__(self, workers=WORKER_COUNT, queue_size=QUEUE_SIZE, batch_size=MICRO_BATCH_SIZE,
+                 max_delay=MAX_BATCH_DELAY, alert_callback=print_alert, use_model=True, alert_dir=ALERT_DIR,
+                 rate_window=rate_analytics.WINDOW_SECONDS):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker_count = workers
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.alert_callback = alert_callback
+        self.model = ai_threat_analysis.load_model() if use_model else None
+        self.alert_dir = alert_dir
+        self.rates = rate_analytics.RateAnalyzer(rate_window) if rate_window else None
+
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.alerts = 0
+        self.max_queue_depth = 0
+        self.latencies_ms = collections.deque(maxlen=LATENCY_SAMPLES)
+
+        self._lock = threading.Lock()
+        self._rates_lock = threading.Lock()  # Workers share the sliding windows
+        self._stop = threading.Event()
+        self._threads = []
+        self._alert_writer = None
+
+    def submit(self, record):
+        """Queue one packet record for analysis; returns False if it had to be dropped."""
+        self.received += 1
+        try:
+            self.queue.put_nowait((time.perf_counter(), record))
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("packets_dropped_total")
+            return False
+        return True
+
+    def _next_batch(self):
+        """Block for the first packet, then gather more until the batch is full or max_delay passes."""
+        try:
+            items = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.max_delay
+        while len(items) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                items.append(self.queue.get_nowait() if remaining <= 0 else self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _analyze(self, items):
+        """Run the traffic, port-policy and ML checks on one micro-batch and emit alerts."""
+        metrics.set_gauge("queue_depth", self.queue.qsize())
+        metrics.observe("batch_size", len(items), stage="live")
+        with metrics.timer("encode", analyzer="live"):
+            batch = columnar_store.records_to_columns(record for _, record in items)
+
+        # Rule-based alerts go out before the (slower) ML scoring starts
+        with metrics.timer("process", analyzer="live traffic"):
+            findings = traffic_analysis.find_threats(batch, with_index=True)
+        alerts = [(finding.pop("index"), dict(finding, source="traffic"))
+                  for finding in findings if finding["threat_level"] in ALERT_LEVELS]
+        self._emit_all(items, alerts)
+
+        # Scan and flood alerts from the sliding windows, stamped with the batch's last packet
+        if self.rates is not None:
+            with metrics.timer("process", analyzer="live rate"), self._rates_lock:
+                alerts = self.rates.update(batch)
+            self._emit_all(items, [(len(items) - 1, dict(alert, source="rate")) for alert in alerts])
+
+        if self.model is not None:
+            with metrics.timer("process", analyzer="live ml"):
+                results = ai_threat_analysis.score_capture(batch, self.model)
+            alerts = [(index, dict(result, source="ml", reason=f"ML risk score {result['risk_score']}"))
+                      for index, result in enumerate(results) if result["threat_level"] != ai_threat_analysis.SAFE_LEVEL]
+            self._emit_all(items, alerts)
+
+        with self._lock:
+            self.processed += len(items)
+            self.latencies_ms.append((time.perf_counter() - items[0][0]) * 1000)
+
+    def _emit_all(self, items, alerts):
+        now = time.perf_counter()
+        for index, alert in alerts:
+            alert["latency_ms"] = (now - items[index][0]) * 1000
+            alert["timestamp"] = items[index][1].get("timestamp", "Unknown")
+            self._emit(alert)
+
+    def _emit(self, alert):
+        with self._lock:
+            self.alerts += 1
+            if self._alert_writer is not None:
+                self._alert_writer.write(alert)
+        if self.alert_callback is not None:
+            self.alert_callback(alert)
+
+    def _worker(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            items = self._next_batch()
+            if items:
+                depth = self.queue.qsize() + len(items)
+                with self._lock:
+                    self.max_queue_depth = max(self.max_queue_depth, depth)
+                try:
+                    self._analyze(items)
+                except Exception as e:
+                    print(f"❌ Error analyzing live packets: {e}")
+
+    def start(self):
+        """Start the worker pool."""
+        if self.alert_dir:
+            self._alert_writer = packet_io.PacketWriter(self.alert_dir, prefix="alerts")
+        for number in range(self.worker_count):
+            thread = threading.Thread(target=self._worker, name=f"live-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Let the workers drain the queue, stop them and return the run statistics."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._alert_writer is not None:
+            self._alert_writer.close()
+        return self.stats()
+
+    def stats(self):
+        """Counters for the run so far, including percentiles of the latest micro-batch latencies."""
+        with self._lock:
+            latencies = sorted(self.latencies_ms)
+
+        def percentile(fraction):
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)], 3) if latencies else None
+
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "alerts": self.alerts,
+            "max_queue_depth": self.max_queue_depth,
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p99": percentile(0.99),
+        }
+
+
+def replay_capture(analyzer, file_path, rate=REPLAY_RATE):
+    """Feed a saved capture into a running LiveAnalyzer at `rate` packets per second."""
+    interval = 1.0 / rate if rate else 0.0
+    next_send = time.perf_counter()
+
+    for record in packet_io.iter_packets(file_path):
+        if interval:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += interval
+        analyzer.submit(record)
+
+
+def run_live(duration=None, replay=None, rate=REPLAY_RATE, bpf_filter=None, **options):
+    """Run live analysis on the network (or a replayed capture) and print a summary."""
+    analyzer = LiveAnalyzer(**options)
+    analyzer.start()
+    started = time.perf_counter()
+
+    if replay:
+        print(f"▶️ Replaying {replay} at {rate or 'full'} packets/s...")
+        replay_capture(analyzer, replay, rate)
+    else:
+        import capture_packets
+
+        print(f"📡 Live analysis for {duration or 'unlimited'} seconds... (Ctrl+C to stop)")
+
+        def submit_batch(batch):
+            # Payloads go along as raw bytes; their decoded text would mangle binary signatures
+            for index in range(len(batch)):
+                record = batch.packet(index, payload=False)
+                record["payload"] = batch.payload(index) or "No Payload"
+                analyzer.submit(record)
+
+        # The sniffer only decodes headers and enqueues; all analysis happens in the workers
+        try:
+            capture_packets.sniff_raw(duration, submit_batch, flush_seconds=MAX_BATCH_DELAY, bpf_filter=bpf_filter)
+        except KeyboardInterrupt:
+            pass
+
+    stats = analyzer.stop()
+    stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+    stats["finished"] = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    print(f"✅ Live analysis finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    metrics.configure_from_env()
+    parser = argparse.ArgumentParser(description="Real-time in-line threat analysis.")
+    parser.add_argument("--replay", help="replay a saved capture instead of sniffing")
+    parser.add_argument("--rate", type=float, default=REPLAY_RATE, help="replay rate in packets/s (0 = max)")
+    parser.add_argument("--duration", type=float, help="seconds to sniff (default: until Ctrl+C)")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--filter", help='BPF filter applied in the kernel, e.g. "tcp or udp port 53"')
+    parser.add_argument("--rate-window", type=float, default=rate_analytics.WINDOW_SECONDS,
+                        help="sliding window for scan/flood detection in seconds (0 = off)")
+    args = parser.parse_args()
+
+    run_live(args.duration, args.replay, args.rate, args.filter, workers=args.workers, queue_size=args.queue_size,
+             rate_window=args.rate_window)
@@ -1,31 +1,9 @@
-import os
-import subprocess
 import tkinter as tk
 from tkinter import messagebox
+import task_runner
 
-# Define the script directory
-SCRIPT_DIR = "scripts"
-
-# Function to run a script
-def run_script(script_name):
-    script_path = os.path.join(SCRIPT_DIR, script_name)
-    if os.path.exists(script_path):
-        try:
-            subprocess.run(["python", script_path], check=True)
-        except subprocess.CalledProcessError as e:
-            messagebox.showerror("Error", f"Failed to run {script_name}\n{e}")
-    else:
-        messagebox.showerror("Error", f"Script not found: {script_name}")
-
-# Initialize the main window
-root = tk.Tk()
-root.title("Firewall Analyzer")
-root.geometry("600x500")
-root.configure(bg="#2C3E50")
-
-# UI Header
-header = tk.Label(root, text="Select an Option:", font=("Arial", 16, "bold"), bg="#2C3E50", fg="white")
-header.pack(pady=20)
+# Milliseconds between checks for worker progress
+POLL_INTERVAL_MS = 100
 
 # Button Configurations
 BUTTON_CONFIG = {
@@ -36,14 +14,88 @@ BUTTON_CONFIG = {
     "Traffic Threat Analysis": "traffic_analysis.py",
     "AI Threat Analysis": "ai_threat_analysis.py",
     "Connection Analysis": "connection_analysis.py",
+    "Run All Analyses (Single Pass)": "analysis_engine.py",
 }
 
-# Generate buttons dynamically
-for text, script in BUTTON_CONFIG.items():
-    btn = tk.Button(root, text=text, command=lambda s=script: run_script(s),
-                    font=("Arial", 12), bg="#3498DB", fg="white",
-                    activebackground="#2980B9", width=40, height=2)
-    btn.pack(pady=5)
+# Warm background worker that runs the scripts without blocking the window
+runner = task_runner.TaskRunner()
+running = {}  # job id -> script name
+
+# Function to run a script
+def run_script(script_name):
+    if script_name not in task_runner.JOBS:
+        messagebox.showerror("Error", f"Script not found: {script_name}")
+        return
+    running[runner.submit(script_name)] = script_name
+    update_status()
+
+def update_status(message=None):
+    if message is None:
+        message = f"⏳ Running: {', '.join(running.values())}" if running else "✅ Ready"
+    status.config(text=message)
+
+def show_output(text):
+    output.config(state=tk.NORMAL)
+    output.insert(tk.END, text)
+    output.see(tk.END)
+    output.config(state=tk.DISABLED)
+
+# Apply the worker's progress and results, then check again shortly (never blocks the main loop)
+def poll_worker():
+    for event in runner.poll():
+        kind = event[0]
+        if kind == "ready":
+            show_output(f"✅ Background worker ready ({event[2]:.2f}s)\n")
+        elif kind == "output":
+            show_output(event[2])
+        elif kind == "finished":
+            running.pop(event[1], None)
+            show_output(f"✅ {event[2]} finished in {event[4]:.2f}s\n")
+        elif kind == "failed":
+            running.pop(event[1], None)
+            show_output(f"❌ {event[2]} failed: {event[3]}\n")
+            messagebox.showerror("Error", f"Failed to run {event[2]}\n{event[3]}")
+        update_status()
+
+    if running and not runner.alive():
+        show_output("❌ Background worker stopped unexpectedly; it will restart on the next click.\n")
+        running.clear()
+        update_status()
+    root.after(POLL_INTERVAL_MS, poll_worker)
+
+def on_close():
+    runner.stop()
+    root.destroy()
+
+if __name__ == "__main__":
+    # Start the worker first so it warms up while the window is built
+    runner.start()
+
+    # Initialize the main window
+    root = tk.Tk()
+    root.title("Firewall Analyzer")
+    root.geometry("600x800")
+    root.configure(bg="#2C3E50")
+
+    # UI Header
+    header = tk.Label(root, text="Select an Option:", font=("Arial", 16, "bold"), bg="#2C3E50", fg="white")
+    header.pack(pady=20)
+
+    # Generate buttons dynamically
+    for text, script in BUTTON_CONFIG.items():
+        btn = tk.Button(root, text=text, command=lambda s=script: run_script(s),
+                        font=("Arial", 12), bg="#3498DB", fg="white",
+                        activebackground="#2980B9", width=40, height=2)
+        btn.pack(pady=5)
+
+    # Progress and results streamed back from the worker
+    status = tk.Label(root, text="⏳ Starting background worker...", font=("Arial", 11), bg="#2C3E50", fg="white")
+    status.pack(pady=5)
+    output = tk.Text(root, height=12, width=80, font=("Courier", 9), bg="#1C2833", fg="white", state=tk.DISABLED)
+    output.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    root.after(POLL_INTERVAL_MS, poll_worker)
 
-# Run the main loop
-root.mainloop()
+    # Run the main loop
+    root.mainloop()
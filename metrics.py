@@ -0,0 +1,262 @@
+import os
+import time
+import atexit
+import threading
+import http.server
+import psutil
+
+# Collection is off unless one of these is set (or enable() is called)
+METRICS_ENV = "FIREWALL_METRICS"  # "1" collects metrics without exposing them
+METRICS_PORT_ENV = "FIREWALL_METRICS_PORT"  # Serve http://127.0.0.1:<port>/metrics
+METRICS_FILE_ENV = "FIREWALL_METRICS_FILE"  # Rewrite this file periodically (and at exit)
+METRICS_HOST = "127.0.0.1"
+FILE_INTERVAL = 10  # Seconds between metric file writes
+
+METRIC_PREFIX = "firewall_"
+
+# Levels starting with this mark ("✅ Safe") are not findings and are left out of threats_total
+SAFE_MARK = "✅"
+
+# Histogram buckets (upper bounds)
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+SIZE_BUCKETS = (1, 16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+# Every metric the tools report: name -> (type, help text, histogram buckets)
+METRICS = {
+    "packets_captured_total": ("counter", "Packets read from the network.", None),
+    "packets_dropped_total": ("counter", "Packets dropped because live analysis fell behind.", None),
+    "kernel_drops_total": ("counter", "Packets the kernel dropped before the capture could read them.", None),
+    "records_analyzed_total": ("counter", "Capture records fed to each analysis stage.", None),
+    "threats_total": ("counter", "Findings per analyzer and threat level.", None),
+    "connections_total": ("counter", "Connections per port-policy severity.", None),
+    "payload_bytes_scanned_total": ("counter", "Payload bytes matched against the signature automaton.", None),
+    "rules_analyzed_total": ("counter", "Firewall rules checked.", None),
+    "stage_seconds": ("histogram", "Time spent per pipeline stage.", LATENCY_BUCKETS),
+    "batch_size": ("histogram", "Records per processed batch.", SIZE_BUCKETS),
+    "rate_tracked_keys": ("gauge", "Sources and destinations held in the sliding-window tables.", None),
+    "queue_depth": ("gauge", "Packets waiting in the live analysis queue.", None),
+    "resident_memory_bytes": ("gauge", "Resident set size of the process.", None),
+}
+
+_enabled = False
+_lock = threading.Lock()
+_values = {}  # (name, labels) -> number, or [bucket counts, sum, count] for histograms
+_file_path = None
+
+
+class _Timer:
+    """Context manager adding its elapsed time to the stage_seconds histogram."""
+
+    __slots__ = ("labels", "started")
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe("stage_seconds", time.perf_counter() - self.started, **self.labels)
+
+
+class _NullTimer:
+    """Shared do-nothing timer used while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enabled():
+    """Whether metrics are being collected."""
+    return _enabled
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to its current value."""
+    if not _enabled:
+        return
+    with _lock:
+        _values[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram."""
+    if not _enabled:
+        return
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = [[0] * len(buckets), 0.0, 0]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[0][index] += 1
+                break
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def timer(stage, **labels):
+    """Time a block as one stage_seconds observation: `with metrics.timer("decode"): ...`."""
+    if not _enabled:
+        return _NULL_TIMER
+    labels["stage"] = stage
+    return _Timer(labels)
+
+
+def count_levels(analyzer, levels):
+    """Count findings per threat level ("⚠️ High" is reported as level="high")."""
+    if not _enabled:
+        return
+    totals = {}
+    for level in levels:
+        totals[level] = totals.get(level, 0) + 1
+    count_level_totals(analyzer, totals)
+
+
+def count_level_totals(analyzer, totals):
+    """Count findings from {threat level: findings} totals."""
+    if not _enabled:
+        return
+    for level, total in totals.items():
+        if level and level.startswith(SAFE_MARK):
+            continue
+        label = level.split()[-1].lower() if level else "unknown"
+        inc("threats_total", total, analyzer=analyzer, level=label)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format."""
+    set_gauge("resident_memory_bytes", psutil.Process().memory_info().rss)
+
+    with _lock:
+        snapshot = sorted(_values.items(), key=lambda item: (item[0][0], item[0][1]))
+
+    lines = []
+    described = set()
+    for (name, labels), value in snapshot:
+        metric_type, help_text, buckets = METRICS[name]
+        full_name = METRIC_PREFIX + name
+        if name not in described:
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            described.add(name)
+
+        if metric_type != "histogram":
+            lines.append(f"{full_name}{_format_labels(labels)} {value}")
+            continue
+
+        counts, total, count = value
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{full_name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path=None):
+    """Write the current metrics to a file (write-then-rename so readers never see half a file)."""
+    path = path or _file_path
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(render())
+    os.replace(temp_path, path)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console output
+
+
+def start_http_server(port, host=METRICS_HOST):
+    """Serve /metrics from a daemon thread; returns the server."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def _write_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_file()
+        except OSError as e:
+            print(f"⚠️ Could not write metrics file: {e}")
+
+
+def enable(port=None, file_path=None, interval=FILE_INTERVAL):
+    """Start collecting metrics, optionally serving them over HTTP and/or writing them to a file."""
+    global _enabled, _file_path
+    _enabled = True
+
+    if port:
+        try:
+            start_http_server(int(port))
+        except OSError as e:
+            print(f"⚠️ Could not serve metrics on port {port}: {e}")
+    if file_path:
+        _file_path = file_path
+        threading.Thread(target=_write_periodically, args=(interval,), name="metrics-file", daemon=True).start()
+        atexit.register(write_file)
+
+
+def configure_from_env():
+    """Enable metrics when FIREWALL_METRICS, FIREWALL_METRICS_PORT or FIREWALL_METRICS_FILE is set.
+
+    Called by the command-line entry points (not on import, so worker processes and library
+    users never start a server as a side effect).
+    """
+    port = os.environ.get(METRICS_PORT_ENV)
+    file_path = os.environ.get(METRICS_FILE_ENV)
+    if port or file_path or os.environ.get(METRICS_ENV, "") not in ("", "0"):
+        enable(port, file_path)
@@ -0,0 +1,366 @@
+import os
+import sys
+import mmap
+import struct
+import numpy as np
+import columnar_store
+
+# Offline capture files read directly (see packet_io.PCAP_EXTENSIONS)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),  # Microsecond timestamps, little-endian
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),  # Nanosecond timestamps
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = b"\x4d\x3c\x2b\x1a"  # 0x1A2B3C4D as written by a little-endian host
+PCAPNG_INTERFACE_BLOCK = 1
+PCAPNG_OBSOLETE_PACKET_BLOCK = 2
+PCAPNG_SIMPLE_PACKET_BLOCK = 3
+PCAPNG_ENHANCED_PACKET_BLOCK = 6
+PCAPNG_TSRESOL_OPTION = 9
+
+# Link-layer types decoded natively; anything else goes to the scapy fallback
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+RAW_LINKTYPES = (LINKTYPE_RAW, 12, 14)  # 12 and 14 are raw IP on some platforms
+SUPPORTED_LINKTYPES = (LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_LOOP, LINKTYPE_LINUX_SLL,
+                       LINKTYPE_IPV4, LINKTYPE_IPV6, LINKTYPE_LINUX_SLL2) + RAW_LINKTYPES
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+NULL_IPV6_FAMILIES = (10, 24, 28, 30)  # AF_INET6 on Linux, BSDs and macOS
+
+# IPv6 extension headers walked to reach the transport header
+IPV6_HOP_BY_HOP = 0
+IPV6_ROUTING = 43
+IPV6_FRAGMENT = 44
+IPV6_AUTH = 51
+IPV6_DEST_OPTS = 60
+IPV6_EXTENSION_HEADERS = (IPV6_HOP_BY_HOP, IPV6_ROUTING, IPV6_FRAGMENT, IPV6_AUTH, IPV6_DEST_OPTS)
+MAX_IPV6_EXTENSIONS = 4
+
+# Transport protocols whose first four bytes are the source and destination ports
+PORT_PROTOCOLS = (6, 17, 132)  # TCP, UDP, SCTP
+ICMP_PROTOCOLS = (1, 58)
+TCP = 6
+UDP = 17
+UDP_HEADER = 8
+ICMP_HEADER = 8
+
+# Payload bytes copied per gather step (each step needs an 8-byte index per byte)
+GATHER_BYTES = 1 << 20
+
+# Frames decoded per batch when streaming a capture file
+BATCH_SIZE = columnar_store.FLUSH_ROWS
+
+
+def decode_frames(data, starts, caplens, wirelens, timestamps, linktypes, fallback=True, max_payload=None):
+    """Decode raw link-layer frames straight into a ColumnarCapture with vectorized header reads.
+
+    `data` is one uint8 buffer holding every frame; frame i is data[starts[i]:starts[i] + caplens[i]].
+    Frames with an unsupported link type or a malformed IP header are handed to the scapy
+    dissector when fallback=True (and scapy is installed). max_payload keeps at most that many
+    payload bytes per packet.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = starts + np.asarray(caplens, dtype=np.int64)
+    linktypes = np.broadcast_to(np.asarray(linktypes, dtype=np.int64), starts.shape)
+    count = len(starts)
+    last = max(len(data) - 1, 0)
+    padded = data if len(data) else np.zeros(1, dtype=np.uint8)
+
+    def u8(positions):
+        return padded[np.clip(positions, 0, last)].astype(np.int64)
+
+    def u16(positions):
+        return (u8(positions) << 8) | u8(positions + 1)
+
+    # Link layer: find where the network header starts and which protocol it carries
+    ethertype = np.full(count, -1, dtype=np.int64)
+    network = starts.copy()
+
+    ethernet = linktypes == LINKTYPE_ETHERNET
+    if ethernet.any():
+        frame_type = u16(starts + 12)
+        offset = starts + 14
+        for _ in range(2):  # Up to two stacked VLAN tags (802.1Q / QinQ)
+            tagged = np.isin(frame_type, VLAN_ETHERTYPES)
+            frame_type = np.where(tagged, u16(offset + 2), frame_type)
+            offset = offset + 4 * tagged
+        ethertype = np.where(ethernet, frame_type, ethertype)
+        network = np.where(ethernet, offset, network)
+
+    for linktype, type_offset, header_length in ((LINKTYPE_LINUX_SLL, 14, 16), (LINKTYPE_LINUX_SLL2, 0, 20)):
+        cooked = linktypes == linktype
+        if cooked.any():
+            ethertype = np.where(cooked, u16(starts + type_offset), ethertype)
+            network = np.where(cooked, starts + header_length, network)
+
+    loopback = np.isin(linktypes, (LINKTYPE_NULL, LINKTYPE_LOOP))
+    if loopback.any():
+        family = u8(starts) | u8(starts + 3)  # 4-byte address family in either byte order
+        family_type = np.where(family == 2, ETHERTYPE_IPV4,
+                               np.where(np.isin(family, NULL_IPV6_FAMILIES), ETHERTYPE_IPV6, -1))
+        ethertype = np.where(loopback, family_type, ethertype)
+        network = np.where(loopback, starts + 4, network)
+
+    raw = np.isin(linktypes, RAW_LINKTYPES + (LINKTYPE_IPV4, LINKTYPE_IPV6))
+    if raw.any():
+        version = u8(starts) >> 4
+        raw_type = np.where(version == 4, ETHERTYPE_IPV4, np.where(version == 6, ETHERTYPE_IPV6, -1))
+        ethertype = np.where(raw, raw_type, ethertype)
+
+    # Network layer
+    first_byte = u8(network)
+    header_length = (first_byte & 0x0F) * 4
+    claims_v4 = ethertype == ETHERTYPE_IPV4
+    claims_v6 = ethertype == ETHERTYPE_IPV6
+    ipv4 = claims_v4 & (first_byte >> 4 == 4) & (header_length >= 20) & (network + header_length <= ends)
+    ipv6 = claims_v6 & (first_byte >> 4 == 6) & (network + 40 <= ends)
+    has_ip = ipv4 | ipv6
+
+    protocol = np.where(ipv4, u8(network + 9), np.where(ipv6, u8(network + 6), -1))
+    transport = np.where(ipv4, network + header_length, network + 40)
+    # Non-first fragments carry no transport header
+    fragment = ipv4 & ((u16(network + 6) & 0x1FFF) != 0)
+
+    for _ in range(MAX_IPV6_EXTENSIONS):
+        extension = ipv6 & np.isin(protocol, IPV6_EXTENSION_HEADERS) & (transport + 8 <= ends)
+        if not extension.any():
+            break
+        fragment |= extension & (protocol == IPV6_FRAGMENT) & ((u16(transport + 2) & 0xFFF8) != 0)
+        length = np.where(protocol == IPV6_FRAGMENT, 8,
+                          np.where(protocol == IPV6_AUTH, (u8(transport + 1) + 2) * 4, (u8(transport + 1) + 1) * 8))
+        protocol = np.where(extension, u8(transport), protocol)
+        transport = np.where(extension, transport + length, transport)
+
+    # Addresses as packed 16-byte keys (IPv4 stored IPv4-mapped, as in columnar_store)
+    addresses = {}
+    for name, v4_offset, v6_offset in (("src_addr", 12, 8), ("dst_addr", 16, 24)):
+        packed = np.zeros((count, 16), dtype=np.uint8)
+        packed[ipv6] = padded[np.clip(network[ipv6, None] + v6_offset + np.arange(16), 0, last)]
+        packed[ipv4, 10:12] = 0xFF
+        packed[ipv4, 12:] = padded[np.clip(network[ipv4, None] + v4_offset + np.arange(4), 0, last)]
+        addresses[name] = packed.view("S16").ravel()
+
+    # Transport layer
+    whole = has_ip & ~fragment
+    ported = whole & np.isin(protocol, PORT_PROTOCOLS) & (transport + 4 <= ends)
+    tcp = whole & (protocol == TCP) & (transport + 14 <= ends)
+
+    payload_start = np.where(tcp, transport + (u8(transport + 12) >> 4) * 4,
+                             np.where(ported & (protocol == UDP), transport + UDP_HEADER,
+                                      np.where(whole & np.isin(protocol, ICMP_PROTOCOLS), transport + ICMP_HEADER,
+                                               transport)))
+    payload_start = np.minimum(np.where(has_ip, payload_start, ends), ends)
+
+    columns = {
+        "timestamp": np.asarray(timestamps, dtype=columnar_store.CAPTURE_COLUMNS["timestamp"]),
+        "ip_version": np.where(ipv4, 4, np.where(ipv6, 6, 0)).astype(columnar_store.CAPTURE_COLUMNS["ip_version"]),
+        "src_addr": addresses["src_addr"],
+        "dst_addr": addresses["dst_addr"],
+        "src_port": np.where(ported, u16(transport), -1).astype(columnar_store.CAPTURE_COLUMNS["src_port"]),
+        "dst_port": np.where(ported, u16(transport + 2), -1).astype(columnar_store.CAPTURE_COLUMNS["dst_port"]),
+        "protocol": protocol.astype(columnar_store.CAPTURE_COLUMNS["protocol"]),
+        "length": np.asarray(wirelens, dtype=columnar_store.CAPTURE_COLUMNS["length"]),
+        "tcp_flags": np.where(tcp, u8(transport + 13), 0).astype(columnar_store.CAPTURE_COLUMNS["tcp_flags"]),
+    }
+
+    lengths = ends - payload_start
+    if max_payload is not None:
+        lengths = np.minimum(lengths, max_payload)
+    offsets = np.zeros(count + 1, dtype=columnar_store.PAYLOAD_OFFSETS[1])
+    np.cumsum(lengths, out=offsets[1:])
+    blob = _gather_payloads(padded, payload_start, lengths, offsets.astype(np.int64))
+    capture = columnar_store.ColumnarCapture(columns, offsets, blob)
+
+    unsupported = ~np.isin(linktypes, SUPPORTED_LINKTYPES) | (claims_v4 & ~ipv4) | (claims_v6 & ~ipv6)
+    if fallback and unsupported.any():
+        capture = _dissect_fallback(capture, data, starts, ends, timestamps, linktypes, np.flatnonzero(unsupported),
+                                    max_payload)
+    return capture
+
+
+def _gather_payloads(data, payload_start, lengths, offsets):
+    """Copy every frame's payload into one blob with fancy-indexing, GATHER_BYTES of output at a time."""
+    blob = np.empty(int(offsets[-1]), dtype=np.uint8)
+    row = 0
+    while row < len(lengths):
+        # Bound the per-byte index array so large payloads do not multiply memory use
+        stop = max(int(np.searchsorted(offsets, offsets[row] + GATHER_BYTES, side="right")) - 1, row + 1)
+        stop = min(stop, len(lengths))
+        positions = np.repeat(payload_start[row:stop] - offsets[row:stop], lengths[row:stop])
+        positions += np.arange(offsets[row], offsets[stop])
+        blob[offsets[row]:offsets[stop]] = data[positions]
+        row = stop
+    return blob
+
+
+def _dissect_fallback(capture, data, starts, ends, timestamps, linktypes, indexes, max_payload=None):
+    """Re-decode the given frames with scapy and splice their records into the capture."""
+    try:
+        import scapy.all as scapy
+        from capture_packets import packet_callback
+    except ImportError:
+        return capture
+
+    wire_lengths = capture["length"][indexes].copy()
+    rows = {}
+    for index in indexes.tolist():
+        layer = scapy.conf.l2types.num2layer.get(int(linktypes[index]), scapy.conf.raw_layer)
+        record = packet_callback(layer(bytes(data[starts[index]:ends[index]])))
+        record["timestamp"] = float(timestamps[index])
+        rows[index] = columnar_store.encode_packet(record)
+
+    payloads = [rows[index][1][:max_payload] if index in rows else capture.payload(index) for index in range(len(capture))]
+    for index, (row, _) in rows.items():
+        for name, value in zip(columnar_store.CAPTURE_COLUMNS, row):
+            capture.columns[name][index] = value
+    capture.columns["length"][indexes] = wire_lengths  # scapy only sees the captured bytes
+
+    offsets = np.zeros(len(payloads) + 1, dtype=columnar_store.PAYLOAD_OFFSETS[1])
+    np.cumsum([len(p) for p in payloads], out=offsets[1:])
+    blob = np.frombuffer(b"".join(payloads), dtype=np.uint8)
+    return columnar_store.ColumnarCapture(capture.columns, offsets, blob)
+
+
+def decode_raw_frames(frames, linktype=LINKTYPE_ETHERNET, fallback=True, wire_lengths=None, max_payload=None):
+    """Decode a list of (timestamp, frame bytes) captured live into a ColumnarCapture.
+
+    wire_lengths gives the original sizes of frames truncated to a snap length.
+    """
+    lengths = np.fromiter((len(frame) for _, frame in frames), dtype=np.int64, count=len(frames))
+    starts = np.zeros(len(frames), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    data = np.frombuffer(b"".join(frame for _, frame in frames), dtype=np.uint8)
+    timestamps = np.fromiter((ts for ts, _ in frames), dtype=np.float64, count=len(frames))
+    wirelens = lengths if wire_lengths is None else wire_lengths
+    return decode_frames(data, starts, lengths, wirelens, timestamps, linktype, fallback, max_payload)
+
+
+def _iter_pcap_index(buffer, batch_size):
+    """Yield lists of (timestamp, start, caplen, wirelen, linktype) from a classic pcap file."""
+    endian, resolution = PCAP_MAGIC[bytes(buffer[:4])]
+    linktype = struct.unpack_from(endian + "I", buffer, 20)[0] & 0x0FFFFFFF  # Upper bits carry FCS info
+    record_header = struct.Struct(endian + "IIII")
+    size = len(buffer)
+    position = 24
+
+    rows = []
+    while position + record_header.size <= size:
+        seconds, fraction, caplen, wirelen = record_header.unpack_from(buffer, position)
+        position += record_header.size
+        if position + caplen > size:
+            break  # Truncated last record (capture still being written)
+        rows.append((seconds + fraction * resolution, position, caplen, wirelen, linktype))
+        position += caplen
+        if len(rows) >= batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def _interface_resolution(buffer, position, block_length, endian):
+    """Timestamp resolution (seconds per tick) from an interface block's if_tsresol option."""
+    option = position + 16
+    end = position + block_length - 4
+    while option + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buffer, option)
+        if code == 0:
+            break
+        if code == PCAPNG_TSRESOL_OPTION and length >= 1:
+            value = buffer[option + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        option += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+def _iter_pcapng_index(buffer, batch_size):
+    """Yield lists of (timestamp, start, caplen, wirelen, linktype) from a pcapng file."""
+    size = len(buffer)
+    position = 0
+    endian = "<"
+    interfaces = []  # (linktype, seconds per timestamp tick) per interface of the current section
+
+    rows = []
+    while position + 12 <= size:
+        if struct.unpack_from("<I", buffer, position)[0] == PCAPNG_SECTION_HEADER:
+            endian = "<" if bytes(buffer[position + 8:position + 12]) == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        block_type, block_length = struct.unpack_from(endian + "II", buffer, position)
+        if block_length < 12 or position + block_length > size:
+            break
+
+        if block_type == PCAPNG_INTERFACE_BLOCK:
+            linktype = struct.unpack_from(endian + "H", buffer, position + 8)[0]
+            interfaces.append((linktype, _interface_resolution(buffer, position, block_length, endian)))
+        elif block_type in (PCAPNG_ENHANCED_PACKET_BLOCK, PCAPNG_OBSOLETE_PACKET_BLOCK):
+            if block_type == PCAPNG_ENHANCED_PACKET_BLOCK:
+                interface, high, low, caplen, wirelen = struct.unpack_from(endian + "IIIII", buffer, position + 8)
+            else:
+                interface, _, high, low, caplen, wirelen = struct.unpack_from(endian + "HHIIII", buffer, position + 8)
+            linktype, resolution = interfaces[interface] if interface < len(interfaces) else (LINKTYPE_ETHERNET, 1e-6)
+            rows.append((((high << 32) | low) * resolution, position + 28, caplen, wirelen, linktype))
+        elif block_type == PCAPNG_SIMPLE_PACKET_BLOCK:
+            wirelen = struct.unpack_from(endian + "I", buffer, position + 8)[0]
+            linktype = interfaces[0][0] if interfaces else LINKTYPE_ETHERNET
+            rows.append((0.0, position + 12, min(wirelen, block_length - 16), wirelen, linktype))
+
+        position += block_length
+        if len(rows) >= batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def _map_file(file_path):
+    """Memory-map a capture file read-only (empty files give an empty buffer)."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_pcap_batches(file_path, batch_size=BATCH_SIZE, fallback=True):
+    """Stream a pcap/pcapng file as decoded ColumnarCapture batches without per-packet dissection."""
+    buffer = _map_file(file_path)
+    if len(buffer) < 12:
+        return
+
+    if struct.unpack_from("<I", buffer, 0)[0] == PCAPNG_SECTION_HEADER:
+        index = _iter_pcapng_index(buffer, batch_size)
+    elif bytes(buffer[:4]) in PCAP_MAGIC:
+        index = _iter_pcap_index(buffer, batch_size)
+    else:
+        raise ValueError(f"{file_path} is not a pcap or pcapng file")
+
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    for rows in index:
+        timestamps, starts, caplens, wirelens, linktypes = zip(*rows)
+        yield decode_frames(data, starts, caplens, wirelens, timestamps, linktypes, fallback)
+
+
+def read_pcap(file_path, fallback=True):
+    """Decode a whole pcap/pcapng file into one ColumnarCapture."""
+    batches = list(iter_pcap_batches(file_path, sys.maxsize, fallback))
+    if batches:
+        return batches[0]
+    return columnar_store.records_to_columns([])
+
+
+def iter_pcap_records(file_path):
+    """Yield the packets of a pcap/pcapng file as normalized capture records."""
+    for batch in iter_pcap_batches(file_path):
+        yield from batch.iter_packets()
+
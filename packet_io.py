@@ -0,0 +1,220 @@
+import os
+import json
+import base64
+import time
+import datetime
+
+# Directory holding captured packets
+PACKET_LOG_DIR = "logs/packets"
+
+# Captures are written as newline-delimited JSON segments (one record per line)
+SEGMENT_EXTENSION = ".jsonl"
+# Columnar captures are directories of fixed-width column files (see columnar_store.py)
+COLUMNAR_EXTENSION = ".cols"
+# Offline pcap/pcapng files are decoded straight from their raw headers (see packet_decoder.py)
+PCAP_EXTENSIONS = (".pcap", ".pcapng")
+PACKET_FILE_EXTENSIONS = (".json", SEGMENT_EXTENSION, COLUMNAR_EXTENSION) + PCAP_EXTENSIONS
+
+# Default rotation limits for a capture segment
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024  # 64 MB
+DEFAULT_MAX_SEGMENT_SECONDS = 300  # 5 minutes
+WRITE_BUFFER_SIZE = 1024 * 1024  # 1 MB
+
+# Raw payload bytes are stored base64-encoded under this field; older logs only hold
+# scapy's payload summary text under "payload"
+RAW_PAYLOAD_FIELD = "payload_b64"
+
+
+class PacketWriter:
+    """Append packet records to size/time rotated newline-delimited JSON segments."""
+
+    def __init__(self, directory, prefix="packets", max_bytes=DEFAULT_MAX_SEGMENT_BYTES,
+                 max_seconds=DEFAULT_MAX_SEGMENT_SECONDS, buffer_size=WRITE_BUFFER_SIZE):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer_size = buffer_size
+        self.started = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.segments = []  # Paths of every segment opened so far
+        self.packets_written = 0
+        self._file = None
+        self._segment_bytes = 0
+        self._segment_opened = 0.0
+        self._summary = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _should_rotate(self):
+        """Check whether the current segment reached its size or age limit."""
+        if self.max_bytes and self._segment_bytes >= self.max_bytes:
+            return True
+        if self.max_seconds and time.monotonic() - self._segment_opened >= self.max_seconds:
+            return True
+        return False
+
+    def _open_segment(self):
+        """Close the current segment (if any) and start a new one."""
+        self._close_segment()
+        file_name = f"{self.prefix}_{self.started}_{len(self.segments):04d}{SEGMENT_EXTENSION}"
+        path = os.path.join(self.directory, file_name)
+        self._file = open(path, "wb", buffering=self.buffer_size)
+        self._segment_bytes = 0
+        self._segment_opened = time.monotonic()
+        self.segments.append(path)
+
+        import capture_catalog
+        self._summary = capture_catalog.CaptureSummary()
+        self._catalog(path)
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._catalog(self.segments[-1])
+
+    def _catalog(self, path):
+        """Record the segment (so far) in the capture catalog without ever interrupting the capture."""
+        import capture_catalog
+        try:
+            capture_catalog.register_capture(path, self._summary)
+        except Exception as e:
+            print(f"⚠️ Could not update the capture catalog for {path}: {e}")
+
+    def write(self, record):
+        """Append a single packet record to the current segment."""
+        if self._file is None or self._should_rotate():
+            self._open_segment()
+
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        self._file.write(line)
+        self._segment_bytes += len(line)
+        self.packets_written += 1
+        self._summary.add_record(record)
+
+    def close(self):
+        """Flush and close the current segment."""
+        self._close_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def is_packet_file(file_name):
+    """Check whether a file name looks like a packet capture log."""
+    return file_name.endswith(PACKET_FILE_EXTENSIONS)
+
+
+def capture_sort_key(file_name):
+    """Sort key ordering captures by name, preferring the columnar copy of the same capture."""
+    stem, extension = os.path.splitext(file_name)
+    return stem, extension == COLUMNAR_EXTENSION
+
+
+def get_latest_packet_file(directory=PACKET_LOG_DIR):
+    """Find the latest captured packet file (looked up in the capture catalog)."""
+    import capture_catalog
+
+    if not os.path.exists(directory):
+        print(f"❌ Packet log directory '{directory}' not found.")
+        return None
+
+    try:
+        latest = capture_catalog.latest_capture(directory)
+    except Exception as e:
+        print(f"⚠️ Capture catalog unavailable ({e}); scanning '{directory}'.")
+        # Get the most recent file based on timestamp in filename
+        files = sorted((f for f in os.listdir(directory) if is_packet_file(f)), key=capture_sort_key, reverse=True)
+        latest = os.path.join(directory, files[0]) if files else None
+
+    if latest is None:
+        print(f"❌ No packet capture files found in '{directory}'.")
+    return latest
+
+
+def iter_packets(file_path):
+    """Yield packet records from a JSON array log, a newline-delimited segment or a pcap file."""
+    if file_path.endswith(PCAP_EXTENSIONS):
+        import packet_decoder
+        yield from packet_decoder.iter_pcap_records(file_path)
+    elif file_path.endswith(SEGMENT_EXTENSION):
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def iter_segment_from(file_path, offset=0):
+    """Yield (record, next_offset) from a newline-delimited segment starting at a byte offset.
+
+    Stops before a partially written last line so a growing capture can be resumed later.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        for line in iter(f.readline, b""):
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+
+def load_packets(file_path):
+    """Load every packet record from a capture log into a list."""
+    return list(iter_packets(file_path))
+
+
+# Capture logs and analyzers historically spell the same fields differently
+FIELD_ALIASES = {
+    "src_ip": ("src_ip", "source_ip"),
+    "dst_ip": ("dst_ip", "destination_ip"),
+    "src_port": ("src_port", "source_port"),
+    "dst_port": ("dst_port", "destination_port"),
+    "packet_size": ("packet_size", "length"),
+}
+
+# IP protocol numbers recorded by scapy and the names the analyzers compare against
+PROTOCOL_NAMES = {1: "ICMP", 6: "TCP", 17: "UDP", 58: "ICMPv6"}
+PROTOCOL_NUMBERS = {name: number for number, name in PROTOCOL_NAMES.items()}
+
+
+def _first_present(record, keys, default="Unknown"):
+    for key in keys:
+        if key in record:
+            return record[key]
+    return default
+
+
+def set_payload(record, payload):
+    """Store a packet's raw payload bytes in a capture record (JSON-safe); returns the record."""
+    record.pop("payload", None)
+    if payload:
+        record[RAW_PAYLOAD_FIELD] = base64.b64encode(payload).decode("ascii")
+    else:
+        record["payload"] = "No Payload"
+    return record
+
+
+def normalize_packet(record):
+    """Map a raw capture record onto the field names and values the analyzers use."""
+    protocol = record.get("protocol", "Unknown")
+    if isinstance(protocol, int):
+        protocol = PROTOCOL_NAMES.get(protocol, protocol)
+
+    packet = {
+        "timestamp": record.get("timestamp", "Unknown"),
+        "protocol": protocol,
+        "payload": base64.b64decode(record[RAW_PAYLOAD_FIELD]) if RAW_PAYLOAD_FIELD in record
+        else record.get("payload", "No Payload"),
+        "tcp_flags": record.get("tcp_flags", 0),
+    }
+    for field, keys in FIELD_ALIASES.items():
+        packet[field] = _first_present(record, keys)
+    return packet
@@ -0,0 +1,163 @@
+import os
+import json
+import numpy as np
+import packet_io
+
+# Optional policy file overriding DEFAULT_RULES
+PORT_POLICY_PATH = "config/port_policy.json"
+
+# Severity levels, lowest to highest
+SECURE = 0
+CAUTION = 1
+NOT_SECURE = 2
+HIGH_RISK = 3
+SEVERITY_NAMES = ["secure", "caution", "not_secure", "high_risk"]
+SEVERITY_LEVELS = {name: level for level, name in enumerate(SEVERITY_NAMES)}
+
+PORT_COUNT = 65536
+MAX_PROTOCOL = 255
+
+# Built-in policy: the common port security classification and attack-vector ports.
+# "ports" takes a single port, a "low-high" range or a list of either; "protocol" is
+# "any", a protocol name ("tcp", "udp", ...) or an IP protocol number.
+DEFAULT_POLICY = {
+    "default_severity": "secure",
+    "rules": [
+        {"ports": 443, "protocol": "any", "severity": "secure", "label": "HTTPS"},
+        {"ports": 80, "protocol": "any", "severity": "not_secure", "label": "Unencrypted HTTP"},
+        {"ports": 22, "protocol": "any", "severity": "not_secure", "label": "SSH Exposed"},
+        {"ports": 23, "protocol": "any", "severity": "high_risk", "label": "Telnet - Common Attack Vector"},
+        {"ports": 445, "protocol": "any", "severity": "high_risk", "label": "SMB - High Risk"},
+        {"ports": 3389, "protocol": "any", "severity": "high_risk", "label": "RDP - High Risk"},
+        {"ports": 53, "protocol": "any", "severity": "caution", "label": "DNS - Potential Data Leakage"},
+        {"ports": 25, "protocol": "any", "severity": "caution", "label": "SMTP - Spam/Phishing Risk"},
+    ],
+}
+
+
+def _parse_ports(ports):
+    """Expand a rule's "ports" value into (low, high) inclusive ranges."""
+    if not isinstance(ports, list):
+        ports = [ports]
+
+    ranges = []
+    for item in ports:
+        if isinstance(item, int):
+            low = high = item
+        else:
+            low, _, high = str(item).partition("-")
+            low, high = int(low), int(high or low)
+        if not 0 <= low <= high < PORT_COUNT:
+            raise ValueError(f"Invalid port range: {item}")
+        ranges.append((low, high))
+    return ranges
+
+
+def _parse_protocol(protocol):
+    """Map a rule's protocol to an IP protocol number, or None for "any"."""
+    if protocol is None or str(protocol).lower() == "any":
+        return None
+    if isinstance(protocol, int):
+        return protocol
+    number = packet_io.PROTOCOL_NUMBERS.get(str(protocol).upper())
+    if number is None:
+        raise ValueError(f"Unknown protocol in port policy: {protocol}")
+    return number
+
+
+def _parse_severity(severity):
+    if isinstance(severity, int):
+        return severity
+    return SEVERITY_LEVELS[str(severity).lower()]
+
+
+class PortPolicy:
+    """A port policy compiled into dense per-protocol severity and label tables."""
+
+    def __init__(self, severities, label_ids, labels, protocol_rows, default_severity):
+        self.severities = severities  # (tables, 65536) uint8; row 0 applies to every protocol
+        self.label_ids = label_ids  # (tables, 65536) uint16 indexes into labels
+        self.labels = labels
+        self.protocol_rows = protocol_rows  # Protocol number -> table row (0 = "any")
+        self.default_severity = default_severity
+
+    def _flat_index(self, ports, protocols):
+        ports = np.asarray(ports)
+        valid = (ports >= 0) & (ports < PORT_COUNT)
+        rows = np.zeros(ports.shape, dtype=np.int64)
+        if protocols is not None:
+            protocols = np.asarray(protocols)
+            known = (protocols >= 0) & (protocols <= MAX_PROTOCOL)
+            rows = np.where(known, self.protocol_rows.take(np.clip(protocols, 0, MAX_PROTOCOL)), 0)
+        return rows * PORT_COUNT + np.where(valid, ports, 0), valid
+
+    def classify(self, ports, protocols=None):
+        """Severity of every port in a column (optionally per protocol) with one vectorized take."""
+        flat, valid = self._flat_index(ports, protocols)
+        return np.where(valid, self.severities.ravel().take(flat), self.default_severity).astype(np.uint8)
+
+    def label(self, port, protocol=None):
+        """Human-readable classification of a single port."""
+        flat, valid = self._flat_index(np.array([port if isinstance(port, int) else -1]),
+                                       None if protocol is None else np.array([protocol]))
+        if not valid[0]:
+            return ""
+        return self.labels[int(self.label_ids.ravel()[flat[0]])]
+
+
+def compile_policy(policy):
+    """Compile a policy dict into a PortPolicy.
+
+    Protocol-specific rules override "any" rules, and narrower ranges override wider
+    ones; among equally specific rules the later one wins.
+    """
+    default_severity = _parse_severity(policy.get("default_severity", "secure"))
+
+    rules = []
+    for order, rule in enumerate(policy.get("rules", [])):
+        protocol = _parse_protocol(rule.get("protocol", "any"))
+        severity = _parse_severity(rule["severity"])
+        label = rule.get("label", SEVERITY_NAMES[severity] if severity < len(SEVERITY_NAMES) else "")
+        for low, high in _parse_ports(rule["ports"]):
+            rules.append((protocol is not None, -(high - low), order, low, high, protocol, severity, label))
+    rules.sort(key=lambda rule: rule[:3])
+
+    protocols = sorted({rule[5] for rule in rules if rule[5] is not None})
+    protocol_rows = np.zeros(MAX_PROTOCOL + 1, dtype=np.int64)
+    for row, protocol in enumerate(protocols, 1):
+        protocol_rows[protocol] = row
+
+    labels = [""]
+    label_index = {"": 0}
+    severities = np.full((len(protocols) + 1, PORT_COUNT), default_severity, dtype=np.uint8)
+    label_ids = np.zeros((len(protocols) + 1, PORT_COUNT), dtype=np.uint16)
+
+    for _, _, _, low, high, protocol, severity, label in rules:
+        if label not in label_index:
+            label_index[label] = len(labels)
+            labels.append(label)
+        # "any" rules paint every table; protocol rules (painted later) override their own row
+        rows = slice(None) if protocol is None else protocol_rows[protocol]
+        severities[rows, low:high + 1] = severity
+        label_ids[rows, low:high + 1] = label_index[label]
+
+    return PortPolicy(severities, label_ids, labels, protocol_rows, default_severity)
+
+
+def load_policy(path=PORT_POLICY_PATH):
+    """Load the policy file if present, falling back to DEFAULT_POLICY."""
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return DEFAULT_POLICY
+
+
+_policy = None
+
+
+def get_policy():
+    """Return the compiled port policy, compiling it on first use."""
+    global _policy
+    if _policy is None:
+        _policy = compile_policy(load_policy())
+    return _policy
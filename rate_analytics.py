@@ -0,0 +1,354 @@
+import sys
+import argparse
+import numpy as np
+import packet_io
+import columnar_store
+import metrics
+
+# Sliding windows are built from ring buffers of fixed-width time buckets (seconds of capture time).
+# Each key's ring holds two windows, so its current rate can be compared with the window before it.
+BUCKET_SECONDS = 1.0
+WINDOW_SECONDS = 10.0
+
+# Distinct destination ports / addresses are counted with a small bitmap per bucket (linear counting),
+# so a key's state has a fixed size however many targets it touches
+DISTINCT_BITS = 256
+
+# Bounded state: at most MAX_KEYS sources and MAX_KEYS destinations are tracked. Keys idle for longer
+# than the ring covers are dropped, and the least recently seen keys are evicted beyond MAX_KEYS.
+INITIAL_CAPACITY = 1024
+MAX_KEYS = 50_000
+
+# TCP flags: a SYN without ACK opens a connection (half-open until answered)
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+# Alert thresholds (per window, rates in packets per second)
+THRESHOLDS = {
+    "port_scan": 100,          # Distinct destination ports contacted by one source
+    "host_sweep": 100,         # Distinct destinations contacted by one source
+    "packet_flood": 5000,      # Packets per second sent by one source
+    "syn_flood": 500,          # SYNs per second received by one destination
+    "distributed_flood": 500,  # Distinct sources sending to one destination
+    "traffic_spike": 10,       # Times the previous window's rate received by one destination
+}
+SPIKE_MIN_RATE = 100  # Packets per second a destination must receive before a spike counts
+
+# Detection -> (keyed by, measured value, threat level, reason)
+DETECTIONS = {
+    "port_scan": ("src", "ports", "⚠️ High", "Port scan: many destination ports from one source."),
+    "host_sweep": ("src", "hosts", "⚠️ High", "Host sweep: many destinations from one source."),
+    "packet_flood": ("src", "rate", "⚠️ High", "Packet flood from one source."),
+    "syn_flood": ("dst", "syn_rate", "⚠️ Critical", "SYN flood: unanswered connection requests to one destination."),
+    "distributed_flood": ("dst", "sources", "⚠️ Critical", "Distributed flood: many sources sending to one destination."),
+    "traffic_spike": ("dst", "rate_change", "⚠️ Medium", "Traffic spike: rate jumped over the previous window."),
+}
+
+# Distinct counts kept per key: metric -> column of the other endpoint that is counted
+DISTINCT_COLUMNS = {
+    "src": {"ports": "dst_port", "hosts": "dst_addr"},
+    "dst": {"sources": "src_addr"},
+}
+
+
+def _hash_bits(values, bits=DISTINCT_BITS):
+    """Bitmap positions (0..bits-1) of ports or 16-byte addresses, spread by multiplicative hashing."""
+    values = np.ascontiguousarray(values)
+    if values.dtype.kind == "S":
+        halves = values.view(np.uint64).reshape(-1, 2)
+        mixed = halves[:, 0] * np.uint64(0x9E3779B97F4A7C15) ^ halves[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F)
+    else:
+        mixed = values.astype(np.uint64)
+    mixed = mixed * np.uint64(0xFF51AFD7ED558CCD)
+    return (mixed >> np.uint64(64 - int(np.log2(bits)))).astype(np.int64)
+
+
+def _linear_count(bitmaps, bits=DISTINCT_BITS):
+    """Estimate distinct values from OR-ed bitmaps: -m ln(zero bits / m), capped when the bitmap fills."""
+    ones = np.unpackbits(bitmaps.view(np.uint8), axis=1).sum(axis=1)
+    zeros = np.maximum(bits - ones, 1)
+    return bits * np.log(bits / zeros)
+
+
+class WindowTable:
+    """Per-key ring buffers of packet, SYN and distinct-target counts, in array-backed slots."""
+
+    def __init__(self, distinct, ring_buckets, capacity=INITIAL_CAPACITY, max_keys=MAX_KEYS):
+        self.distinct = tuple(distinct)
+        self.ring_buckets = ring_buckets
+        self.max_keys = max_keys
+        self.words = DISTINCT_BITS // 64
+        self.evicted = 0
+
+        self.buckets = np.full((capacity, ring_buckets), -1, dtype=np.int64)  # Bucket number held by each cell
+        self.packets = np.zeros((capacity, ring_buckets), dtype=np.float64)
+        self.syns = np.zeros((capacity, ring_buckets), dtype=np.float64)
+        self.bitmaps = {name: np.zeros((capacity, ring_buckets, self.words), dtype=np.uint64) for name in self.distinct}
+        self.first_bucket = np.zeros(capacity, dtype=np.int64)
+        self.last_bucket = np.zeros(capacity, dtype=np.int64)
+        self.alerting = np.zeros(capacity, dtype=np.uint8)  # Bit per detection currently over threshold
+        self.in_use = np.zeros(capacity, dtype=bool)
+        self._slots = {}  # Address -> slot index
+        self._keys = [None] * capacity  # Slot index -> address
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _grow(self):
+        capacity = len(self.in_use)
+
+        def grown(array, fill=0):
+            bigger = np.full((capacity * 2,) + array.shape[1:], fill, dtype=array.dtype)
+            bigger[:capacity] = array
+            return bigger
+
+        self.buckets = grown(self.buckets, -1)
+        self.packets = grown(self.packets)
+        self.syns = grown(self.syns)
+        self.bitmaps = {name: grown(bitmap) for name, bitmap in self.bitmaps.items()}
+        self.first_bucket = grown(self.first_bucket)
+        self.last_bucket = grown(self.last_bucket)
+        self.alerting = grown(self.alerting)
+        self.in_use = grown(self.in_use)
+        self._keys.extend([None] * capacity)
+        self._free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def _allocate(self, keys, bucket):
+        """Give each new key a free slot with an empty ring; returns the slots."""
+        while len(self._free) < len(keys):
+            self._grow()
+        slots = [self._free.pop() for _ in keys]
+        for key, slot in zip(keys, slots):
+            self._slots[key] = slot
+            self._keys[slot] = key
+        slots = np.array(slots, dtype=np.int64)
+        self.in_use[slots] = True
+        self.buckets[slots] = -1
+        self.first_bucket[slots] = bucket
+        self.alerting[slots] = 0
+        return slots
+
+    def _remove(self, slots):
+        for slot in slots.tolist():
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = None
+            self._free.append(slot)
+        self.in_use[slots] = False
+
+    def key(self, slot):
+        return self._keys[slot]
+
+    def expire(self, bucket):
+        """Drop keys idle for longer than the ring covers, then the least recently seen beyond max_keys."""
+        idle = np.flatnonzero(self.in_use & (self.last_bucket <= bucket - self.ring_buckets))
+        self._remove(idle)
+
+        excess = len(self) - self.max_keys
+        if excess > 0:
+            used = np.flatnonzero(self.in_use)
+            oldest = used[np.argpartition(self.last_bucket[used], excess - 1)[:excess]]
+            self._remove(oldest)
+            self.evicted += excess
+
+    def update(self, bucket, addresses, weights, syn_weights, targets):
+        """Add one bucket's rows (all from the same time bucket); returns the slots they touched."""
+        unique, inverse = np.unique(addresses, return_inverse=True)
+        inverse = inverse.ravel()
+        keys = unique.tolist()
+        slots = np.array([self._slots.get(key, -1) for key in keys], dtype=np.int64)
+        new = np.flatnonzero(slots < 0)
+        if len(new):
+            slots[new] = self._allocate([keys[index] for index in new.tolist()], bucket)
+
+        # Recycle ring cells still holding an older bucket; skip keys whose cell already moved past this one
+        cell = bucket % self.ring_buckets
+        held = self.buckets[slots, cell]
+        stale = slots[held < bucket]
+        self.buckets[stale, cell] = bucket
+        self.packets[stale, cell] = 0
+        self.syns[stale, cell] = 0
+        for bitmap in self.bitmaps.values():
+            bitmap[stale, cell] = 0
+        current = held <= bucket
+        if not current.all():
+            rows = current[inverse]
+            inverse = (np.cumsum(current) - 1)[inverse[rows]]
+            slots, weights, syn_weights = slots[current], weights[rows], syn_weights[rows]
+            targets = {name: values[rows] for name, values in targets.items()}
+
+        self.packets[slots, cell] += np.bincount(inverse, weights=weights, minlength=len(slots))
+        self.syns[slots, cell] += np.bincount(inverse, weights=syn_weights, minlength=len(slots))
+        for name, values in targets.items():
+            positions = _hash_bits(values)
+            words = np.zeros((len(slots), self.words), dtype=np.uint64)
+            np.bitwise_or.at(words, (inverse, positions >> 6), np.uint64(1) << (positions & 63).astype(np.uint64))
+            self.bitmaps[name][slots, cell] |= words
+        self.last_bucket[slots] = np.maximum(self.last_bucket[slots], bucket)
+        return slots
+
+    def measure(self, slots, bucket, window_buckets, bucket_seconds):
+        """Current-window values (rates, distinct counts, rate change) of the given slots at a bucket."""
+        held = self.buckets[slots]
+        current = (held > bucket - window_buckets) & (held <= bucket)
+        previous = (held > bucket - 2 * window_buckets) & (held <= bucket - window_buckets)
+        seconds = window_buckets * bucket_seconds
+
+        packets = self.packets[slots]
+        values = {
+            "packets": (packets * current).sum(axis=1),
+            "rate": (packets * current).sum(axis=1) / seconds,
+            "syn_rate": (self.syns[slots] * current).sum(axis=1) / seconds,
+        }
+        for name, bitmap in self.bitmaps.items():
+            merged = np.bitwise_or.reduce(np.where(current[:, :, None], bitmap[slots], np.uint64(0)), axis=1)
+            values[name] = _linear_count(merged)
+
+        # A rate change only counts once the key has a full previous window to compare with
+        previous_rate = (packets * previous).sum(axis=1) / seconds
+        history = self.first_bucket[slots] <= bucket - window_buckets
+        values["rate_change"] = np.where(history & (values["rate"] >= SPIKE_MIN_RATE),
+                                         values["rate"] / np.maximum(previous_rate, 1.0 / seconds), 0.0)
+        return values
+
+
+class RateAnalyzer:
+    """Sliding-window scan and flood detection over per-source and per-destination ring buffers.
+
+    update() takes columnar packet (or flow) batches in capture order and returns an alert dict
+    the first time a key crosses a threshold; it alerts again only after dropping back below it.
+    """
+
+    def __init__(self, window=WINDOW_SECONDS, bucket_seconds=BUCKET_SECONDS, thresholds=None, max_keys=MAX_KEYS):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = max(int(round(window / bucket_seconds)), 1)
+        self.window = self.window_buckets * bucket_seconds
+        self.thresholds = dict(THRESHOLDS, **(thresholds or {}))
+        ring = 2 * self.window_buckets
+        self.tables = {role: WindowTable(distinct, ring, max_keys=max_keys) for role, distinct in DISTINCT_COLUMNS.items()}
+        self.alerts = 0
+
+    def update(self, batch):
+        """Fold a columnar batch into the windows; returns the alerts it raised."""
+        timestamps = np.asarray(batch["timestamp"], dtype=np.float64)
+        known = np.flatnonzero((timestamps > 0) & (batch["ip_version"] > 0))
+        if not len(known):
+            return []
+
+        # Flow records stand for several packets; their SYN share is all-or-nothing
+        weights = np.asarray(batch["packets"], dtype=np.float64)[known] if "packets" in batch.columns \
+            else np.ones(len(known))
+        flags = np.asarray(batch["tcp_flags"])[known]
+        syn_weights = np.where((flags & TCP_SYN != 0) & (flags & TCP_ACK == 0), weights, 0.0)
+        columns = {name: np.asarray(batch[name])[known] for name in ("src_addr", "dst_addr", "dst_port")}
+        buckets = np.floor(timestamps[known] / self.bucket_seconds).astype(np.int64)
+        if "last_seen" in batch.columns:
+            buckets, flows, share = self._spread(buckets, np.asarray(batch["last_seen"], dtype=np.float64)[known])
+            weights, syn_weights = weights[flows] * share, syn_weights[flows] * share
+            columns = {name: values[flows] for name, values in columns.items()}
+
+        # Walk the batch one time bucket at a time, so bursts inside a long batch are measured on time
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.flatnonzero(np.diff(buckets[order])) + 1
+        alerts = []
+        for rows in np.split(order, bounds):
+            alerts.extend(self._update_bucket(int(buckets[rows[0]]), rows, columns, weights, syn_weights))
+
+        for table in self.tables.values():
+            table.expire(int(buckets.max()))
+        metrics.set_gauge("rate_tracked_keys", len(self.tables["src"]), role="src")
+        metrics.set_gauge("rate_tracked_keys", len(self.tables["dst"]), role="dst")
+        self.alerts += len(alerts)
+        return alerts
+
+    def _spread(self, first_buckets, last_seen):
+        """Spread flow records evenly over the buckets from their first to their last packet.
+
+        Returns (bucket, flow row, share of the flow's packets) per spread row. A flow is counted
+        at its average rate in at most the last ring's worth of its buckets (older ones are out of
+        every window by the time the flow is reported).
+        """
+        last_buckets = np.maximum(np.floor(last_seen / self.bucket_seconds).astype(np.int64), first_buckets)
+        spans = last_buckets - first_buckets + 1
+        kept = np.minimum(spans, 2 * self.window_buckets)
+        rows = np.repeat(np.arange(len(spans)), kept)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(kept) - kept, kept)
+        return np.repeat(last_buckets - kept + 1, kept) + offsets, rows, 1.0 / spans[rows]
+
+    def _update_bucket(self, bucket, rows, columns, weights, syn_weights):
+        alerts = []
+        for role, table in self.tables.items():
+            addresses = columns["src_addr" if role == "src" else "dst_addr"][rows]
+            targets = {}
+            for name, column in DISTINCT_COLUMNS[role].items():
+                values = columns[column][rows]
+                # Unknown ports (-1) are left out of the distinct-port count
+                targets[name] = np.where(values >= 0, values, 0) if values.dtype.kind != "S" else values
+            slots = table.update(bucket, addresses, weights[rows], syn_weights[rows], targets)
+            alerts.extend(self._check(role, table, slots, bucket))
+        return alerts
+
+    def _check(self, role, table, slots, bucket):
+        """Compare the touched keys with the thresholds; alert on the ones that just crossed."""
+        values = table.measure(slots, bucket, self.window_buckets, self.bucket_seconds)
+        alerts = []
+        for bit, (detection, (keyed_by, measured, threat_level, reason)) in enumerate(DETECTIONS.items()):
+            if keyed_by != role:
+                continue
+            over = values[measured] >= self.thresholds[detection]
+            flag = np.uint8(1 << bit)
+            raised = over & (table.alerting[slots] & flag == 0)
+            table.alerting[slots] = np.where(over, table.alerting[slots] | flag, table.alerting[slots] & ~flag)
+
+            for index in np.flatnonzero(raised):
+                address = columnar_store.format_ip(table.key(int(slots[index])))
+                alerts.append({
+                    "src_ip": address if role == "src" else "Multiple",
+                    "dst_ip": address if role == "dst" else "Multiple",
+                    "protocol": "TCP" if detection == "syn_flood" else "Any",
+                    "port": "Multiple",
+                    "threat_level": threat_level,
+                    "reason": reason,
+                    "detection": detection,
+                    "value": round(float(values[measured][index]), 2),
+                    "threshold": self.thresholds[detection],
+                    "window_seconds": self.window,
+                    "window_packets": int(values["packets"][index]),
+                    "window_start": (bucket - self.window_buckets + 1) * self.bucket_seconds,
+                    "window_end": (bucket + 1) * self.bucket_seconds,
+                })
+        return alerts
+
+    def summary(self):
+        return {
+            "window_seconds": self.window,
+            "alerts": self.alerts,
+            "tracked_sources": len(self.tables["src"]),
+            "tracked_destinations": len(self.tables["dst"]),
+            "evicted_keys": sum(table.evicted for table in self.tables.values()),
+        }
+
+
+def analyze_rates(file_path, window=WINDOW_SECONDS, batch_size=columnar_store.FLUSH_ROWS):
+    """Run the sliding-window detections over a capture and print every alert."""
+    analyzer = RateAnalyzer(window)
+    for batch in columnar_store.iter_capture_batches(file_path, batch_size):
+        for alert in analyzer.update(batch):
+            print(f"🚨 {alert['threat_level']} {alert['src_ip']} -> {alert['dst_ip']}: {alert['reason']} "
+                  f"({alert['value']} vs {alert['threshold']} over {alert['window_seconds']:g}s)")
+    print(f"✅ Rate analysis complete: {analyzer.summary()}")
+    return analyzer
+
+
+if __name__ == "__main__":
+    metrics.configure_from_env()
+    parser = argparse.ArgumentParser(description="Sliding-window scan and flood detection.")
+    parser.add_argument("capture", nargs="?", help="capture to analyze (default: latest)")
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="window length in seconds")
+    args = parser.parse_args()
+
+    path = args.capture or packet_io.get_latest_packet_file()
+    if not path:
+        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
+        sys.exit(1)
+    analyze_rates(path, args.window)
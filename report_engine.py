@@ -0,0 +1,182 @@
+import os
+import gzip
+import json
+import datetime
+import numpy as np
+import columnar_store
+
+# Raw per-packet evidence: one JSON finding per line, gzip-compressed as it is written
+EVIDENCE_EXTENSION = ".evidence.jsonl.gz"
+EVIDENCE_COMPRESSLEVEL = 6
+
+# Score histograms cover [0, 1] in equal-width bins
+SCORE_HISTOGRAM_BINS = 10
+
+# Groups itemized per report (most severe first); the rest are only counted in the summary
+MAX_REPORTED_FINDINGS = 1000
+
+# How each per-group statistic combines when the same group shows up again (other details keep their first value)
+MERGE_RULES = {
+    "count": "sum",          # Findings in the group
+    "packets": "sum",        # Packets they cover (more than count for flow records)
+    "first_seen": "min",
+    "last_seen": "max",
+    "max_risk_score": "max",
+    "risk_score_sum": "sum",  # Reported as mean_risk_score
+    "peak_value": "max",      # Highest measured value of a sliding-window alert
+}
+
+
+def group_rows(keys):
+    """Group rows with equal values across the key columns.
+
+    Returns (first row of each group, group number of every row).
+    """
+    dtype = np.dtype([(f"k{index}", np.asarray(column).dtype) for index, column in enumerate(keys)])
+    rows = np.empty(len(keys[0]), dtype=dtype)
+    for index, column in enumerate(keys):
+        rows[f"k{index}"] = column
+    _, first_rows, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return first_rows, inverse.ravel()
+
+
+def group_stats(inverse, group_count, timestamps, packets=None, end_timestamps=None):
+    """Per-group count, packets and first/last timestamps for the rows of one batch."""
+    counts = np.bincount(inverse, minlength=group_count)
+    totals = counts if packets is None else np.bincount(inverse, weights=packets, minlength=group_count)
+
+    first_seen = np.full(group_count, np.inf)
+    np.minimum.at(first_seen, inverse, timestamps)
+    last_seen = np.full(group_count, -np.inf)
+    np.maximum.at(last_seen, inverse, timestamps if end_timestamps is None else end_timestamps)
+
+    return [
+        {"count": int(count), "packets": int(total), "first_seen": float(first), "last_seen": float(last)}
+        for count, total, first, last in zip(counts, totals, first_seen, last_seen)
+    ]
+
+
+def capture_times(capture):
+    """(start, end) timestamp columns of a batch; flow records span first_seen..last_seen."""
+    end = capture["last_seen"] if "last_seen" in capture.columns else capture["timestamp"]
+    return capture["timestamp"], end
+
+
+def capture_packets(capture):
+    """Packets each record stands for (flow records carry their own totals)."""
+    return capture["packets"] if "packets" in capture.columns else None
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime(columnar_store.TIMESTAMP_FORMAT) if timestamp else "Unknown"
+
+
+class FindingGroups:
+    """Findings aggregated by key fields, with counts and first/last seen times, across batches."""
+
+    def __init__(self, key_fields):
+        self.key_fields = tuple(key_fields)
+        self.groups = {}  # key tuple -> statistics and details
+
+    def __len__(self):
+        return len(self.groups)
+
+    def add(self, key, stats):
+        """Merge one group's statistics (see MERGE_RULES) into the totals for its key."""
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = dict(stats)
+            return
+
+        for name, value in stats.items():
+            rule = MERGE_RULES.get(name)
+            if name not in group or rule is None:
+                group.setdefault(name, value)
+            elif rule == "sum":
+                group[name] += value
+            elif rule == "min":
+                group[name] = min(group[name], value)
+            else:
+                group[name] = max(group[name], value)
+
+    def total(self, name="count", where=None):
+        """Sum a statistic over the groups (only those where(group) accepts, if given)."""
+        return sum(group[name] for group in self.groups.values() if where is None or where(group))
+
+    def totals_by(self, field, name="count", where=None):
+        """Sum a statistic per value of one key field (e.g. findings per threat level)."""
+        position = self.key_fields.index(field)
+        totals = {}
+        for key, group in self.groups.items():
+            if where is None or where(group):
+                totals[key[position]] = totals.get(key[position], 0) + group[name]
+        return totals
+
+    def rows(self, rank=None, limit=MAX_REPORTED_FINDINGS):
+        """Report rows, ordered by rank(row) (default: largest groups first), at most limit of them."""
+        rows = [dict(zip(self.key_fields, key), **group) for key, group in self.groups.items()]
+        rows.sort(key=rank or (lambda row: -row["count"]))
+
+        rows = rows[:limit]
+        for row in rows:
+            row["first_seen"] = format_time(row["first_seen"])
+            row["last_seen"] = format_time(row["last_seen"])
+            if "risk_score_sum" in row:
+                row["mean_risk_score"] = round(row.pop("risk_score_sum") / row["count"], 4)
+            if "max_risk_score" in row:
+                row["max_risk_score"] = round(row["max_risk_score"], 4)
+        return rows
+
+    def get_state(self):
+        return [[list(key), group] for key, group in self.groups.items()]
+
+    def set_state(self, state):
+        self.groups = {tuple(key): dict(group) for key, group in state}
+
+
+class EvidenceWriter:
+    """Stream raw per-packet findings to a gzip-compressed JSON Lines file, opened on first write."""
+
+    def __init__(self, directory, prefix):
+        self.directory = directory
+        self.prefix = prefix
+        self.path = None
+        self.written = 0
+        self._file = None
+
+    def write(self, findings):
+        for finding in findings:
+            if self._file is None:
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                self.path = os.path.join(self.directory, f"{self.prefix}_{timestamp}{EVIDENCE_EXTENSION}")
+                self._file = gzip.open(self.path, "wt", encoding="utf-8", compresslevel=EVIDENCE_COMPRESSLEVEL)
+            self._file.write(json.dumps(finding, ensure_ascii=False) + "\n")
+            self.written += 1
+
+    def close(self):
+        """Finish the file; returns its path (None when nothing was written)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.path
+
+
+def read_evidence(path):
+    """Yield the findings stored in an evidence file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def score_histogram(scores, bins=SCORE_HISTOGRAM_BINS):
+    """Counts of scores in equal-width bins over [0, 1]."""
+    return np.histogram(scores, bins=bins, range=(0.0, 1.0))[0]
+
+
+def format_histogram(counts):
+    """Report rows ({"range", "count"}) for score_histogram counts."""
+    edges = np.linspace(0.0, 1.0, len(counts) + 1)
+    return [
+        {"range": f"{low:.1f}-{high:.1f}", "count": int(count)}
+        for low, high, count in zip(edges[:-1], edges[1:], counts)
+    ]
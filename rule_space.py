@@ -0,0 +1,642 @@
+import sys
+import json
+import shlex
+import argparse
+import ipaddress
+import itertools
+import collections
+import numpy as np
+import packet_io
+import backup_restore
+
+# Addresses share one 128-bit space: IPv4 addresses are mapped to ::ffff:a.b.c.d
+IPV4_MAPPED = 0xFFFF << 32
+ANY_ADDRESS = (0, (1 << 128) - 1)
+ANY_PORT = (0, 65535)
+
+# Match fields with a value set (None = Any). They are indexed like ranges: each value the rule set
+# names is a point, and Any spans all of them plus OTHER (values no rule names)
+CATEGORIES = ("profile", "protocol", "program", "service", "in_interface", "out_interface")
+OTHER = "*"
+PROFILE_VALUES = ("Domain", "Private", "Public")  # A closed set: Any needs no OTHER slot
+ANY_WEIGHT = 1 << 20  # Size given to an Any category when ranking Windows rules by breadth
+
+# Range match fields, each a list of closed [low, high] ranges; source and destination follow the packet
+RANGES = ("src_ip", "dst_ip", "src_port", "dst_port")
+DIMENSIONS = CATEGORIES + RANGES
+
+# Boxes per batch of index queries (bounds the memory of the candidate pairs), and boxes per
+# index leaf group that are only sorted, not split further
+QUERY_CHUNK = 1024
+LEAF_BOXES = 8
+
+# Finding kinds, most severe first
+KINDS = {
+    "shadowed": "never matches: an earlier (higher-priority) rule with the opposite action covers all of its traffic",
+    "redundant": "can be removed: an earlier (higher-priority) rule with the same action covers all of its traffic",
+    "conflict": "partly overlaps an earlier rule with the opposite action, which decides the shared traffic",
+}
+
+# Windows keywords (LocalSubnet, DNS, RPC, ...) and the iptables / nft matches below are not modeled;
+# rules using anything else are skipped (and counted) rather than guessed at
+IPTABLES_ACTIONS = {"ACCEPT": "Allow", "DROP": "Block", "REJECT": "Block"}
+IPTABLES_MODULES = {"tcp", "udp", "sctp", "multiport", "comment"}
+IPTABLES_OPTIONS = {
+    "-s": "src_ip", "--source": "src_ip", "-d": "dst_ip", "--destination": "dst_ip",
+    "--sport": "src_port", "--source-port": "src_port", "--sports": "src_port", "--source-ports": "src_port",
+    "--dport": "dst_port", "--destination-port": "dst_port", "--dports": "dst_port", "--destination-ports": "dst_port",
+    "-p": "protocol", "--protocol": "protocol", "-i": "in_interface", "--in-interface": "in_interface",
+    "-o": "out_interface", "--out-interface": "out_interface",
+}
+NFT_ACTIONS = {"accept": "Allow", "drop": "Block", "reject": "Block"}
+NFT_FIELDS = {
+    ("ip", "saddr"): "src_ip", ("ip", "daddr"): "dst_ip", ("ip6", "saddr"): "src_ip", ("ip6", "daddr"): "dst_ip",
+    ("ip", "protocol"): "protocol", ("ip6", "nexthdr"): "protocol", ("meta", "l4proto"): "protocol",
+    ("meta", "iifname"): "in_interface", ("meta", "oifname"): "out_interface",
+}
+NFT_INTERFACES = {"iifname": "in_interface", "iif": "in_interface", "oifname": "out_interface", "oif": "out_interface"}
+PROTOCOL_ALIASES = {"ICMPV4": "ICMP", "IPV6-ICMP": "ICMPv6", "ICMPV6": "ICMPv6", "ALL": None, "ANY": None, "0": None}
+
+
+class BoxIndex:
+    """Static bounding-box tree (a packed R-tree) over rule boxes, queried in NumPy batches.
+
+    Boxes are grouped by which dimensions they leave open and split k-d style, so each node's
+    bounds stay tight; nodes also keep the earliest precedence below them.
+    A batch of queries walks the tree one level at a time, keeping only nodes that can hold an
+    earlier box overlapping (or containing) the query, so K matches cost about O((n + K) log n).
+    """
+
+    def __init__(self, boxes, lows, highs, precedence):
+        # An empty index (e.g. no Block rules at all) has no tree and answers every query with no pairs
+        self.levels = []
+        if not len(boxes):
+            self.boxes = np.zeros(0, dtype=np.int64)
+            return
+
+        layout = self._pack(lows[boxes], highs[boxes])
+        size = 1 << max(len(layout) - 1, 0).bit_length()
+        self.boxes = np.full(size, -1, dtype=np.int64)
+        self.boxes[:len(layout)] = np.where(layout >= 0, boxes[layout], -1)
+        present = self.boxes >= 0
+        leaf_lows = np.full((size, lows.shape[1]), np.iinfo(np.int64).max)
+        leaf_highs = np.full((size, lows.shape[1]), np.iinfo(np.int64).min)
+        leaf_first = np.full(size, np.iinfo(np.int64).max)
+        leaf_lows[present] = lows[self.boxes[present]]
+        leaf_highs[present] = highs[self.boxes[present]]
+        leaf_first[present] = precedence[self.boxes[present]]
+
+        # Root first; padding leaves match nothing
+        self.levels = [(leaf_lows, leaf_highs, leaf_first)]
+        while len(self.levels[0][2]) > 1:
+            level_lows, level_highs, level_first = self.levels[0]
+            self.levels.insert(0, (np.minimum(level_lows[0::2], level_lows[1::2]),
+                                   np.maximum(level_highs[0::2], level_highs[1::2]),
+                                   np.minimum(level_first[0::2], level_first[1::2])))
+
+    @staticmethod
+    def _pack(lows, highs):
+        """Leaf order of the boxes (-1 for padding).
+
+        Each group of boxes open in the same dimensions fills its own subtree (largest first, so every
+        subtree starts on a node boundary), halved k-d style along the dimension where the box
+        centers spread most.
+        """
+        extents = np.maximum(highs.max(axis=0) - lows.min(axis=0), 1) if len(lows) else 1
+        centers = (lows + highs) / 2 / extents
+        open_dimensions = (lows == lows.min(axis=0)) & (highs == highs.max(axis=0))
+        signatures = open_dimensions @ (1 << np.arange(lows.shape[1], dtype=np.int64))
+        groups = sorted((np.flatnonzero(signatures == signature) for signature in np.unique(signatures)), key=len, reverse=True)
+        layout = [BoxIndex._split(group, centers, 1 << (len(group) - 1).bit_length()) for group in groups]
+        return np.concatenate(layout) if layout else np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _split(boxes, centers, capacity):
+        """Leaf order of a subtree of `capacity` leaves holding the given boxes."""
+        dimension = int(np.argmax(np.ptp(centers[boxes], axis=0))) if len(boxes) > 1 else 0
+        boxes = boxes[np.argsort(centers[boxes, dimension], kind="stable")]
+        if capacity <= LEAF_BOXES or len(boxes) <= 1:
+            return np.concatenate([boxes, np.full(capacity - len(boxes), -1, dtype=np.int64)])
+        half = capacity // 2
+        return np.concatenate([BoxIndex._split(boxes[:half], centers, half), BoxIndex._split(boxes[half:], centers, half)])
+
+    def query(self, lows, highs, precedence, contain=False):
+        """(query, box) pairs of every query box and earlier indexed box overlapping it (or containing it)."""
+        queries = np.arange(len(lows))
+        nodes = np.zeros(len(lows), dtype=np.int64)
+        if not self.levels:
+            return queries[:0], self.boxes[:0]
+        for depth, (node_lows, node_highs, node_first) in enumerate(self.levels):
+            if depth:
+                queries = np.repeat(queries, 2)
+                nodes = (nodes[:, None] * 2 + np.arange(2)).ravel()
+            if contain:
+                inside = (node_lows[nodes] <= lows[queries]) & (node_highs[nodes] >= highs[queries])
+            else:
+                inside = (node_lows[nodes] <= highs[queries]) & (node_highs[nodes] >= lows[queries])
+            keep = (node_first[nodes] < precedence[queries]) & np.all(inside, axis=1)
+            queries, nodes = queries[keep], nodes[keep]
+        return queries, self.boxes[nodes]
+
+
+def _merge(ranges):
+    """Sorted, non-overlapping ranges covering the same values."""
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def _is_any(value):
+    return value is None or str(value).strip().lower() in ("", "any", "*")
+
+
+def _values(value):
+    """A JSON field as a list of strings (PowerShell writes one value as a scalar)."""
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [item.strip() for item in str(value).split(",")]
+
+
+def _address(text):
+    address = ipaddress.ip_address(text)
+    return int(address) + IPV4_MAPPED if address.version == 4 else int(address)
+
+
+def address_ranges(value):
+    """Addresses, networks (CIDR or netmask) and first-last ranges as closed integer ranges."""
+    if _is_any(value):
+        return [ANY_ADDRESS]
+    ranges = []
+    for item in _values(value):
+        try:
+            if "-" in item:
+                first, last = item.split("-", 1)
+                ranges.append((_address(first), _address(last)))
+            else:
+                network = ipaddress.ip_network(item, strict=False)
+                ranges.append((_address(str(network.network_address)), _address(str(network.broadcast_address))))
+        except ValueError:
+            raise ValueError(f"unsupported address {item!r}")
+    return _merge(ranges)
+
+
+def port_ranges(value):
+    """Ports and ranges ("80", "8000-8080", iptables "8000:8080", ":1024") as closed integer ranges."""
+    if _is_any(value):
+        return [ANY_PORT]
+    ranges = []
+    for item in _values(value):
+        low, separator, high = item.replace(":", "-").partition("-")
+        if not (low or high) or not all(part.isdigit() for part in (low, high) if part):
+            raise ValueError(f"unsupported port {item!r}")
+        low = int(low) if low else ANY_PORT[0]
+        high = (int(high) if high else ANY_PORT[1]) if separator else low
+        ranges.append((low, high))
+    return _merge(ranges)
+
+
+def protocol_name(value):
+    """Protocol as TCP / UDP / ICMP / ICMPv6 / number text (None for Any)."""
+    if _is_any(value):
+        return None
+    text = str(value).strip().upper()
+    if text in PROTOCOL_ALIASES:
+        return PROTOCOL_ALIASES[text]
+    if text.isdigit():
+        return packet_io.PROTOCOL_NAMES.get(int(text), text)
+    return packet_io.PROTOCOL_NAMES.get(packet_io.PROTOCOL_NUMBERS.get(text), text)
+
+
+def _rule(name, chain, position, action, first_match, text, **fields):
+    """A rule in match-space form: categories as value tuples (None = Any), ranges as range lists."""
+    rule = {"name": name, "chain": chain, "position": position, "action": action, "first_match": first_match, "text": text}
+    for category in CATEGORIES:
+        values = fields.get(category)
+        rule[category] = None if values is None else tuple(sorted(set(values)))
+    rule["src_ip"] = fields.get("src_ip") or [ANY_ADDRESS]
+    rule["dst_ip"] = fields.get("dst_ip") or [ANY_ADDRESS]
+    rule["src_port"] = fields.get("src_port") or [ANY_PORT]
+    rule["dst_port"] = fields.get("dst_port") or [ANY_PORT]
+    return rule
+
+
+def from_windows(rules):
+    """Match-space rules from Windows rule dicts (get_firewall_rules.py); returns (rules, skipped).
+
+    Windows applies block rules before allow rules whatever their order; disabled rules are left out.
+    """
+    parsed, skipped = [], []
+    for position, rule in enumerate(rules):
+        normalized = backup_restore.normalize_rule(rule)
+        name = backup_restore.rule_key(normalized)
+        if not normalized["Enabled"]:
+            continue
+        text = (f"{normalized['Direction']} {normalized['Action']} {normalized['Profile']} "
+                + " ".join(f"{field}={normalized[field]}" for field in backup_restore.MATCH_FIELDS if field in normalized))
+        try:
+            if normalized["Action"] not in ("Allow", "Block"):
+                raise ValueError(f"unsupported action {normalized['Action']!r}")
+            local = (address_ranges(normalized.get("LocalAddress")), port_ranges(normalized.get("LocalPort")))
+            remote = (address_ranges(normalized.get("RemoteAddress")), port_ranges(normalized.get("RemotePort")))
+        except ValueError as e:
+            skipped.append({"rule": name, "text": text, "reason": str(e)})
+            continue
+
+        source, destination = (remote, local) if normalized["Direction"] == "Inbound" else (local, remote)
+        profile, protocol = normalized["Profile"], protocol_name(normalized.get("Protocol"))
+        program, service = normalized.get("Program"), normalized.get("Service")
+        parsed.append(_rule(
+            name, normalized["Direction"], position, normalized["Action"], False, text.strip(),
+            profile=None if _is_any(profile) else _values(profile),
+            protocol=None if protocol is None else [protocol],
+            program=None if _is_any(program) else [str(program).lower()],
+            service=None if _is_any(service) else [str(service).lower()],
+            src_ip=source[0], src_port=source[1], dst_ip=destination[0], dst_port=destination[1],
+        ))
+    return parsed, skipped
+
+
+def _iptables_fields(words):
+    """(fields, action, comment) of one iptables-save rule's arguments; raises ValueError for unmodeled matches."""
+    fields, comment, index = {}, None, 0
+    while index < len(words):
+        word = words[index]
+        if word == "!":
+            raise ValueError("negated match")
+        if index + 1 >= len(words):
+            raise ValueError(f"option {word} without a value")
+        value = words[index + 1]
+        index += 2
+        if word in ("-m", "--match"):
+            if value not in IPTABLES_MODULES:
+                raise ValueError(f"unsupported match module {value!r}")
+        elif word == "--comment":
+            comment = value
+        elif word in ("-j", "--jump"):
+            if value not in IPTABLES_ACTIONS:
+                raise ValueError(f"non-terminal target {value!r}")
+            return fields, IPTABLES_ACTIONS[value], comment  # Anything after is a target option
+        elif word in IPTABLES_OPTIONS:
+            field = IPTABLES_OPTIONS[word]
+            if field in ("src_ip", "dst_ip"):
+                fields[field] = address_ranges(value)
+            elif field in ("src_port", "dst_port"):
+                fields[field] = port_ranges(value)
+            elif field == "protocol":
+                fields[field] = None if protocol_name(value) is None else [protocol_name(value)]
+            elif value.endswith("+"):
+                raise ValueError(f"wildcard interface {value!r}")
+            else:
+                fields[field] = [value]
+        else:
+            raise ValueError(f"unsupported option {word}")
+    raise ValueError("no terminal target")
+
+
+def parse_iptables_save(text):
+    """Match-space rules from `iptables-save` / `ip6tables-save` output (filter table); returns (rules, skipped)."""
+    parsed, skipped = [], []
+    table = None
+    positions = collections.Counter()
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("*"):
+            table = line[1:]
+        if table != "filter" or not line.startswith("-A "):
+            continue
+        words = shlex.split(line)
+        chain = words[1]
+        positions[chain] += 1
+        name = f"{chain} #{positions[chain]}"
+        try:
+            fields, action, comment = _iptables_fields(words[2:])
+        except ValueError as e:
+            skipped.append({"rule": name, "text": line, "reason": str(e)})
+            continue
+        parsed.append(_rule(f"{name} ({comment})" if comment else name, chain, positions[chain], action, True, line, **fields))
+    return parsed, skipped
+
+
+def _nft_words(line):
+    line = line.split(" # ", 1)[0]  # `nft -a` appends "# handle N"
+    for mark in "{},":
+        line = line.replace(mark, f" {mark} ")
+    return shlex.split(line)
+
+
+def _nft_value(words, index):
+    """Values of an nft expression starting at words[index] (a set or a single value) and the next index."""
+    if index >= len(words):
+        raise ValueError("expression without a value")
+    if words[index] == "!=":
+        raise ValueError("negated match")
+    if words[index] != "{":
+        return [words[index]], index + 1
+    end = words.index("}", index)
+    return [word for word in words[index + 1:end] if word != ","], end + 1
+
+
+def _nft_fields(words):
+    """(fields, action, comment) of one nft rule; raises ValueError for unmodeled statements."""
+    fields, comment, index = {}, None, 0
+    while index < len(words):
+        word = words[index]
+        following = words[index + 1] if index + 1 < len(words) else None
+        if word in NFT_ACTIONS:
+            return fields, NFT_ACTIONS[word], comment  # The rest is verdict options (reject with ...)
+        if word == "counter":
+            index += 1
+            while index + 1 < len(words) and words[index] in ("packets", "bytes"):
+                index += 2
+        elif word == "comment":
+            values, index = _nft_value(words, index + 1)
+            comment = values[0]
+        elif word in NFT_INTERFACES:
+            values, index = _nft_value(words, index + 1)
+            fields[NFT_INTERFACES[word]] = values
+        elif word in ("tcp", "udp", "sctp") and following in ("sport", "dport"):
+            values, index = _nft_value(words, index + 2)
+            fields["src_port" if following == "sport" else "dst_port"] = port_ranges(values)
+            fields["protocol"] = [protocol_name(word)]
+        elif (word, following) in NFT_FIELDS:
+            values, index = _nft_value(words, index + 2)
+            field = NFT_FIELDS[(word, following)]
+            if field in ("src_ip", "dst_ip"):
+                fields[field] = address_ranges(values)
+            elif field == "protocol":
+                fields[field] = [protocol_name(value) for value in values]
+            else:
+                fields[field] = values
+        else:
+            raise ValueError(f"unsupported statement {' '.join(words[index:index + 2])!r}")
+    raise ValueError("no verdict")
+
+
+def parse_nft(text):
+    """Match-space rules from `nft list ruleset` output (filter chains); returns (rules, skipped)."""
+    parsed, skipped = [], []
+    table = chain = None
+    chain_type = "filter"
+    skip_depth = 0  # Inside a set / map / flowtable definition
+    positions = collections.Counter()
+    for line in text.splitlines():
+        words = _nft_words(line.strip())
+        if not words:
+            continue
+        if skip_depth:
+            skip_depth += words.count("{") - words.count("}")
+        elif words[0] == "table":
+            table = " ".join(words[1:words.index("{")])
+        elif words[0] == "chain":
+            chain, chain_type = words[1], "filter"
+        elif words[0] in ("set", "map", "flowtable", "counter", "quota", "ct", "limit") and words[-1] == "{":
+            skip_depth = 1
+        elif words[0] == "type" and chain:
+            chain_type = words[1]
+        elif words[0] == "policy" or words[0] == "flags":
+            continue
+        elif words == ["}"]:
+            if chain:
+                chain = None
+            else:
+                table = None
+        elif chain and chain_type == "filter":
+            key = f"{table} {chain}"
+            positions[key] += 1
+            name = f"{key} #{positions[key]}"
+            try:
+                fields, action, comment = _nft_fields(words)
+            except ValueError as e:
+                skipped.append({"rule": name, "text": line.strip(), "reason": str(e)})
+                continue
+            parsed.append(_rule(f"{name} ({comment})" if comment else name, key, positions[key], action, True,
+                                line.strip(), **fields))
+    return parsed, skipped
+
+
+def detect_format(text):
+    """"windows" (JSON), "iptables" (iptables-save) or "nft" (nft list ruleset) for a rules file's text."""
+    stripped = text.lstrip()
+    if stripped.startswith(("[", "{")):
+        return "windows"
+    if any(line.startswith(("*filter", "-A ", ":INPUT")) for line in stripped.splitlines()):
+        return "iptables"
+    if stripped.startswith("table ") or "\ntable " in stripped:
+        return "nft"
+    raise ValueError("unrecognized rules format (expected Windows rule JSON, iptables-save or nft output)")
+
+
+def parse_rules(text, rule_format=None):
+    """Match-space rules from a rules file's text; returns (rules, skipped)."""
+    rule_format = rule_format or detect_format(text)
+    if rule_format == "windows":
+        rules = json.loads(text)
+        return from_windows(rules if isinstance(rules, list) else [rules])
+    if rule_format == "iptables":
+        return parse_iptables_save(text)
+    return parse_nft(text)
+
+
+def _universes(rules):
+    """Ordered values of each category (Any spans the whole list)."""
+    universes = {}
+    for category in CATEGORIES:
+        named = sorted({value for rule in rules for value in rule[category] or ()})
+        if category == "profile":
+            universes[category] = list(PROFILE_VALUES) + [value for value in named if value not in PROFILE_VALUES]
+        else:
+            universes[category] = named + [OTHER]
+    return universes
+
+
+def _breadth(rule):
+    """How much traffic a rule matches; a strict superset of another rule is always broader."""
+    breadth = 1
+    for category in CATEGORIES:
+        breadth *= ANY_WEIGHT if rule[category] is None else len(rule[category])
+    for dimension in RANGES:
+        breadth *= sum(high - low + 1 for low, high in rule[dimension])
+    return breadth
+
+
+def _precedence(rules):
+    """Global evaluation order: chains keep their own order, and within one the rule that decides first comes first.
+
+    First-match chains (iptables, nft) go by position. Windows applies block rules before allow rules,
+    in no particular order; among rules of one action, broader rules count as earlier, so a rule
+    covering another is always found before it.
+    """
+    def key(index):
+        rule = rules[index]
+        if rule["first_match"]:
+            return rule["chain"], rule["position"]
+        return rule["chain"], rule["action"] != "Block", -_breadth(rule), rule["position"]
+
+    precedence = np.empty(len(rules), dtype=np.int64)
+    precedence[sorted(range(len(rules)), key=key)] = np.arange(len(rules))
+    return precedence
+
+
+def build_boxes(rules):
+    """Every rule as boxes (one per combination of its ranges) in integer coordinates.
+
+    Returns (box rule numbers, low corners, high corners); the first coordinate is the rule's chain.
+    Category values become their position in the category's universe, and addresses their rank
+    among all range ends. A rule's boxes are consecutive.
+    """
+    universes = _universes(rules)
+    positions = {category: {value: index for index, value in enumerate(values)} for category, values in universes.items()}
+    address_ends = sorted({end for rule in rules for dimension in ("src_ip", "dst_ip")
+                           for bounds in rule[dimension] for end in bounds})
+    address_rank = {address: rank for rank, address in enumerate(address_ends)}
+    chains = {}
+
+    box_rules, lows, highs = [], [], []
+    for number, rule in enumerate(rules):
+        chain = chains.setdefault(rule["chain"], len(chains))
+        dimensions = [[(chain, chain)]]
+        for category in CATEGORIES:
+            if rule[category] is None:
+                dimensions.append([(0, len(universes[category]) - 1)])
+            else:
+                dimensions.append(_merge((positions[category][value],) * 2 for value in rule[category]))
+        for dimension in ("src_ip", "dst_ip"):
+            dimensions.append([(address_rank[low], address_rank[high]) for low, high in rule[dimension]])
+        dimensions += [rule["src_port"], rule["dst_port"]]
+
+        for box in itertools.product(*dimensions):
+            box_rules.append(number)
+            lows.append([low for low, _ in box])
+            highs.append([high for _, high in box])
+
+    shape = (len(box_rules), len(DIMENSIONS) + 1)
+    return (np.array(box_rules, dtype=np.int64), np.array(lows, dtype=np.int64).reshape(shape),
+            np.array(highs, dtype=np.int64).reshape(shape))
+
+
+def _covering(rules, boxes, box_rules, rule_boxes):
+    """(covering rule, covered rule) pairs from (rule, box inside it) pairs: every box of the covered rule is inside."""
+    count, total = len(rule_boxes), len(box_rules)
+    rules, boxes = np.divmod(np.unique(rules * total + boxes), total)
+    pairs, inside = np.unique(rules * count + box_rules[boxes], return_counts=True)
+    return np.divmod(pairs[inside == rule_boxes[pairs % count]], count)
+
+
+def _chunks(box_rules, size=QUERY_CHUNK):
+    """Box ranges of about `size` boxes that never split a rule's boxes."""
+    starts = np.flatnonzero(np.r_[True, box_rules[1:] != box_rules[:-1]])
+    start = 0
+    while start < len(box_rules):
+        stop = starts[np.searchsorted(starts, start + size)] if start + size < starts[-1] else len(box_rules)
+        yield start, max(stop, start + 1)
+        start = max(stop, start + 1)
+
+
+def find_interactions(rules):
+    """Shadowed, redundant and conflicting rules, each reported once with one rule involved.
+
+    A covered rule names the earliest rule covering it; a conflicting rule names the nearest
+    earlier rule it conflicts with (the earliest is usually a catch-all such as a loopback accept).
+    The cost grows with the number of covering and conflicting rule pairs rather than with n².
+    Coverage by one earlier rule is detected, not coverage by several together.
+    """
+    if not rules:
+        return []
+    count = len(rules)
+    precedence = _precedence(rules)
+    blocks = np.array([rule["action"] == "Block" for rule in rules])
+    box_rules, lows, highs = build_boxes(rules)
+    rule_boxes = np.bincount(box_rules, minlength=count)
+    box_precedence = precedence[box_rules]
+    box_blocks = blocks[box_rules]
+    indexes = {block: BoxIndex(np.flatnonzero(box_blocks == block), lows, highs, box_precedence) for block in (False, True)}
+
+    # Of rules with identical boxes and action only the earliest can be the earliest to cover a rule,
+    # so coverage is looked up among those (large rule sets repeat catch-all rules a lot)
+    starts = np.r_[0, np.cumsum(rule_boxes)]
+    earliest = {}
+    for rule in np.argsort(precedence).tolist():
+        shape = (blocks[rule], lows[starts[rule]:starts[rule + 1]].tobytes(), highs[starts[rule]:starts[rule + 1]].tobytes())
+        earliest.setdefault(shape, rule)
+    distinct = np.zeros(count, dtype=bool)
+    distinct[list(earliest.values())] = True
+    cover_indexes = [BoxIndex(np.flatnonzero((box_blocks == block) & distinct[box_rules]), lows, highs, box_precedence)
+                     for block in (False, True)]
+
+    covered_by, nearest_conflict, conflict_counts = {}, {}, {}
+    for start, stop in _chunks(box_rules):
+        chunk = slice(start, stop)
+        chunk_lows, chunk_highs, chunk_precedence = lows[chunk], highs[chunk], box_precedence[chunk]
+
+        # Rules covered by an earlier rule: shadowed when its action differs, redundant otherwise
+        found = [index.query(chunk_lows, chunk_highs, chunk_precedence, contain=True) for index in cover_indexes]
+        queries = np.concatenate([pairs[0] for pairs in found]) + start
+        coverer, covered = _covering(box_rules[np.concatenate([pairs[1] for pairs in found])], queries, box_rules, rule_boxes)
+        for rule, other in zip(covered.tolist(), coverer.tolist()):
+            if rule not in covered_by or precedence[other] < precedence[covered_by[rule]]:
+                covered_by[rule] = other
+
+        # Overlaps with earlier rules of the opposite action, unless one of the two rules covers the other
+        # (covered rules already have their finding)
+        uncovered = ~np.isin(box_rules[chunk], covered)
+        later, earlier = [], []
+        for block, index in indexes.items():
+            selected = np.flatnonzero((box_blocks[chunk] != block) & uncovered)
+            queries, boxes = index.query(chunk_lows[selected], chunk_highs[selected], chunk_precedence[selected])
+            later.append(selected[queries] + start)
+            earlier.append(boxes)
+        later, earlier = np.concatenate(later), np.concatenate(earlier)
+        around = np.all((lows[later] <= lows[earlier]) & (highs[earlier] <= highs[later]), axis=1)
+        broader, narrower = _covering(box_rules[later][around], earlier[around], box_rules, rule_boxes)
+        pairs = np.unique(box_rules[earlier] * count + box_rules[later])
+        pairs = pairs[~np.isin(pairs, np.concatenate([narrower * count + broader, coverer * count + covered]))]
+        others, conflicting = np.divmod(pairs, count)
+
+        # Per rule: how many rules it conflicts with, and the nearest one (highest earlier precedence)
+        order = np.lexsort((precedence[others], conflicting))
+        others, conflicting = others[order], conflicting[order]
+        last = np.flatnonzero(np.r_[conflicting[1:] != conflicting[:-1], len(conflicting) > 0])
+        counts = np.diff(np.r_[-1, last])
+        for rule, other, total in zip(conflicting[last].tolist(), others[last].tolist(), counts.tolist()):
+            nearest_conflict[rule], conflict_counts[rule] = other, total
+
+    findings = []
+    for rule, other in covered_by.items():
+        kind = "shadowed" if blocks[rule] != blocks[other] else "redundant"
+        findings.append(_finding(kind, rules[rule], rules[other]))
+    for rule, other in nearest_conflict.items():
+        findings.append(_finding("conflict", rules[rule], rules[other], conflicting_rules=conflict_counts[rule]))
+    findings.sort(key=lambda finding: (list(KINDS).index(finding["kind"]), finding["chain"], finding["position"]))
+    return findings
+
+
+def _finding(kind, rule, other, **details):
+    return {
+        "kind": kind, "chain": rule["chain"], "rule": rule["name"], "position": rule["position"], "action": rule["action"],
+        "match": rule["text"], "earlier_rule": other["name"], "earlier_position": other["position"],
+        "earlier_action": other["action"], "earlier_match": other["text"], "reason": KINDS[kind], **details,
+    }
+
+
+def summarize(findings):
+    counts = collections.Counter(finding["kind"] for finding in findings)
+    return {kind: counts.get(kind, 0) for kind in KINDS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find shadowed, redundant and conflicting firewall rules.")
+    parser.add_argument("file", help="Windows rule JSON, iptables-save or nft list ruleset output ('-' for stdin)")
+    parser.add_argument("--format", choices=["windows", "iptables", "nft"], help="input format (default: detected)")
+    args = parser.parse_args()
+
+    text = sys.stdin.read() if args.file == "-" else open(args.file, "r").read()
+    rules, skipped = parse_rules(text, args.format)
+    findings = find_interactions(rules)
+    for finding in findings:
+        print(f"{finding['kind']:<9} {finding['rule']}: {finding['match']}")
+        print(f"          by {finding['earlier_rule']}: {finding['earlier_match']}")
+    print(f"✅ {len(rules)} rules analyzed, {len(skipped)} skipped: {summarize(findings)}")
@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import functools
+import contextlib
+import numpy as np
+import backup_restore
+
+# Every firewall snapshot and backup lives in one content-addressed store
+STORE_DIR = "logs/firewall_store"
+INDEX_FILE = "index.sqlite"
+PACK_DIR = "packs"
+SQLITE_TIMEOUT = 30
+
+# Rules are identified by the first DIGEST_BYTES of the SHA-256 of their canonical JSON
+DIGEST_BYTES = 16
+COMPRESS_LEVEL = 6
+QUERY_CHUNK = 900  # Digests per "IN (...)" lookup (SQLite parameter limit)
+
+# Snapshot kinds: rule sets read from the firewall, and backups chosen for restore
+SNAPSHOT = "snapshot"
+BACKUP = "backup"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,      -- Seconds since the epoch
+    kind TEXT NOT NULL,         -- snapshot or backup
+    source TEXT,                -- Where the rules came from (command, imported file, backup of #id)
+    rule_count INTEGER NOT NULL,
+    manifest BLOB NOT NULL      -- manifests.hash
+);
+CREATE INDEX IF NOT EXISTS snapshots_kind ON snapshots (kind, created);
+CREATE TABLE IF NOT EXISTS manifests (
+    hash BLOB PRIMARY KEY,      -- Digest of the manifest itself (identical rule sets share it)
+    digests BLOB NOT NULL       -- zlib-compressed rule digests, in rule order
+);
+CREATE TABLE IF NOT EXISTS rules (
+    hash BLOB PRIMARY KEY,
+    pack INTEGER NOT NULL,      -- Pack file holding the rule
+    line INTEGER NOT NULL       -- Line of the rule inside the pack
+);
+CREATE TABLE IF NOT EXISTS packs (id INTEGER PRIMARY KEY, rules INTEGER, bytes INTEGER);
+CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY, mtime REAL, snapshot INTEGER);
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+@contextlib.contextmanager
+def connect(directory=STORE_DIR):
+    """Open (creating if needed) the store index; commits when the block succeeds."""
+    os.makedirs(os.path.join(directory, PACK_DIR), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(directory, INDEX_FILE), timeout=SQLITE_TIMEOUT)
+    try:
+        connection.executescript(SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def canonical_rule(rule):
+    """Normalized rule as compact JSON with sorted keys (the bytes that are hashed and stored)."""
+    rule = {name: value for name, value in backup_restore.normalize_rule(rule).items() if name != "handle"}
+    return json.dumps(rule, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def rule_digest(encoded):
+    return hashlib.sha256(encoded).digest()[:DIGEST_BYTES]
+
+
+def _pack_path(directory, pack):
+    return os.path.join(directory, PACK_DIR, f"pack_{pack:06d}.zz")
+
+
+@functools.lru_cache(maxsize=64)
+def _read_pack(path):
+    """Rules stored in one pack file, in line order (packs never change once written)."""
+    with open(path, "rb") as f:
+        return zlib.decompress(f.read()).split(b"\n")
+
+
+def _digest_array(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=f"S{DIGEST_BYTES}")
+
+
+def save_snapshot(rules, source=None, kind=SNAPSHOT, created=None, directory=STORE_DIR):
+    """Store a rule set; only rules never seen before are written (to one new pack). Returns the snapshot id."""
+    encoded = [canonical_rule(rule) for rule in rules]
+    digests = [rule_digest(line) for line in encoded]
+    manifest = b"".join(digests)
+    manifest_hash = hashlib.sha256(manifest).digest()[:DIGEST_BYTES]
+
+    with connect(directory) as connection:
+        known = set()
+        unique = list(dict.fromkeys(digests))
+        for start in range(0, len(unique), QUERY_CHUNK):
+            chunk = unique[start:start + QUERY_CHUNK]
+            known.update(row[0] for row in connection.execute(
+                f"SELECT hash FROM rules WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+
+        new = {digest: line for digest, line in zip(digests, encoded) if digest not in known}
+        if new:
+            pack = connection.execute("INSERT INTO packs (rules, bytes) VALUES (?, 0)", (len(new),)).lastrowid
+            data = zlib.compress(b"\n".join(new.values()), COMPRESS_LEVEL)
+            path = _pack_path(directory, pack)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            connection.execute("UPDATE packs SET bytes = ? WHERE id = ?", (len(data), pack))
+            connection.executemany("INSERT INTO rules VALUES (?, ?, ?)",
+                                   [(digest, pack, line) for line, digest in enumerate(new)])
+
+        connection.execute("INSERT OR IGNORE INTO manifests VALUES (?, ?)",
+                           (manifest_hash, zlib.compress(manifest, COMPRESS_LEVEL)))
+        return connection.execute(
+            "INSERT INTO snapshots (created, kind, source, rule_count, manifest) VALUES (?, ?, ?, ?, ?)",
+            (created or datetime.datetime.now().timestamp(), kind, source, len(rules), manifest_hash),
+        ).lastrowid
+
+
+def list_snapshots(kind=None, limit=None, directory=STORE_DIR):
+    """Snapshot rows (id, created, kind, source, rule_count), newest first, straight from the index."""
+    with connect(directory) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(
+            "SELECT id, created, kind, source, rule_count FROM snapshots WHERE (:kind IS NULL OR kind = :kind)"
+            " ORDER BY created DESC, id DESC LIMIT :limit",
+            {"kind": kind, "limit": -1 if limit is None else limit},
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def latest_snapshot(kind=None, directory=STORE_DIR):
+    rows = list_snapshots(kind, 1, directory)
+    return rows[0] if rows else None
+
+
+def _manifest(connection, snapshot_id):
+    row = connection.execute(
+        "SELECT digests FROM snapshots JOIN manifests ON manifests.hash = snapshots.manifest WHERE snapshots.id = ?",
+        (snapshot_id,),
+    ).fetchone()
+    if row is None:
+        raise KeyError(f"No firewall snapshot #{snapshot_id}")
+    return _digest_array(row[0])
+
+
+def _load_rules(connection, directory, digests):
+    """Rules for the given digests, in the same order (decompressing each pack once)."""
+    # NumPy drops trailing zero bytes from fixed-width byte strings; pad them back
+    digests = [digest.ljust(DIGEST_BYTES, b"\x00") for digest in digests.tolist()]
+    locations = {}
+    unique = list(dict.fromkeys(digests))
+    for start in range(0, len(unique), QUERY_CHUNK):
+        chunk = unique[start:start + QUERY_CHUNK]
+        for digest, pack, line in connection.execute(
+                f"SELECT hash, pack, line FROM rules WHERE hash IN ({','.join('?' * len(chunk))})", chunk):
+            locations[digest] = (pack, line)
+
+    return [json.loads(_read_pack(_pack_path(directory, pack))[line])
+            for pack, line in (locations[digest] for digest in digests)]
+
+
+def load_snapshot(snapshot_id, directory=STORE_DIR):
+    """The rules of a snapshot, in their original order."""
+    with connect(directory) as connection:
+        return _load_rules(connection, directory, _manifest(connection, snapshot_id))
+
+
+def diff_snapshots(old_id, new_id, directory=STORE_DIR):
+    """RuleDiff from one snapshot to another; only rules whose digest differs are loaded."""
+    with connect(directory) as connection:
+        old, new = _manifest(connection, old_id), _manifest(connection, new_id)
+        removed = np.setdiff1d(old, new)
+        added = np.setdiff1d(new, old)
+        return backup_restore.compute_diff(_load_rules(connection, directory, removed),
+                                           _load_rules(connection, directory, added), prune=True)
+
+
+def mark_backup(snapshot_id, directory=STORE_DIR):
+    """Keep a snapshot as a backup: a new index entry sharing its manifest (nothing is copied)."""
+    with connect(directory) as connection:
+        cursor = connection.execute(
+            "INSERT INTO snapshots (created, kind, source, rule_count, manifest)"
+            " SELECT ?, ?, 'backup of #' || id, rule_count, manifest FROM snapshots WHERE id = ?",
+            (datetime.datetime.now().timestamp(), BACKUP, snapshot_id),
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(f"No firewall snapshot #{snapshot_id}")
+        return cursor.lastrowid
+
+
+def import_directory(directory, kind=SNAPSHOT, store=STORE_DIR):
+    """Add JSON rule files (e.g. saved by older versions) to the store once each; returns how many were added.
+
+    Only runs when the directory changed since the last import.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    directory_mtime = str(os.stat(directory).st_mtime_ns)
+    meta_key = f"imported:{os.path.abspath(directory)}"
+    with connect(store) as connection:
+        synced = connection.execute("SELECT value FROM store_meta WHERE key = ?", (meta_key,)).fetchone()
+        if synced and synced[0] == directory_mtime:
+            return 0
+        imported = {path: mtime for path, mtime in connection.execute("SELECT path, mtime FROM imports")}
+
+    added = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(".json") or imported.get(os.path.abspath(path)) == os.path.getmtime(path):
+            continue
+        try:
+            with open(path, "r") as f:
+                rules = json.load(f)
+            rules = rules if isinstance(rules, list) else [rules]
+            snapshot_id = save_snapshot(rules, source=name, kind=kind, created=os.path.getmtime(path), directory=store)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"⚠️ Could not import {path}: {e}")
+            continue
+        with connect(store) as connection:
+            connection.execute("INSERT OR REPLACE INTO imports VALUES (?, ?, ?)",
+                               (os.path.abspath(path), os.path.getmtime(path), snapshot_id))
+        added += 1
+
+    with connect(store) as connection:
+        connection.execute("INSERT OR REPLACE INTO store_meta VALUES (?, ?)", (meta_key, directory_mtime))
+    return added
+
+
+def store_stats(directory=STORE_DIR):
+    """Snapshot, unique rule and pack totals."""
+    with connect(directory) as connection:
+        snapshots, references = connection.execute("SELECT COUNT(*), COALESCE(SUM(rule_count), 0) FROM snapshots").fetchone()
+        rules = connection.execute("SELECT COUNT(*) FROM rules").fetchone()[0]
+        packs, pack_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM packs").fetchone()
+    return {"snapshots": snapshots, "rules_referenced": references, "unique_rules": rules,
+            "packs": packs, "pack_bytes": pack_bytes}
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Browse the firewall snapshot store.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("list", help="list snapshots and backups, newest first")
+    show = commands.add_parser("export", help="write a snapshot's rules to a JSON file")
+    show.add_argument("snapshot", type=int)
+    show.add_argument("output")
+    compare = commands.add_parser("diff", help="rules added, removed and changed between two snapshots")
+    compare.add_argument("old", type=int)
+    compare.add_argument("new", type=int)
+    load = commands.add_parser("import", help="add a directory of JSON rule files")
+    load.add_argument("directory")
+    load.add_argument("--backup", action="store_true", help="import them as backups")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            with open(args.output, "w") as f:
+                json.dump(load_snapshot(args.snapshot), f, indent=4)
+            print(f"✅ Snapshot #{args.snapshot} written to {args.output}")
+        elif args.command == "diff":
+            diff = diff_snapshots(args.old, args.new)
+            for rule in diff.add:
+                print(f"+ {rule['DisplayName']}: {rule['Direction']} {rule['Action']} {rule['Profile']}")
+            for rule in diff.remove:
+                print(f"- {rule['DisplayName']}: {rule['Direction']} {rule['Action']} {rule['Profile']}")
+            for old, new in diff.modify:
+                changes = ", ".join(f"{field} {old.get(field, backup_restore.ANY)} -> {new.get(field, backup_restore.ANY)}"
+                                    for field in backup_restore.changed_fields(old, new))
+                print(f"~ {new['DisplayName']}: {changes}")
+            print(f"✅ {diff.summary()}")
+        elif args.command == "import":
+            added = import_directory(args.directory, BACKUP if args.backup else SNAPSHOT)
+            print(f"✅ Imported {added} file(s) from {args.directory}")
+        else:
+            for row in list_snapshots():
+                print(f"#{row['id']:<5} {format_time(row['created'])}  {row['kind']:<8} {row['rule_count']:>6} rules  {row['source'] or ''}")
+            print(f"📦 {store_stats()}")
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        sys.exit(1)
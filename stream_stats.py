@@ -0,0 +1,416 @@
+import sys
+import copy
+import json
+import math
+import zlib
+import base64
+import argparse
+import numpy as np
+import packet_io
+import columnar_store
+
+# Count-Min Sketch shape. An estimated count exceeds the true count by at most e / CMS_WIDTH of the
+# total weight (0.033% with 2^13 counters per row), with probability 1 - e^-CMS_DEPTH (98.2% with 4 rows)
+CMS_WIDTH = 2 ** 13
+CMS_DEPTH = 4
+
+# Heaviest keys remembered next to each sketch; the top lists are read from these candidates
+TOP_CANDIDATES = 256
+TOP_COUNT = 20
+
+# HyperLogLog precision p: 2^p one-byte registers, relative standard error 1.04 / sqrt(2^p)
+HLL_PRECISION = 14         # Capture-wide distinct sources, destinations and ports (0.81%)
+SOURCE_HLL_PRECISION = 8   # Distinct destinations and ports of each tracked source (6.5%)
+
+# Sources whose distinct destinations and ports are counted: the heaviest senders by packets.
+# A source that drops out of this set loses its distinct counts and starts afresh if it returns.
+TRACKED_SOURCES = 1024
+
+# Distinct values are hashed with a different seed than the sketch keys, so the two stay independent
+DISTINCT_SEED = 0x5BD1E995
+STATE_VERSION = 1
+COMPRESS_LEVEL = 6
+
+
+def _mix(values):
+    """MurmurHash3's 64-bit finalizer, applied element-wise."""
+    values = values ^ (values >> np.uint64(33))
+    values = values * np.uint64(0xFF51AFD7ED558CCD)
+    values = values ^ (values >> np.uint64(33))
+    values = values * np.uint64(0xC4CEB9FE1A85EC53)
+    return values ^ (values >> np.uint64(33))
+
+
+def hash_keys(values, seed=0):
+    """64-bit hashes of ports or packed 16-byte addresses."""
+    values = np.ascontiguousarray(values)
+    seed = np.uint64(seed)
+    if values.dtype.kind == "S":
+        halves = values.view(np.uint64).reshape(-1, 2)
+        return _mix(_mix(halves[:, 0] ^ seed) ^ halves[:, 1])
+    return _mix(values.astype(np.uint64) ^ seed)
+
+
+def _pack(array):
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes(), COMPRESS_LEVEL)).decode("ascii")
+
+
+def _unpack(text, dtype, shape):
+    return np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=dtype).reshape(shape).copy()
+
+
+def _check_shape(a, b, what):
+    if a.shape != b.shape:
+        raise ValueError(f"Cannot merge {what} of different sizes: {a.shape} and {b.shape}")
+
+
+class CountMinSketch:
+    """Weights of hashed keys in depth x width counters; an estimate never undercounts."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.counters = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _cells(self, hashes):
+        # Row i uses h1 + i * h2 (double hashing), so one 64-bit hash serves every row
+        depth, width = self.counters.shape
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(depth, dtype=np.uint64)[:, None]
+        return ((low + rows * high) % np.uint64(width)).astype(np.intp)
+
+    def add(self, hashes, weights):
+        width = self.counters.shape[1]
+        for row, cells in enumerate(self._cells(hashes)):
+            self.counters[row] += np.bincount(cells, weights=weights, minlength=width).astype(np.int64)
+        self.total += int(np.sum(weights))
+
+    def query(self, hashes):
+        cells = self._cells(hashes)
+        return self.counters[np.arange(len(cells))[:, None], cells].min(axis=0)
+
+    def error(self):
+        """Most an estimate overcounts, with probability confidence()."""
+        return math.ceil(math.e / self.counters.shape[1] * self.total)
+
+    def confidence(self):
+        return 1 - math.exp(-self.counters.shape[0])
+
+    def merge(self, other):
+        _check_shape(self.counters, other.counters, "count-min sketches")
+        self.counters += other.counters
+        self.total += other.total
+        return self
+
+    def get_state(self):
+        depth, width = self.counters.shape
+        return {"width": width, "depth": depth, "total": self.total, "counters": _pack(self.counters)}
+
+    def set_state(self, state):
+        self.counters = _unpack(state["counters"], np.int64, (state["depth"], state["width"]))
+        self.total = state["total"]
+
+
+def _hll_positions(hashes, precision):
+    """Register index (top bits) and rank (first set bit of the rest, from 1) of each hash."""
+    index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+    # The next 32 bits decide the rank; all zero (rank 33) only happens past billions of values
+    rest = ((hashes << np.uint64(precision)) >> np.uint64(32)).astype(np.float64)
+    return index, (33 - np.frexp(rest)[1]).astype(np.uint8)
+
+
+def hll_estimate(registers):
+    """Distinct-value estimates of HyperLogLog registers (one sketch per row of the last axis)."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    # Small cardinalities are estimated from the empty registers instead (linear counting)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def hll_error(precision):
+    return 1.04 / math.sqrt(2 ** precision)
+
+
+class HyperLogLog:
+    """Distinct count of hashed values in 2^precision one-byte registers."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    @property
+    def precision(self):
+        return len(self.registers).bit_length() - 1
+
+    def add(self, hashes):
+        index, rank = _hll_positions(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        return float(hll_estimate(self.registers))
+
+    def merge(self, other):
+        _check_shape(self.registers, other.registers, "HyperLogLogs")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def get_state(self):
+        return {"precision": self.precision, "registers": _pack(self.registers)}
+
+    def set_state(self, state):
+        self.registers = _unpack(state["registers"], np.uint8, (2 ** state["precision"],))
+
+
+class HeavyHitters:
+    """A Count-Min Sketch of key weights plus the `capacity` heaviest keys seen so far.
+
+    Each candidate key can also carry HyperLogLogs of distinct values (e.g. the destinations
+    of a source), which are kept for as long as the key stays a candidate.
+    """
+
+    def __init__(self, key_dtype, capacity=TOP_CANDIDATES, distinct=(), precision=SOURCE_HLL_PRECISION,
+                 width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.sketch = CountMinSketch(width, depth)
+        self.capacity = capacity
+        self.hashes = np.empty(0, dtype=np.uint64)  # Candidate key hashes, sorted
+        self.keys = np.empty(0, dtype=key_dtype)
+        self.registers = {name: np.zeros((0, 2 ** precision), dtype=np.uint8) for name in distinct}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def update(self, keys, weights, hashes=None):
+        """Add the weights of a batch of keys (hashes: their hash_keys values, when already known)."""
+        if hashes is None:
+            hashes = hash_keys(keys)
+        unique, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        self.sketch.add(unique, np.bincount(inverse.ravel(), weights=weights, minlength=len(unique)))
+        self._select(unique, keys[first], {})
+
+    def count_distinct(self, name, keys, values, hashes=None):
+        """Count the hashed values seen with each key under `name`; keys that are not candidates are skipped."""
+        if hashes is None:
+            hashes = hash_keys(keys)
+        slots = np.minimum(np.searchsorted(self.hashes, hashes), max(len(self.hashes) - 1, 0))
+        tracked = np.flatnonzero(self.hashes[slots] == hashes) if len(self.hashes) else slots[:0]
+        registers = self.registers[name]
+        index, rank = _hll_positions(values[tracked], int(np.log2(registers.shape[1])))
+        np.maximum.at(registers.reshape(-1), slots[tracked] * registers.shape[1] + index, rank)
+
+    def _select(self, hashes, keys, registers):
+        """Keep the heaviest of the current candidates and the given keys, carrying their registers over."""
+        all_hashes, first = np.unique(np.concatenate([self.hashes, hashes]), return_index=True)
+        all_keys = np.concatenate([self.keys, keys])[first]
+        if len(all_hashes) > self.capacity:
+            estimates = self.sketch.query(all_hashes)
+            keep = np.sort(np.argpartition(-estimates, self.capacity - 1)[:self.capacity])
+            all_hashes, all_keys = all_hashes[keep], all_keys[keep]
+
+        for name, current in self.registers.items():
+            kept = np.zeros((len(all_hashes), current.shape[1]), dtype=np.uint8)
+            for source_hashes, source in ((self.hashes, current), (hashes, registers.get(name))):
+                if source is None or not len(source_hashes) or not len(all_hashes):
+                    continue
+                slots = np.minimum(np.searchsorted(all_hashes, source_hashes), len(all_hashes) - 1)
+                found = all_hashes[slots] == source_hashes
+                kept[slots[found]] = np.maximum(kept[slots[found]], source[found])
+            self.registers[name] = kept
+        self.hashes, self.keys = all_hashes, all_keys
+
+    def top(self, count=TOP_COUNT):
+        """The heaviest candidates: (keys, estimated weights, {name: estimated distinct values})."""
+        estimates = self.sketch.query(self.hashes)
+        order = np.argsort(-estimates, kind="stable")[:count]
+        distinct = {name: hll_estimate(registers[order]) for name, registers in self.registers.items()}
+        return self.keys[order], estimates[order], distinct
+
+    def memory_bytes(self):
+        """Size of the sketch and a full candidate set (fixed by the parameters)."""
+        per_key = 8 + self.keys.dtype.itemsize + sum(registers.shape[1] for registers in self.registers.values())
+        return self.sketch.counters.nbytes + self.capacity * per_key
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        for name, registers in self.registers.items():
+            _check_shape(registers[:0], other.registers[name][:0], "HyperLogLogs")
+        self._select(other.hashes, other.keys, other.registers)
+        return self
+
+    def get_state(self):
+        return {
+            "sketch": self.sketch.get_state(),
+            "capacity": self.capacity,
+            "key_dtype": self.keys.dtype.str,
+            "count": len(self.keys),
+            "keys": _pack(self.keys),
+            "registers": {name: _pack(registers) for name, registers in self.registers.items()},
+            "register_count": {name: registers.shape[1] for name, registers in self.registers.items()},
+        }
+
+    def set_state(self, state):
+        self.sketch.set_state(state["sketch"])
+        self.capacity = state["capacity"]
+        self.keys = _unpack(state["keys"], state["key_dtype"], (state["count"],))
+        self.hashes = hash_keys(self.keys)
+        self.registers = {name: _unpack(packed, np.uint8, (state["count"], state["register_count"][name]))
+                          for name, packed in state["registers"].items()}
+
+
+class StreamStats:
+    """Top talkers, destinations and ports plus distinct counts of a capture, in constant memory.
+
+    update() takes columnar packet (or flow) batches; the memory used never depends on how many
+    packets or addresses the capture holds. Stats of separate segments or workers combine with
+    merge() (or +) exactly as if one instance had seen every batch.
+    """
+
+    def __init__(self, capacity=TOP_CANDIDATES, tracked_sources=TRACKED_SOURCES):
+        self.sources = HeavyHitters("S16", tracked_sources, distinct=("destinations", "ports"))
+        self.destinations = HeavyHitters("S16", capacity)
+        self.ports = HeavyHitters("<i4", capacity)
+        self.source_bytes = CountMinSketch()
+        self.distinct = {name: HyperLogLog() for name in ("sources", "destinations", "ports")}
+        self.records = 0
+        self.packets = 0
+        self.bytes = 0
+
+    def update(self, batch):
+        # Flow records carry their own packet and byte totals
+        packets = np.asarray(batch["packets"]) if "packets" in batch.columns else np.ones(len(batch), dtype=np.int64)
+        sizes = np.asarray(batch["bytes"] if "bytes" in batch.columns else batch["length"])
+        self.records += len(batch)
+        self.packets += int(np.sum(packets))
+        self.bytes += int(np.sum(sizes))
+
+        known = np.flatnonzero(batch["ip_version"] > 0)
+        if not len(known):
+            return
+        sources = np.asarray(batch["src_addr"])[known]
+        destinations = np.asarray(batch["dst_addr"])[known]
+        ports = np.asarray(batch["dst_port"])[known]
+        weights = packets[known]
+        with_port = ports >= 0
+
+        source_hashes = hash_keys(sources)
+        destination_values = hash_keys(destinations, DISTINCT_SEED)
+        port_values = hash_keys(ports, DISTINCT_SEED)
+
+        self.sources.update(sources, weights, source_hashes)
+        self.sources.count_distinct("destinations", sources, destination_values, source_hashes)
+        self.sources.count_distinct("ports", sources[with_port], port_values[with_port], source_hashes[with_port])
+        self.source_bytes.add(source_hashes, sizes[known])
+        self.destinations.update(destinations, weights)
+        self.ports.update(ports[with_port], weights[with_port])
+
+        self.distinct["sources"].add(hash_keys(sources, DISTINCT_SEED))
+        self.distinct["destinations"].add(destination_values)
+        self.distinct["ports"].add(port_values[with_port])
+
+    def merge(self, other):
+        self.sources.merge(other.sources)
+        self.destinations.merge(other.destinations)
+        self.ports.merge(other.ports)
+        self.source_bytes.merge(other.source_bytes)
+        for name, counter in self.distinct.items():
+            counter.merge(other.distinct[name])
+        self.records += other.records
+        self.packets += other.packets
+        self.bytes += other.bytes
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __add__(self, other):
+        return copy.deepcopy(self).merge(other)
+
+    def memory_bytes(self):
+        return (self.sources.memory_bytes() + self.destinations.memory_bytes() + self.ports.memory_bytes()
+                + self.source_bytes.counters.nbytes + sum(c.registers.nbytes for c in self.distinct.values()))
+
+    def error_bounds(self):
+        """Documented accuracy of the summary's estimates."""
+        return {
+            "packet_count_overestimate_max": self.sources.sketch.error(),
+            "byte_count_overestimate_max": self.source_bytes.error(),
+            "count_confidence": round(self.source_bytes.confidence(), 4),
+            "distinct_relative_error": round(hll_error(HLL_PRECISION), 4),
+            "per_source_distinct_relative_error": round(hll_error(SOURCE_HLL_PRECISION), 4),
+        }
+
+    def summary(self, top=TOP_COUNT):
+        """Report section: totals, distinct counts, top lists, error bounds and memory used."""
+        keys, packets, distinct = self.sources.top(top)
+        sizes = self.source_bytes.query(hash_keys(keys))
+        top_sources = [{
+            "src_ip": columnar_store.format_ip(key),
+            "packets": int(count),
+            "bytes": int(size),
+            "distinct_destinations": int(round(destinations)),
+            "distinct_ports": int(round(ports)),
+        } for key, count, size, destinations, ports in zip(
+            keys.tolist(), packets, sizes, distinct["destinations"], distinct["ports"])]
+
+        keys, packets, _ = self.destinations.top(top)
+        top_destinations = [{"dst_ip": columnar_store.format_ip(key), "packets": int(count)}
+                            for key, count in zip(keys.tolist(), packets)]
+        keys, packets, _ = self.ports.top(top)
+        top_ports = [{"port": int(key), "packets": int(count)} for key, count in zip(keys.tolist(), packets)]
+
+        return {
+            "records": self.records,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            **{f"distinct_{name}": int(round(counter.estimate())) for name, counter in self.distinct.items()},
+            "top_sources": top_sources,
+            "top_destinations": top_destinations,
+            "top_ports": top_ports,
+            "error_bounds": self.error_bounds(),
+            "memory_bytes": self.memory_bytes(),
+        }
+
+    def get_state(self):
+        return {
+            "version": STATE_VERSION,
+            "sources": self.sources.get_state(),
+            "destinations": self.destinations.get_state(),
+            "ports": self.ports.get_state(),
+            "source_bytes": self.source_bytes.get_state(),
+            "distinct": {name: counter.get_state() for name, counter in self.distinct.items()},
+            "totals": [self.records, self.packets, self.bytes],
+        }
+
+    def set_state(self, state):
+        if state.get("version") != STATE_VERSION:
+            return  # Stats from another format version are rebuilt rather than misread
+        self.sources.set_state(state["sources"])
+        self.destinations.set_state(state["destinations"])
+        self.ports.set_state(state["ports"])
+        self.source_bytes.set_state(state["source_bytes"])
+        for name, counter in self.distinct.items():
+            counter.set_state(state["distinct"][name])
+        self.records, self.packets, self.bytes = state["totals"]
+
+
+def analyze_stats(file_path, top=TOP_COUNT, batch_size=columnar_store.FLUSH_ROWS):
+    """Compute the streaming statistics of a capture and print them."""
+    stats = StreamStats()
+    for batch in columnar_store.iter_capture_batches(file_path, batch_size):
+        stats.update(batch)
+    print(json.dumps(stats.summary(top), indent=4))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Heavy hitters and distinct counts of a capture in bounded memory.")
+    parser.add_argument("capture", nargs="?", help="capture to analyze (default: latest)")
+    parser.add_argument("--top", type=int, default=TOP_COUNT, help="entries in each top list")
+    args = parser.parse_args()
+
+    path = args.capture or packet_io.get_latest_packet_file()
+    if not path:
+        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
+        sys.exit(1)
+    analyze_stats(path, args.top)
@@ -0,0 +1,196 @@
+import sys
+import time
+import queue
+import itertools
+import importlib
+import threading
+import traceback
+import multiprocessing
+import concurrent.futures
+
+# Script name (as used by the GUI buttons) -> (module, function) run by the warm worker.
+# Jobs run without a console, so each function must not prompt for input.
+JOBS = {
+    "capture_packets.py": ("capture_packets", "capture_packets"),
+    "get_firewall_rules.py": ("get_firewall_rules", "get_firewall_rules"),
+    "analyze_rules.py": ("analyze_rules", "analyze_firewall_rules"),
+    "backup_restore.py": ("backup_restore", "backup_latest_snapshot"),
+    "traffic_analysis.py": ("traffic_analysis", "analyze_packets"),
+    "ai_threat_analysis.py": ("ai_threat_analysis", "ai_threat_analysis"),
+    "connection_analysis.py": ("connection_analysis", "analyze_connections"),
+    "analysis_engine.py": ("task_runner", "run_all_analyses"),
+}
+
+# Jobs the worker runs at the same time (each in its own thread)
+WORKER_THREADS = 4
+
+# Seconds to wait for the worker to exit before terminating it
+STOP_TIMEOUT = 5
+
+
+def run_all_analyses():
+    """Run every packet analysis in one pass (the analysis_engine.py entry point)."""
+    import analysis_engine
+    return analysis_engine.run_analysis(analysis_engine.default_stages())
+
+
+class _JobOutput:
+    """Stand-in for sys.stdout that streams each job thread's prints back to the GUI."""
+
+    def __init__(self, events, stream):
+        self.events = events
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        job_id = getattr(self.local, "job_id", None)
+        if job_id is None:
+            return self.stream.write(text)
+        if text:
+            self.events.put(("output", job_id, text))
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _warm_up():
+    """Import every job module and load the shared model and indexes once."""
+    for module_name, _ in JOBS.values():
+        importlib.import_module(module_name)
+
+    import ip_reputation
+    import ai_threat_analysis
+    ip_reputation.get_index()
+    ai_threat_analysis.load_model()
+
+
+def _run_job(events, output, job_id, name):
+    module_name, function_name = JOBS[name]
+    output.local.job_id = job_id
+    started = time.perf_counter()
+    events.put(("started", job_id, name))
+    try:
+        result = getattr(importlib.import_module(module_name), function_name)()
+        if not isinstance(result, (str, int, float, bool, type(None))):
+            result = repr(result)
+        events.put(("finished", job_id, name, result, time.perf_counter() - started))
+    except BaseException as e:  # Report SystemExit from scripts too, but keep the worker alive
+        traceback.print_exc()
+        events.put(("failed", job_id, name, f"{type(e).__name__}: {e}", time.perf_counter() - started))
+    finally:
+        output.local.job_id = None
+
+
+def _serve(jobs, events, threads):
+    """Worker process: warm up, then run (job_id, name) requests until None arrives."""
+    output = _JobOutput(events, sys.stdout)
+    sys.stdout = sys.stderr = output
+
+    import metrics
+    metrics.configure_from_env()
+
+    started = time.perf_counter()
+    try:
+        _warm_up()
+    except Exception as e:
+        events.put(("output", None, f"⚠️ Warm-up incomplete: {e}\n"))
+    events.put(("ready", None, time.perf_counter() - started))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            job_id, name = job
+            if name not in JOBS:
+                events.put(("failed", job_id, name, f"Unknown task: {name}", 0.0))
+                continue
+            executor.submit(_run_job, events, output, job_id, name)
+
+
+class TaskRunner:
+    """Long-lived background worker process that keeps heavy modules and the AI model loaded.
+
+    Jobs are queued with submit(); poll() returns the worker's events without blocking:
+    ("ready", None, seconds), ("started", id, name), ("output", id, text),
+    ("finished", id, name, result, seconds) and ("failed", id, name, error, seconds).
+    """
+
+    def __init__(self, threads=WORKER_THREADS):
+        self.threads = threads
+        self.process = None
+        self._ids = itertools.count(1)
+
+    def start(self):
+        """Start the worker process (spawned, so it never inherits GUI state)."""
+        context = multiprocessing.get_context("spawn")
+        self.jobs = context.Queue()
+        self.events = context.Queue()
+        self.process = context.Process(target=_serve, args=(self.jobs, self.events, self.threads),
+                                       name="task-runner", daemon=True)
+        self.process.start()
+        return self
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def submit(self, name):
+        """Queue a job by script name; returns its job id."""
+        if not self.alive():
+            self.start()
+        job_id = next(self._ids)
+        self.jobs.put((job_id, name))
+        return job_id
+
+    def poll(self):
+        """Return every event the worker has sent so far."""
+        received = []
+        if self.process is None:
+            return received
+        while True:
+            try:
+                received.append(self.events.get_nowait())
+            except queue.Empty:
+                return received
+
+    def wait(self, job_id, timeout=None, on_event=None):
+        """Block until a job finishes or fails; returns its final event."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            event = self.events.get(timeout=remaining)
+            if on_event:
+                on_event(event)
+            if event[0] in ("finished", "failed") and event[1] == job_id:
+                return event
+
+    def stop(self):
+        """Ask the worker to finish its running jobs and exit."""
+        if not self.alive():
+            return
+        self.jobs.put(None)
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+if __name__ == "__main__":
+    # Run jobs through a warm worker from the command line: python task_runner.py traffic_analysis.py ...
+    runner = TaskRunner().start()
+
+    def show(event):
+        if event[0] == "output":
+            print(event[2], end="")
+        elif event[0] == "ready":
+            print(f"✅ Worker ready in {event[2]:.2f}s")
+        elif event[0] == "finished":
+            print(f"✅ {event[2]} finished in {event[4]:.2f}s")
+        elif event[0] == "failed":
+            print(f"❌ {event[2]} failed after {event[4]:.2f}s: {event[3]}")
+
+    try:
+        for name in sys.argv[1:] or ["analysis_engine.py"]:
+            runner.wait(runner.submit(name), on_event=show)
+    finally:
+        runner.stop()
@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rule_space
+
+IPTABLES_ACCEPT_ONLY = """*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+-A INPUT -i lo -j ACCEPT
+-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p tcp -m tcp --dport 443 -j ACCEPT
+COMMIT
+"""
+
+WINDOWS_ALLOW_ONLY = """[
+    {"Name": "web", "DisplayName": "Web", "Direction": 1, "Action": 2, "Enabled": 1, "Profile": 0,
+     "Protocol": "TCP", "LocalPort": "80,443"},
+    {"Name": "https", "DisplayName": "HTTPS", "Direction": 1, "Action": 2, "Enabled": 1, "Profile": 0,
+     "Protocol": "TCP", "LocalPort": "443"}
+]"""
+
+
+def test_accept_only_iptables_ruleset():
+    rules, _ = rule_space.parse_rules(IPTABLES_ACCEPT_ONLY, "iptables")
+    assert rules and all(rule["action"] == "Allow" for rule in rules)
+    findings = rule_space.find_interactions(rules)
+    assert rule_space.summarize(findings)["conflict"] == 0
+    assert any(finding["kind"] == "redundant" for finding in findings)
+
+
+def test_allow_only_windows_ruleset():
+    rules, _ = rule_space.parse_rules(WINDOWS_ALLOW_ONLY, "windows")
+    findings = rule_space.find_interactions(rules)
+    assert [finding["kind"] for finding in findings] == ["redundant"]
+
+
+def test_block_only_ruleset():
+    text = IPTABLES_ACCEPT_ONLY.replace("-j ACCEPT", "-j DROP")
+    rules, _ = rule_space.parse_rules(text, "iptables")
+    findings = rule_space.find_interactions(rules)
+    assert rule_space.summarize(findings)["conflict"] == 0
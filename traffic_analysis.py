@@ -1,97 +1,310 @@
 import os
+import sys
 import json
 import datetime
+import numpy as np
+import ip_reputation
+import port_policy
+import analysis_engine
+import metrics
+import report_engine
+import rate_analytics
+import signature_engine
+import stream_stats
 
 # ✅ Corrected log directory path
-PACKET_LOG_DIR = "logs/packets"
 REPORT_DIR = "logs/traffic_analysis_reports"
 
 # Ensure report directory exists
 os.makedirs(REPORT_DIR, exist_ok=True)
 
-# Example suspicious ports & IPs for basic threat detection
-SUSPICIOUS_PORTS = {23, 445, 3389}  # Telnet, SMB, RDP (common attack vectors)
-MALICIOUS_IPS = {"192.168.1.100"}  # Replace with known bad IPs
-
-def get_latest_packet_file():
-    """Find the latest packet capture file."""
-    if not os.path.exists(PACKET_LOG_DIR):
-        print(f"❌ Packet log directory '{PACKET_LOG_DIR}' not found.")
-        return None
-
-    files = [f for f in os.listdir(PACKET_LOG_DIR) if f.endswith(".json")]
-    if not files:
-        print(f"❌ No packet capture files found in '{PACKET_LOG_DIR}'.")
-        return None
-    
-    # Get the most recent file based on timestamp in filename
-    files.sort(reverse=True)
-    return os.path.join(PACKET_LOG_DIR, files[0])
-
-def analyze_packets():
-    """Analyze latest captured packets for threats."""
-    file_path = get_latest_packet_file()
-    
-    if not file_path:
-        print("❌ No captured packets found. Please run 'capture_packets.py' first.")
+# Ports at or above this port-policy severity are flagged (Telnet, SMB, RDP in the default policy)
+SUSPICIOUS_SEVERITY = port_policy.HIGH_RISK
+# Known malicious IPs come from the reputation index (blocklists/ plus ip_reputation.DEFAULT_MALICIOUS_IPS)
+
+# Threat codes assigned per packet, in rule precedence order: code -> (threat level, reason)
+NO_THREAT = 0
+THREATS = {
+    1: ("⚠️ Critical", "Connection with a known malicious IP."),
+    2: ("⚠️ High", "Unusual port detected ({port}). Possible attack vector."),
+    3: ("⚠️ Medium", "Unrecognized network protocol."),
+}
+LEVEL_RANK = {threat_level: rank for rank, (threat_level, _) in enumerate(THREATS.values())}
+
+# Payload signature hits take their level from the signature's severity (see signature_engine)
+SIGNATURE_REASON = "Payload matches signature: {name}."
+
+# Fields that identify one aggregated finding in the report
+GROUP_FIELDS = ("src_ip", "dst_ip", "protocol", "port", "threat_level", "reason")
+
+def classify_threats(capture):
+    """Vectorized rule check: per-row threat code plus the matching reputation entry (-1 when none)."""
+    reputation = ip_reputation.get_index()
+
+    # Same precedence as the per-packet rules: malicious IP, then suspicious port, then unknown protocol
+    known = capture["ip_version"] > 0
+    src_match = np.where(known, reputation.lookup(capture["src_addr"]), -1)
+    dst_match = np.where(known, reputation.lookup(capture["dst_addr"]), -1)
+    malicious = (src_match >= 0) | (dst_match >= 0)
+    severities = port_policy.get_policy().classify(capture["dst_port"], capture["protocol"])
+    suspicious = ~malicious & (severities >= SUSPICIOUS_SEVERITY)
+    unknown = ~malicious & ~suspicious & (capture["protocol"] < 0)
+
+    codes = np.select([malicious, suspicious, unknown], [1, 2, 3], default=NO_THREAT)
+    matches = np.where(src_match >= 0, src_match, dst_match)
+    return codes, matches
+
+def _finding(pkt, code, match, reputation):
+    threat_level, threat_reason = THREATS[code]
+    finding = {
+        "src_ip": pkt["src_ip"],
+        "dst_ip": pkt["dst_ip"],
+        "protocol": pkt["protocol"],
+        "port": pkt["dst_port"],
+        "threat_level": threat_level,
+        "reason": threat_reason.format(port=pkt["dst_port"])
+    }
+    if match >= 0:
+        block, feed = reputation.describe(match)
+        finding["blocklist"] = f"{block} ({feed})"
+    return finding
+
+def find_threats(capture, with_index=False):
+    """Flag threatening packets in a columnar capture, one finding per packet.
+
+    with_index=True adds each finding's row number in the capture under "index".
+    """
+    reputation = ip_reputation.get_index()
+    codes, matches = classify_threats(capture)
+
+    threat_results = []
+
+    for index in np.flatnonzero(codes):
+        finding = _finding(capture.packet(index, payload=False), int(codes[index]), matches[index], reputation)
+
+        # Flow records also say how many packets the finding covers
+        if "packets" in capture.columns:
+            finding["packets"] = int(capture["packets"][index])
+
+        if with_index:
+            finding["index"] = int(index)
+
+        threat_results.append(finding)
+
+    automaton = signature_engine.get_automaton()
+    rows, signature_ids = scan_payloads(capture, automaton)
+    for index, signature_id in zip(rows.tolist(), signature_ids.tolist()):
+        finding = _signature_finding(capture.packet(index, payload=False), signature_id, automaton)
+        if "packets" in capture.columns:
+            finding["packets"] = int(capture["packets"][index])
+        if with_index:
+            finding["index"] = index
+        threat_results.append(finding)
+
+    metrics.count_levels("traffic", (finding["threat_level"] for finding in threat_results))
+    return threat_results
+
+def scan_payloads(capture, automaton):
+    """Rows and signature ids of every signature found in the capture's payloads."""
+    with metrics.timer("signatures", analyzer="traffic"):
+        rows, signature_ids = automaton.scan_capture(capture)
+    metrics.inc("payload_bytes_scanned_total", int(capture.payload_offsets[-1] - capture.payload_offsets[0]))
+    return rows, signature_ids
+
+def _signature_finding(pkt, signature_id, automaton):
+    name, threat_level, signature_set = automaton.describe(signature_id)
+    return {
+        "src_ip": pkt["src_ip"],
+        "dst_ip": pkt["dst_ip"],
+        "protocol": pkt["protocol"],
+        "port": pkt["dst_port"],
+        "threat_level": threat_level,
+        "reason": SIGNATURE_REASON.format(name=name),
+        "signature_set": signature_set,
+    }
+
+def group_threats(capture, groups, evidence=None):
+    """Add the threats in a columnar capture to FindingGroups, one entry per distinct finding.
+
+    Packets are grouped with vectorized column operations, so only one finding per
+    group is built. With an EvidenceWriter, every flagged packet is also streamed to it.
+    """
+    reputation = ip_reputation.get_index()
+    codes, matches = classify_threats(capture)
+    flagged = np.flatnonzero(codes)
+    if not len(flagged):
         return
-    
-    print(f"🔍 Analyzing packet data from: {file_path}")
-
-    try:
-        with open(file_path, "r") as f:
-            packets = json.load(f)
-    except Exception as e:
-        print(f"❌ Error reading packet log: {e}")
+
+    first_rows, inverse = report_engine.group_rows([
+        capture[name][flagged] for name in ("ip_version", "src_addr", "dst_addr", "protocol", "dst_port")
+    ] + [codes[flagged], matches[flagged]])
+    starts, ends = report_engine.capture_times(capture)
+    packets = report_engine.capture_packets(capture)
+    stats = report_engine.group_stats(inverse, len(first_rows), starts[flagged],
+                                      None if packets is None else packets[flagged], ends[flagged])
+
+    levels = {}
+    for index, group in zip(flagged[first_rows], stats):
+        finding = _finding(capture.packet(index, payload=False), int(codes[index]), matches[index], reputation)
+        if "blocklist" in finding:
+            group["blocklist"] = finding["blocklist"]
+        groups.add(tuple(finding[field] for field in GROUP_FIELDS), group)
+        levels[finding["threat_level"]] = levels.get(finding["threat_level"], 0) + group["count"]
+    metrics.count_level_totals("traffic", levels)
+
+    if evidence is not None:
+        evidence.write(_evidence(capture, flagged, codes, matches, reputation))
+
+def group_signature_hits(capture, groups, evidence=None):
+    """Add payload signature hits to FindingGroups, one entry per (endpoints, port, signature)."""
+    automaton = signature_engine.get_automaton()
+    rows, signature_ids = scan_payloads(capture, automaton)
+    if not len(rows):
         return
 
-    threat_results = []
+    first_rows, inverse = report_engine.group_rows([
+        capture[name][rows] for name in ("ip_version", "src_addr", "dst_addr", "protocol", "dst_port")
+    ] + [signature_ids])
+    starts, ends = report_engine.capture_times(capture)
+    packets = report_engine.capture_packets(capture)
+    stats = report_engine.group_stats(inverse, len(first_rows), starts[rows],
+                                      None if packets is None else packets[rows], ends[rows])
+
+    levels = {}
+    for index, signature_id, group in zip(rows[first_rows], signature_ids[first_rows], stats):
+        finding = _signature_finding(capture.packet(index, payload=False), signature_id, automaton)
+        group["signature_set"] = finding["signature_set"]
+        groups.add(tuple(finding[field] for field in GROUP_FIELDS), group)
+        levels[finding["threat_level"]] = levels.get(finding["threat_level"], 0) + group["count"]
+    metrics.count_level_totals("signatures", levels)
+
+    if evidence is not None:
+        evidence.write(_signature_evidence(capture, rows, signature_ids, automaton))
+
+def _signature_evidence(capture, rows, signature_ids, automaton):
+    for index, signature_id in zip(rows, signature_ids):
+        pkt = capture.packet(index, payload=False)
+        finding = _signature_finding(pkt, signature_id, automaton)
+        finding["timestamp"] = pkt["timestamp"]
+        finding["src_port"] = pkt["src_port"]
+        finding["packet_size"] = pkt["packet_size"]
+        yield finding
+
+def _evidence(capture, flagged, codes, matches, reputation):
+    """Per-packet findings with the packet's time, source port and size."""
+    for index in flagged:
+        pkt = capture.packet(index, payload=False)
+        finding = _finding(pkt, int(codes[index]), matches[index], reputation)
+        finding["timestamp"] = pkt["timestamp"]
+        finding["src_port"] = pkt["src_port"]
+        finding["packet_size"] = pkt["packet_size"]
+        if "packets" in capture.columns:
+            finding["packets"] = int(capture["packets"][index])
+        yield finding
+
+def group_rate_alerts(alerts, groups):
+    """Add sliding-window alerts (scans, floods, spikes) to FindingGroups; each alert counts once."""
+    levels = {}
+    for alert in alerts:
+        groups.add(tuple(alert[field] for field in GROUP_FIELDS), {
+            "count": 1,
+            "packets": alert["window_packets"],
+            "first_seen": alert["window_start"],
+            "last_seen": alert["window_end"],
+            "detection": alert["detection"],
+            "peak_value": alert["value"],
+            "threshold": alert["threshold"],
+            "window_seconds": alert["window_seconds"],
+        })
+        levels[alert["threat_level"]] = levels.get(alert["threat_level"], 0) + 1
+    metrics.count_level_totals("rate", levels)
+
+def _rank(row):
+    """Most severe level first, sliding-window alerts ahead of per-packet findings, then the largest groups."""
+    return LEVEL_RANK[row["threat_level"]], "detection" not in row, -row["count"]
+
+def _is_rate_alert(group):
+    return "detection" in group
 
-    for pkt in packets:
-        src_ip = pkt.get("src_ip", "Unknown")
-        dst_ip = pkt.get("dst_ip", "Unknown")
-        protocol = pkt.get("protocol", "Unknown")
-        port = pkt.get("dst_port", 0)  # Ensure a default numeric value
-
-        threat_level = "Safe"
-        threat_reason = ""
-
-        if src_ip in MALICIOUS_IPS or dst_ip in MALICIOUS_IPS:
-            threat_level = "⚠️ Critical"
-            threat_reason = "Connection with a known malicious IP."
-        
-        elif isinstance(port, int) and port in SUSPICIOUS_PORTS:
-            threat_level = "⚠️ High"
-            threat_reason = f"Unusual port detected ({port}). Possible attack vector."
-        
-        elif protocol == "Unknown":
-            threat_level = "⚠️ Medium"
-            threat_reason = "Unrecognized network protocol."
-
-        if threat_level != "Safe":
-            threat_results.append({
-                "src_ip": src_ip,
-                "dst_ip": dst_ip,
-                "protocol": protocol,
-                "port": port,
-                "threat_level": threat_level,
-                "reason": threat_reason
-            })
-
-    # Save report
+def _is_packet_finding(group):
+    return "detection" not in group
+
+def save_report(file_path, groups, evidence_path=None, rates=None, stats=None):
+    """Write the aggregated traffic threat report for an analyzed capture."""
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     report_path = os.path.join(REPORT_DIR, f"traffic_analysis_{timestamp}.json")
 
     report_data = {
         "timestamp": timestamp,
         "file_analyzed": file_path,
-        "threats_found": threat_results if threat_results else ["✅ No threats detected."]
+        "summary": {
+            # Rate alerts count episodes over packets already counted by the findings; kept apart
+            "flagged_records": groups.total("count", where=_is_packet_finding),
+            "flagged_packets": groups.total("packets", where=_is_packet_finding),
+            "rate_alerts": groups.total("count", where=_is_rate_alert),
+            "distinct_findings": len(groups),
+            "findings_listed": min(len(groups), report_engine.MAX_REPORTED_FINDINGS),
+            "by_threat_level": groups.totals_by("threat_level", where=_is_packet_finding),
+            "rate_alerts_by_threat_level": groups.totals_by("threat_level", where=_is_rate_alert),
+        },
+        "rate_analytics": rates.summary() if rates else None,
+        "traffic_statistics": stats.summary() if stats else None,
+        "threats_found": groups.rows(_rank) if len(groups) else ["✅ No threats detected."],
+        "evidence_file": evidence_path,
     }
 
     with open(report_path, "w") as f:
         json.dump(report_data, f, indent=4)
 
     print(f"✅ Analysis complete. Report saved: {report_path}")
+    return report_path
+
+class TrafficThreatStage(analysis_engine.AnalysisStage):
+    """Rule-based threat check: malicious IPs, suspicious ports and unknown protocols,
+    payload signatures (see signature_engine) and sliding-window scan and flood detection
+    (see rate_analytics), with the top talkers and distinct counts (see stream_stats).
+
+    Only the aggregated findings and traffic statistics are checkpointed; incremental runs
+    start their windows afresh.
+    """
+
+    name = "Traffic Threat Analysis"
+
+    def __init__(self, evidence=False, rates=True, signatures=True, stats=True):
+        self.groups = report_engine.FindingGroups(GROUP_FIELDS)
+        self.evidence = report_engine.EvidenceWriter(REPORT_DIR, "traffic_analysis") if evidence else None
+        self.rates = rate_analytics.RateAnalyzer() if rates else None
+        self.signatures = signatures
+        self.stats = stream_stats.StreamStats() if stats else None
+
+    def process(self, batch):
+        group_threats(batch, self.groups, self.evidence)
+        if self.signatures:
+            group_signature_hits(batch, self.groups, self.evidence)
+        if self.rates is not None:
+            group_rate_alerts(self.rates.update(batch), self.groups)
+        if self.stats is not None:
+            self.stats.update(batch)
+
+    def finish(self, file_path):
+        evidence_path = self.evidence.close() if self.evidence else None
+        return save_report(file_path, self.groups, evidence_path, self.rates, self.stats)
+
+    def get_state(self):
+        state = {"groups": self.groups.get_state()}
+        if self.stats is not None:
+            state["stats"] = self.stats.get_state()
+        return state
+
+    def set_state(self, state):
+        self.groups.set_state(state.get("groups", []))
+        if self.stats is not None and "stats" in state:
+            self.stats.set_state(state["stats"])
+
+def analyze_packets(file_path=None, flows=False, incremental=False, evidence=False):
+    """Analyze latest captured packets for threats."""
+    analysis_engine.run_analysis([TrafficThreatStage(evidence)], file_path, flows=flows, incremental=incremental)
 
 if __name__ == "__main__":
-    analyze_packets()
+    metrics.configure_from_env()
+    analyze_packets(evidence="--evidence" in sys.argv[1:])
@@ -1,46 +1,164 @@
 import os
+import sys
 import pickle
-import pandas as pd
-from sklearn.model_selection import train_test_split
+import argparse
+import numpy as np
+import packet_io
+import capture_catalog
+import feature_store
+import forest_model
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 
 # Ensure models directory exists
 MODEL_DIR = "models"
+MODEL_PATH = os.path.join(MODEL_DIR, "ai_threat_model.pkl")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Sample dataset (Replace with actual network threat dataset)
-data = {
-    "src_port": [443, 80, 22, 53, 445, 3389, 25, 8080, 21, 3306],
-    "dst_port": [443, 80, 22, 53, 445, 3389, 25, 8080, 21, 3306],
-    "protocol": [6, 6, 6, 17, 6, 6, 6, 6, 6, 6],  # TCP=6, UDP=17
-    "packet_size": [500, 700, 200, 300, 1500, 2000, 400, 900, 250, 1800],
-    "risk_level": [0, 1, 2, 1, 3, 3, 2, 1, 2, 3]  # 0=Safe, 1=Suspicious, 2=Risky, 3=Dangerous
-}
-
-# Convert data to DataFrame
-df = pd.DataFrame(data)
-
-# Features and labels
-X = df.drop("risk_level", axis=1)
-y = df["risk_level"]
-
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Train Random Forest model
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
-
-# Evaluate model
-y_pred = model.predict(X_test)
-accuracy = accuracy_score(y_test, y_pred)
-print(f"Model Accuracy: {accuracy:.2f}")
-print(classification_report(y_test, y_pred))
-
-# Save model
-model_path = os.path.join(MODEL_DIR, "ai_threat_model.pkl")
-with open(model_path, "wb") as f:
-    pickle.dump(model, f)
-
-print(f"Model saved to {model_path}")
+# Forest size and training parallelism (-1 = every core)
+N_ESTIMATORS = 100
+N_JOBS = -1
+RANDOM_STATE = 42
+
+# Training rows held in memory per fit. Larger datasets are learned in rounds: each round grows
+# TREES_PER_ROUND more trees on a fresh random sample of the memory-mapped feature store.
+MAX_TRAIN_ROWS = 2_000_000
+TREES_PER_ROUND = 10
+
+# Every TEST_EVERY-th row of each capture is held out for evaluation
+TEST_EVERY = 5
+
+CLASS_NAMES = ["safe", "threat"]
+
+
+class TrainingSet:
+    """Cached feature tables of several captures, split into training and held-out rows without copying."""
+
+    def __init__(self, tables):
+        self.tables = [columns for columns, meta in tables if meta["count"]]
+        self.counts = np.array([len(columns[feature_store.LABEL_COLUMN]) for columns in self.tables], dtype=np.int64)
+        self.test_counts = -(-self.counts // TEST_EVERY)
+        self.train_counts = self.counts - self.test_counts
+        self.train_offsets = np.concatenate([[0], np.cumsum(self.train_counts)])
+
+    @property
+    def train_rows(self):
+        return int(self.train_offsets[-1])
+
+    @property
+    def test_rows(self):
+        return int(self.test_counts.sum())
+
+    def _gather(self, rows_per_table):
+        """Feature matrix and labels of the given (sorted) rows of every table."""
+        parts = [(feature_store.feature_matrix(columns, rows), np.asarray(columns[feature_store.LABEL_COLUMN][rows]))
+                 for columns, rows in zip(self.tables, rows_per_table) if len(rows)]
+        if not parts:
+            return np.empty((0, len(feature_store.FEATURE_NAMES)), dtype=np.int64), np.empty(0, dtype=np.uint8)
+        return np.concatenate([x for x, _ in parts]), np.concatenate([y for _, y in parts])
+
+    def _train_positions(self, positions):
+        """Split sorted training positions into per-table rows, skipping the held-out rows."""
+        rows_per_table = []
+        for index, (start, stop) in enumerate(zip(self.train_offsets[:-1], self.train_offsets[1:])):
+            local = positions[np.searchsorted(positions, start):np.searchsorted(positions, stop)] - start
+            rows_per_table.append(local + local // (TEST_EVERY - 1) + 1)
+        return rows_per_table
+
+    def train_all(self):
+        return self._gather(self._train_positions(np.arange(self.train_rows)))
+
+    def train_sample(self, size, rng):
+        """A random sample (with replacement, like a bootstrap) of the training rows, in file order."""
+        return self._gather(self._train_positions(np.sort(rng.integers(0, self.train_rows, size))))
+
+    def test(self, limit):
+        """Held-out rows, evenly thinned to at most `limit`."""
+        stride = max(1, -(-self.test_rows // limit))
+        return self._gather([np.arange(0, count, TEST_EVERY * stride) for count in self.counts])
+
+
+def find_training_captures(pattern=None, directory=packet_io.PACKET_LOG_DIR):
+    """Captures to learn from (each capture once, preferring its columnar copy)."""
+    if not os.path.isdir(directory):
+        return []
+    return capture_catalog.find_captures(pattern, directory=directory)
+
+
+def train_model(training_set, n_estimators=N_ESTIMATORS, max_rows=MAX_TRAIN_ROWS, n_jobs=N_JOBS):
+    """Fit the threat forest in memory when the training rows fit, otherwise in sampled rounds."""
+    model = RandomForestClassifier(n_estimators=0, n_jobs=n_jobs, random_state=RANDOM_STATE, warm_start=True)
+    rng = np.random.default_rng(RANDOM_STATE)
+
+    if training_set.train_rows <= max_rows:
+        rounds = [(n_estimators, training_set.train_all)]
+    else:
+        sizes = [TREES_PER_ROUND] * (n_estimators // TREES_PER_ROUND) + [n_estimators % TREES_PER_ROUND]
+        rounds = [(trees, lambda: training_set.train_sample(max_rows, rng)) for trees in sizes if trees]
+        print(f"📈 {training_set.train_rows} training rows exceed {max_rows}: "
+              f"fitting {len(rounds)} rounds of up to {TREES_PER_ROUND} trees on {max_rows}-row samples")
+
+    for number, (trees, load_rows) in enumerate(rounds, 1):
+        features, labels = load_rows()
+        if len(np.unique(labels)) < len(CLASS_NAMES):
+            print(f"⚠️ Round {number}: sample holds a single class, skipped")
+            continue
+        model.n_estimators += trees
+        model.fit(features, labels)
+        if len(rounds) > 1:
+            print(f"  Round {number}/{len(rounds)}: {len(model.estimators_)} trees")
+
+    if not getattr(model, "estimators_", None):
+        return None
+    model.feature_version_ = feature_store.FEATURE_VERSION
+    model.feature_names_ = feature_store.FEATURE_NAMES
+    return model
+
+
+def evaluate(model, training_set, max_rows=MAX_TRAIN_ROWS):
+    features, labels = training_set.test(max_rows)
+    if not len(labels):
+        print("⚠️ No held-out rows to evaluate on.")
+        return
+    predictions = model.predict(features)
+    print(f"Model Accuracy: {accuracy_score(labels, predictions):.4f} on {len(labels)} held-out rows")
+    print(classification_report(labels, predictions, labels=[0, 1], target_names=CLASS_NAMES, zero_division=0))
+
+
+def save_model(model, model_path=MODEL_PATH):
+    with open(model_path, "wb") as f:
+        pickle.dump(model, f)
+    print(f"Model saved to {model_path}")
+
+    # Export the trees as flat node arrays so analysis can score without sklearn
+    forest_path = os.path.splitext(model_path)[0] + forest_model.FOREST_EXTENSION
+    forest_model.export_model_file(model, model_path, forest_path)
+    print(f"Compiled forest saved to {forest_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Train the AI threat model on captured traffic labeled by the rule-based analysis.")
+    parser.add_argument("captures", nargs="*", help="capture files (default: every capture in the packet log directory)")
+    parser.add_argument("--glob", help="capture file name pattern (e.g. 'packets_202503*')")
+    parser.add_argument("--directory", default=packet_io.PACKET_LOG_DIR)
+    parser.add_argument("--trees", type=int, default=N_ESTIMATORS)
+    parser.add_argument("--max-rows", type=int, default=MAX_TRAIN_ROWS, help="training rows held in memory per fit")
+    parser.add_argument("--jobs", type=int, default=N_JOBS, help="parallel tree builders (-1 = every core)")
+    args = parser.parse_args()
+
+    captures = args.captures or find_training_captures(args.glob, args.directory)
+    if not captures:
+        print("❌ No captures to train on. Capture traffic first or pass capture files.")
+        sys.exit(1)
+
+    training_set = TrainingSet([feature_store.load_features(path) for path in captures])
+    print(f"🔍 {training_set.train_rows} training rows, {training_set.test_rows} held out, from {len(captures)} capture(s)")
+
+    model = train_model(training_set, args.trees, args.max_rows, args.jobs)
+    if model is None:
+        print("❌ Training data holds a single class; capture more varied traffic.")
+        sys.exit(1)
+
+    evaluate(model, training_set, args.max_rows)
+    save_model(model)